@@ -0,0 +1,44 @@
+using System.IO;
+using UnityEditor;
+using UnityEditor.Build;
+using UnityEditor.Build.Reporting;
+using UnityEngine;
+
+// Assets/Script tidak ikut ke player build, padahal backend Python di
+// StreamingAssets/Backend (composite2_standalone.py) meng-import modul bersama
+// dari sana. Modul itu disalin ke folder Backend milik build, di samping backend.
+public class BackendBuildPostprocessor : IPostprocessBuildWithReport
+{
+    static readonly string[] SharedModules = { "raster_common.py" };
+
+    public int callbackOrder { get { return 0; } }
+
+    public void OnPostprocessBuild(BuildReport report)
+    {
+        string backendFolder = Path.Combine(PlayerStreamingAssets(report), "Backend");
+        if (!Directory.Exists(backendFolder))
+        {
+            UnityEngine.Debug.LogWarning($"Backend folder not found in build: {backendFolder}");
+            return;
+        }
+
+        string scriptFolder = Path.Combine(Application.dataPath, "Script");
+        foreach (string module in SharedModules)
+        {
+            File.Copy(Path.Combine(scriptFolder, module), Path.Combine(backendFolder, module), true);
+        }
+        UnityEngine.Debug.Log($"Copied {SharedModules.Length} shared backend module(s) to {backendFolder}");
+    }
+
+    // <Game>.exe -> <Game>_Data/StreamingAssets (Windows / Linux player)
+    static string PlayerStreamingAssets(BuildReport report)
+    {
+        string output = report.summary.outputPath;
+        if (report.summary.platform == BuildTarget.StandaloneOSX)
+        {
+            return Path.Combine(output, "Contents", "Resources", "Data", "StreamingAssets");
+        }
+        string dataFolder = Path.GetFileNameWithoutExtension(output) + "_Data";
+        return Path.Combine(Path.GetDirectoryName(output), dataFolder, "StreamingAssets");
+    }
+}
@@ -0,0 +1,26 @@
+using System.IO;
+using UnityEngine;
+
+// Semua backend Python dalam satu build one-dir:
+//   StreamingAssets/Backend/raster_backend/raster_backend.exe <command> [args...]
+// (lihat Assets/Script/raster_backend.py). Exe one-file lama tetap dipakai
+// selama build baru belum ada di folder Backend.
+public static class BackendLauncher
+{
+    public static string OneDirExe
+    {
+        get { return Path.Combine(Application.streamingAssetsPath, "Backend", "raster_backend", "raster_backend.exe"); }
+    }
+
+    // Exe yang dijalankan + argumennya (diawali nama command bila lewat raster_backend)
+    public static string Resolve(string command, string legacyExePath, string args, out string arguments)
+    {
+        if (File.Exists(OneDirExe))
+        {
+            arguments = command + " " + args;
+            return OneDirExe;
+        }
+        arguments = args;
+        return legacyExePath;
+    }
+}
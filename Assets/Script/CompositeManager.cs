@@ -208,6 +208,8 @@ public class CompositeManager : MonoBehaviour
 // #else
         // BUILD MODE & Editor (Default to EXE)
         fullExePath = Path.Combine(backendFolder, exeName);
+        string commandPrefix;
+        fullExePath = BackendLauncher.Resolve("composite", fullExePath, "", out commandPrefix);
         
         // [FIX] Double check if exe exists
         if (!File.Exists(fullExePath))
@@ -220,7 +222,7 @@ public class CompositeManager : MonoBehaviour
              return $"EXECUTABLE NOT FOUND: {fullExePath}";
         }
 
-        args = $"--input \"{cleanInput}\" --r {r} --g {g} --b {b} --output \"{cleanOutput}\" --stretch";
+        args = commandPrefix + $"--input \"{cleanInput}\" --r {r} --g {g} --b {b} --output \"{cleanOutput}\" --stretch";
 // #endif
 
         UnityEngine.Debug.Log($"[Composite] Running: {fullExePath} {args}");
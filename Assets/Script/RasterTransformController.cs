@@ -147,6 +147,7 @@ public class RasterTransformController : MonoBehaviour
         // Arguments: "script_path" -n "name" --algo algo --input "input"
         // args = $"\"{scriptPath}\" -n \"{outputName}\" --algo {algo} --input \"{cleanInput}\"";
         string args = $"-n \"{outputName}\" --algo {algo} --input \"{cleanInput}\"";
+        fullExePath = BackendLauncher.Resolve("transform", fullExePath, args, out args);
 
         UnityEngine.Debug.Log($"[RasterTransform] Running: {fullExePath} {args}");
 
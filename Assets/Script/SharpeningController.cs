@@ -225,6 +225,51 @@ public class SharpeningController : MonoBehaviour
 
         UnityEngine.Debug.Log($"Command: {exeName} {args}");
 
+        // Backend Python (raster_sharpen.py / raster_backend sharpen): Gram-Schmidt / PCA / wavelet dengan PAN, diproses per window
+        string sharpenScript = FindSharpenScript(backendFolder);
+        bool hasPan = !string.IsNullOrEmpty(panPath) && File.Exists(panPath);
+        bool hasOneDir = File.Exists(BackendLauncher.OneDirExe);
+        if ((sharpenScript != null || hasOneDir) && hasPan)
+        {
+            string method = lowerAlgo.Contains("wavelet") ? "wavelet" : (isPca ? "pca" : "gramschmidt");
+            string sharpenArgs = $"-n \"{outputName}\" -o \"{outputDir}\" --rgb {rgbArgs} --pan \"{panPath}\" --algo {method}";
+            // Script Python (Development) atau build one-dir raster_backend (Build)
+            string pyFile = sharpenScript != null ? "python" : BackendLauncher.OneDirExe;
+            string pyArgs = sharpenScript != null ? $"\"{sharpenScript}\" {sharpenArgs}" : $"sharpen {sharpenArgs}";
+            UnityEngine.Debug.Log($"Command: {pyFile} {pyArgs}");
+
+            string resultOutputSharpen = await Task.Run(() =>
+            {
+                ProcessStartInfo start = new ProcessStartInfo();
+                start.FileName = pyFile;
+                start.Arguments = pyArgs;
+                start.UseShellExecute = false;
+                start.RedirectStandardOutput = true;
+                start.RedirectStandardError = true;
+                start.CreateNoWindow = true;
+                start.WorkingDirectory = backendFolder;
+                start.EnvironmentVariables["PYTHONIOENCODING"] = "utf-8";
+                try
+                {
+                    Process p = Process.Start(start);
+                    string output = p.StandardOutput.ReadToEnd();
+                    string error = p.StandardError.ReadToEnd();
+                    p.WaitForExit();
+                    // Hasil JSON di stdout lebih diutamakan daripada warning di stderr
+                    if (!string.IsNullOrEmpty(error) && !output.Contains("\"status\""))
+                        return "PYTHON ERROR: " + error;
+                    return output;
+                }
+                catch (System.Exception e)
+                {
+                    return "SYSTEM ERROR: " + e.Message;
+                }
+            });
+            await HandleResultOutput(resultOutputSharpen, outputName, algorithm, rawProjectName);
+            btnProcess.interactable = true;
+            return;
+        }
+
         // Jalankan Process
         if (!System.IO.File.Exists(fullExePath))
         {
@@ -310,6 +355,15 @@ public class SharpeningController : MonoBehaviour
         btnProcess.interactable = true;
     }
 
+    // Cari raster_sharpen.py: Assets/Script (Development), lalu StreamingAssets/Backend (Build)
+    string FindSharpenScript(string backendFolder)
+    {
+        string scriptPath = Path.Combine(Application.dataPath, "Script", "raster_sharpen.py");
+        if (File.Exists(scriptPath)) return scriptPath;
+        scriptPath = Path.Combine(backendFolder, "raster_sharpen.py");
+        return File.Exists(scriptPath) ? scriptPath : null;
+    }
+
     // ========================================================================
     // 5. LOAD RESULT TO LAYER (Logic Polygon)
     // ========================================================================
@@ -408,11 +462,13 @@ public class SharpeningController : MonoBehaviour
         {
             textStatus.text = "Sukses!";
             textStatus.color = Color.green;
-            if (algorithm.ToLower().Contains("pca"))
+            // Backend yang mencetak JSON (pca.py, raster_sharpen.py) memberi path hasil langsung
+            if (resultOutput.Contains("\"path\""))
             {
                 try
                 {
-                    int s = resultOutput.IndexOf('{');
+                    int s = resultOutput.LastIndexOf("{\"status\"");
+                    if (s < 0) s = resultOutput.IndexOf('{');
                     int e = resultOutput.LastIndexOf('}');
                     string json = (s >= 0 && e > s) ? resultOutput.Substring(s, e - s + 1) : resultOutput;
                     PCAResponse res = JsonUtility.FromJson<PCAResponse>(json);
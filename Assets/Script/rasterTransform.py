@@ -5,13 +5,52 @@ from datetime import datetime
 import rasterio
 import numpy as np
 from PIL import Image
-import cv2
+
+from raster_common import (
+    open_band_set, describe_input, resolve_region, add_aoi_arguments, aoi_options_from_args,
+    expand_window, parse_post_ops, post_ops_halo, FOCAL_FUNCTIONS, TILED_PROFILE, RESAMPLING_CHOICES,
+    BandStatistics, write_statistics, lonlat_bounds, add_display_arguments, display_options_from_args,
+    output_display_grid, write_display_tif, geotiff_profile, scratch_profile, add_scratch_arguments,
+    Progress, Cancelled, PreviewCanvas, remove_outputs, add_progress_arguments,
+    plan_memory, source_layout, add_memory_arguments,
+    QualityMask, add_quality_arguments, qa_flags_from_args,
+    cv2,  # lazy: only imported when the preview is rendered
+)
+
+# Bands needed by each algorithm (validated once before the windowed pass)
+ALGORITHM_BANDS = {
+    'NDVI': ('red', 'nir'),
+    'NDTI': ('red', 'green'),
+    'NDBI': ('swir', 'nir'),
+    'NGRDI': ('green', 'red'),
+    'RVI': ('nir', 'red'),
+    'SAVI': ('nir', 'red'),
+    'EVI': ('nir', 'red', 'blue'),
+    'GNDVI': ('nir', 'green'),
+    'ARVI': ('nir', 'red', 'blue'),
+    'MSAVI': ('nir', 'red'),
+    'CLGREEN': ('nir', 'green'),
+    'TCI': ('red', 'green', 'blue'),
+}
 
 class Data():
-    def __init__(self, name, algorithm):
+    def __init__(self, name, algorithm, resampling='nearest', grid='finest', aoi_options=None, post=None,
+                 display_options=None, progress=None, memory_mb=None, scratch=False, qa_flags=None):
         # --- MAPPING VARIABLE ---
         self.prefix_name = name        # -n: Nama Depan File
         self.algorithm = algorithm     # Algorithm name
+        self.resampling = resampling   # Kernel for bands on a coarser/finer grid
+        self.grid = grid               # Reference grid: finest / coarsest / band key
+        self.aoi_options = aoi_options or {}  # bbox / aoi / aoi_crs / mask (see resolve_region)
+        self.post_ops = parse_post_ops(post)  # Focal post-processing, e.g. ['focal_median:3', 'sobel']
+        self.display_options = display_options or {}  # web_mercator / display_tif / size
+        self.progress = progress or Progress()  # JSON-lines events + cancel checks (--progress)
+        self.memory_mb = memory_mb     # Memory budget for the window/thread plan (None = from free RAM)
+        self.scratch = scratch         # Uncompressed output for batch/temporal intermediates
+        self.qa_flags = qa_flags       # QA flags turned into nodata (None = no QA masking)
+        self.quality = None
+        self.masked_pixels = 0
+        self.plan = None
         self.base_folder = 'TRANSFORM' # Base folder for output
         
         # Use same name for prefix and output folder
@@ -31,6 +70,12 @@ class Data():
         self.png_filename = f'{self.prefix_name}_{self.algorithm}_{self.ymdhms}_preview.png'
         self.png_path = os.path.join(self.folder_output, self.png_filename)
 
+        # Optional EPSG:3857 overview GeoTIFF (--display-tif)
+        self.display_filename = f'{self.prefix_name}_{self.algorithm}_{self.ymdhms}_3857.tif'
+        self.display_path = os.path.join(self.folder_output, self.display_filename)
+
+        self.statistics = []  # Per-band statistics gathered while writing
+
         self.status = 'running'
         self.messages = 'Initializing...'
 
@@ -41,9 +86,12 @@ class Data():
     def run(self, input_path, band_indices):
         try:
             # 1. VALIDASI INPUT
-            if not os.path.exists(input_path):
+            # input_path bisa berupa satu file, folder band, atau list file per-band
+            input_paths = [input_path] if isinstance(input_path, str) else list(input_path)
+            missing = [p for p in input_paths if not os.path.exists(p)]
+            if missing:
                 self.status = 'failed'
-                self.messages = f'Input file not found: {input_path}'
+                self.messages = f'Input file not found: {missing[0]}'
                 self._print_result()
                 return
 
@@ -54,12 +102,26 @@ class Data():
                 self.status = 'success'
                 self.messages = f'{self.algorithm} calculation successful'
                 
-                # Buat PNG preview dan dapatkan bounds
-                create_preview_png(self.output_final_path, self.png_path, self.algorithm)
-                bounds = get_bounds(self.output_final_path)
+                # Buat PNG preview dan dapatkan bounds (stretch dari statistik yang sudah ada)
+                # --web-mercator: preview di-warp ke EPSG:3857 (grid warp di-cache per grid sumber)
+                display = output_display_grid(self.output_final_path, self.display_options)
+                create_preview_png(self.output_final_path, self.png_path, self.algorithm,
+                                   statistics=self.statistics, display=display)
+                bounds = display.bounds() if display else get_bounds(self.output_final_path)
+
+                extra = {}
+                if self.quality:
+                    extra['qa_mask'] = dict(self.quality.describe(), masked_pixels=self.masked_pixels)
+                if display:
+                    extra.update(display_crs='EPSG:3857', warp_cached=display.cached)
+                    if self.display_options.get('display_tif'):
+                        with rasterio.open(self.output_final_path) as src:
+                            write_display_tif(self.display_path, display, display.read(src))
+                        extra['display_tif'] = self.display_filename
                 
                 # OUTPUT JSON
-                self._print_result(bounds)
+                self.progress.preview(self.png_path, 'final')
+                self._print_result(bounds, extra)
             else:
                 self.status = 'failed'
                 # messages sudah di-set di dalam process_transform jika ada error spesifik
@@ -67,12 +129,19 @@ class Data():
                     self.messages = 'Transformation failed'
                 self._print_result()
 
+        except Cancelled as e:
+            # Stopped at a window boundary: nothing half-written is left behind
+            remove_outputs(self.output_final_path, self.png_path, self.display_path)
+            self.status = 'cancelled'
+            self.messages = str(e)
+            self._print_result()
+
         except Exception as e:
             self.status = 'failed'
             self.messages = str(e)
             self._print_result()
 
-    def _print_result(self, bounds=None):
+    def _print_result(self, bounds=None, extra=None):
         result = {
             'status': self.status,
             'messages': self.messages,
@@ -82,249 +151,412 @@ class Data():
             'bounds': bounds if bounds else {},
             'algo': self.algorithm
         }
-        print(json.dumps(result))
+        if self.status == 'success' and self.statistics:
+            result['statistics'] = self.statistics
+        if self.status == 'success' and self.plan is not None:
+            result['plan'] = {'window': self.plan.window, 'threads': self.plan.threads,
+                              'peak_mb': self.plan.peak_mb}
+        if self.status == 'success' and extra:
+            result.update(extra)
+        print(json.dumps(result), flush=True)
+
+    def output_band_count(self):
+        return 3 if self.algorithm == 'TCI' else 1
 
     def process_transform(self, input_path, output_path, band_indices):
         try:
-            with rasterio.open(input_path) as src:
+            # Bands on different grids (e.g. Sentinel-2 B11 at 20 m next to B4/B8 at 10 m)
+            # are resampled to the reference grid per window, never as a full-size copy
+            with open_band_set(input_path, resampling=self.resampling, grid=self.grid) as src:
                 profile = src.profile.copy()
-                
-                # Helper to read band by name (mapped to index) or explicit index
-                def read_band(name):
-                    idx = band_indices.get(name)
-                    if idx is None:
-                        return None, f"Band '{name}' index not provided"
-                    if idx > src.count:
-                        return None, f"Band index {idx} out of range (max {src.count})"
-                    return src.read(idx).astype(np.float32), None
 
-                # Calculate specific algorithm
-                output_data = None
-                
-                # --- ALGORITHMS ---
-                
-                if self.algorithm == 'NDVI':
-                    red, err1 = read_band('red')
-                    nir, err2 = read_band('nir')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    output_data = (nir - red) / (nir + red + 1e-6)
-
-                elif self.algorithm == 'NDTI':
-                    # NDTI (Turbidity): (Red - Green) / (Red + Green)
-                    red, err1 = read_band('red')
-                    green, err2 = read_band('green')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    output_data = (red - green) / (red + green + 1e-6)
-
-                elif self.algorithm == 'NDBI':
-                    # NDBI: (SWIR - NIR) / (SWIR + NIR)
-                    swir, err1 = read_band('swir')
-                    nir, err2 = read_band('nir')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    output_data = (swir - nir) / (swir + nir + 1e-6)
-                
-                elif self.algorithm == 'NGRDI':
-                    # NGRDI: (Green - Red) / (Green + Red)
-                    green, err1 = read_band('green')
-                    red, err2 = read_band('red')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    output_data = (green - red) / (green + red + 1e-6)
-                
-                elif self.algorithm == 'RVI':
-                    # RVI: NIR / Red
-                    nir, err1 = read_band('nir')
-                    red, err2 = read_band('red')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    output_data = nir / (red + 1e-6)
-
-                elif self.algorithm == 'SAVI':
-                    # SAVI: ((NIR - Red) / (NIR + Red + L)) * (1 + L), L=0.5
-                    nir, err1 = read_band('nir')
-                    red, err2 = read_band('red')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    L = 0.5
-                    output_data = ((nir - red) / (nir + red + L)) * (1 + L)
-
-                elif self.algorithm == 'EVI':
-                    # EVI: 2.5 * ((NIR - Red) / (NIR + 6*Red - 7.5*Blue + 1))
-                    nir, err1 = read_band('nir')
-                    red, err2 = read_band('red')
-                    blue, err3 = read_band('blue')
-                    if err1 or err2 or err3: raise ValueError(err1 or err2 or err3)
-                    output_data = 2.5 * ((nir - red) / (nir + 6 * red - 7.5 * blue + 1 + 1e-6))
-
-                elif self.algorithm == 'GNDVI':
-                    # GNDVI: (NIR - Green) / (NIR + Green)
-                    nir, err1 = read_band('nir')
-                    green, err2 = read_band('green')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    output_data = (nir - green) / (nir + green + 1e-6)
-
-                elif self.algorithm == 'ARVI':
-                    # ARVI: (NIR - (2 * Red - Blue)) / (NIR + (2 * Red - Blue))
-                    nir, err1 = read_band('nir')
-                    red, err2 = read_band('red')
-                    blue, err3 = read_band('blue')
-                    if err1 or err2 or err3: raise ValueError(err1 or err2 or err3)
-                    rb = 2 * red - blue
-                    output_data = (nir - rb) / (nir + rb + 1e-6)
-
-                elif self.algorithm == 'MSAVI':
-                    # MSAVI2: (2 * NIR + 1 - sqrt((2 * NIR + 1)^2 - 8 * (NIR - Red))) / 2
-                    nir, err1 = read_band('nir')
-                    red, err2 = read_band('red')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    output_data = (2 * nir + 1 - np.sqrt(np.square(2 * nir + 1) - 8 * (nir - red))) / 2
-
-                elif self.algorithm == 'CLGREEN':
-                    # CLGREEN: (NIR / Green) - 1
-                    nir, err1 = read_band('nir')
-                    green, err2 = read_band('green')
-                    if err1 or err2: raise ValueError(err1 or err2)
-                    output_data = (nir / (green + 1e-6)) - 1
-                
-                elif self.algorithm == 'TCI':
-                    # TCI: True Color Image (Red, Green, Blue) -> 3 Bands
-                    red, err1 = read_band('red')
-                    green, err2 = read_band('green')
-                    blue, err3 = read_band('blue')
-                    if err1 or err2 or err3: raise ValueError(err1 or err2 or err3)
-                    
-                    # Stack bands
-                    output_data = np.stack([red, green, blue])
-                    
-                    # Update profile for 3 bands
-                    profile.update(count=3)
-                
-                else:
-                    raise ValueError(f"Unknown algorithm: {self.algorithm}")
+                # Only the AOI window (whole raster without --bbox/--aoi) is read and written
+                region = resolve_region(src, **self.aoi_options)
+                region.update_profile(profile)
 
-                # Save Result
-                if output_data is None:
-                    raise ValueError("Calculation resulted in None")
-
-                # Handle NaN/Inf
-                output_data = np.nan_to_num(output_data, nan=0.0, posinf=0.0, neginf=0.0)
+                # Validate the band mapping once before streaming
+                needed = ALGORITHM_BANDS.get(self.algorithm)
+                if needed is None:
+                    raise ValueError(f"Unknown algorithm: {self.algorithm}")
+                for name in needed:
+                    idx = band_indices.get(name)
+                    if idx is None:
+                        raise ValueError(f"Band '{name}' index not provided")
+                    if not src.has(idx):
+                        raise ValueError(f"Band {idx} not found in input (available: {', '.join(src.keys)})")
 
                 # Update Profile
-                if self.algorithm != 'TCI':
-                    # Single band output for indices
-                    profile.update(
-                        dtype=rasterio.float32,
-                        count=1,
-                        compress='lzw'
-                    )
-                    # Reshape for writing if needed (1, H, W)
-                    if output_data.ndim == 2:
-                        output_data = output_data[np.newaxis, :, :]
-                else:
-                    # Multi band (TCI)
-                    # Ensure dtype matches source or float32? usually TCI is good as uint8 for display, 
-                    # but let's keep float32 for consistency or source dtype.
-                    # Actually, keeping it float32 is safest for intermediate.
-                    profile.update(dtype=rasterio.float32, compress='lzw')
-
-                with rasterio.open(output_path, 'w', **profile) as dst:
-                    dst.write(output_data.astype(rasterio.float32))
-
+                # Indices are single band float32, TCI keeps 3 bands (float32 is safest for intermediate)
+                profile.update(
+                    dtype=rasterio.float32,
+                    count=self.output_band_count(),
+                    compress='lzw',
+                    **TILED_PROFILE
+                )
+                # QA band (QA_PIXEL / SCL / QA60) decoded per window, flagged pixels -> nodata
+                self.quality = QualityMask(src, self.qa_flags) if self.qa_flags else None
+                # Bands warped to the reference grid are NaN beyond their own footprint:
+                # those output pixels stay nodata instead of becoming 0 (a valid NDVI)
+                keep_missing = src.is_mixed_grid
+                if region.is_masked or self.quality or keep_missing:
+                    profile.update(nodata=np.nan)
+                if self.scratch:
+                    profile = scratch_profile(profile)
+
+                # Focal post-processing needs neighbours: each window is computed with a
+                # halo (sum of kernel radii) and cropped, so tile seams are invisible
+                halo = post_ops_halo(self.post_ops)
+
+                # Window size and GDAL threads from the memory budget
+                self.plan = self.memory_plan(src, region, band_indices)
+                profile.update(num_threads=self.plan.threads)
+
+                # --progress: quick preview from a decimated read before the full pass
+                if self.progress.enabled:
+                    self.progress.stage('coarse_preview')
+                    self.coarse_preview(src, region, band_indices)
+
+                windows = list(region.windows(self.plan.window))
+                self.progress.stage('write', total=len(windows))
+                canvas = PreviewCanvas(region.width, region.height, profile['count']) if self.progress.enabled else None
+
+                stats = [BandStatistics() for _ in range(profile['count'])]
+                with rasterio.Env(**self.plan.env()), \
+                        rasterio.open(output_path, 'w', **geotiff_profile(profile)) as dst:
+                    for window, dst_window in windows:
+                        read_window, crop = expand_window(window, halo, src.width, src.height)
+
+                        # Helper to read band by name (mapped to band key) for the current window
+                        # Each band is read from its own file, so per-band inputs never get stacked
+                        missing_reads = []
+
+                        def read_band(name):
+                            data = src.read(band_indices[name], window=read_window)
+                            if keep_missing:
+                                missing_reads.append(np.isnan(data))
+                            return data, None
+
+                        output_data = self.compute_algorithm(read_band)
+
+                        # Save Result
+                        if output_data is None:
+                            raise ValueError("Calculation resulted in None")
+
+                        # Handle NaN/Inf (e.g. 0/0)
+                        output_data = np.nan_to_num(output_data, nan=0.0, posinf=0.0, neginf=0.0)
+
+                        # Missing input pixels and QA-flagged pixels (halo included) become NaN
+                        # before post-processing, so the focal ops ignore them instead of
+                        # spreading cloud values into valid neighbours
+                        invalid = np.logical_or.reduce(missing_reads) if missing_reads else None
+                        flagged = None
+                        if self.quality:
+                            flagged = self.quality.read(read_window)
+                            invalid = flagged if invalid is None else invalid | flagged
+                        if invalid is not None:
+                            output_data[..., invalid] = np.nan
+
+                        # Post-processing (per band), then drop the halo
+                        if self.post_ops:
+                            bands = output_data if output_data.ndim == 3 else [output_data]
+                            for func, size in self.post_ops:
+                                bands = [func(band, size) for band in bands]
+                            output_data = np.stack(bands) if output_data.ndim == 3 else bands[0]
+                        output_data = output_data[(Ellipsis,) + crop]
+
+                        # Reshape for writing if needed (1, h, w)
+                        if output_data.ndim == 2:
+                            output_data = output_data[np.newaxis, :, :]
+                        output_data = output_data.astype(rasterio.float32)
+
+                        # Pixels outside the AOI polygon become nodata (transparent in the preview)
+                        outside = region.outside_mask(dst_window)
+                        if outside is not None:
+                            output_data[:, outside] = np.nan
+
+                        # Cloud / shadow / ... pixels from the QA band (already nodata above)
+                        if flagged is not None:
+                            flagged = flagged[crop]
+                            self.masked_pixels += int(np.count_nonzero(
+                                flagged if outside is None else flagged & ~outside))
+
+                        dst.write(output_data, window=dst_window)
+                        for band_stats, band in zip(stats, output_data):
+                            band_stats.update(band)
+
+                        # Cancel check at the window boundary; refined previews at 25/50/75%
+                        if canvas is not None:
+                            canvas.paste(dst_window, output_data)
+                        self.progress.advance()
+                        if self.progress.preview_due():
+                            partial = [band_stats.to_dict(histogram=False) for band_stats in stats]
+                            if render_preview_png(canvas.data, self.png_path, self.algorithm, statistics=partial):
+                                self.progress.preview(self.png_path, 'refined')
+
+            # Statistics + histogram sidecar (.aux.xml), no second pass over the output
+            self.statistics = write_statistics(output_path, stats)
             return True
 
+        except Cancelled:
+            raise
         except Exception as e:
             self.messages = str(e)
             return False
 
-def create_preview_png(tif_path, png_path, algo, max_size=1024):
+    def memory_plan(self, src, region, band_indices):
+        """Rencana window/thread untuk algoritma ini (band dibaca, temporer, halo post-processing)"""
+        keys = list(dict.fromkeys(band_indices[name] for name in ALGORITHM_BANDS[self.algorithm]))
+        if self.quality:
+            keys += self.quality.keys
+        source_bytes, blocks = source_layout(src, keys)
+        return plan_memory(
+            region.width, region.height, bands_in=len(keys), bands_out=self.output_band_count(),
+            source_bytes=source_bytes, source_blocks=blocks,
+            # about two intermediate arrays per band term, plus one per post-processing step
+            temporaries=2 * len(keys) + 2 * len(self.post_ops),
+            halo=post_ops_halo(self.post_ops), budget_mb=self.memory_mb,
+        )
+
+    def explain(self, input_path, band_indices):
+        """Cetak rencana memori/IO tanpa menjalankan transformasi"""
+        try:
+            with open_band_set(input_path, resampling=self.resampling, grid=self.grid) as src:
+                region = resolve_region(src, **self.aoi_options)
+                for name in ALGORITHM_BANDS[self.algorithm]:
+                    if not src.has(band_indices.get(name)):
+                        raise ValueError(f"Band {band_indices.get(name)} not found in input")
+                self.quality = QualityMask(src, self.qa_flags) if self.qa_flags else None
+                plan = self.memory_plan(src, region, band_indices)
+            print(json.dumps({'status': 'success', 'mode': 'explain', 'algo': self.algorithm,
+                              'plan': plan.to_dict()}))
+        except Exception as e:
+            print(json.dumps({'status': 'failed', 'mode': 'explain', 'messages': str(e), 'algo': self.algorithm}))
+
+    def coarse_preview(self, src, region, band_indices, size=256):
+        """Preview kasar dari baca decimated (tanpa post-processing), sebelum pass penuh"""
+        scale = min(1.0, size / max(region.width, region.height))
+        out_shape = (max(1, round(region.height * scale)), max(1, round(region.width * scale)))
+
+        def read_band(name):
+            return src.read(band_indices[name], window=region.window, out_shape=out_shape), None
+
+        data = np.asarray(self.compute_algorithm(read_band), dtype=np.float32)
+        data = data if data.ndim == 3 else data[np.newaxis]
+        outside = region.outside_mask(out_shape=out_shape)
+        if outside is not None:
+            data[:, outside] = np.nan
+        if self.quality:
+            data[:, self.quality.read(region.window, out_shape)] = np.nan
+        if render_preview_png(data, self.png_path, self.algorithm):
+            self.progress.preview(self.png_path, 'coarse')
+
+    def compute_algorithm(self, read_band):
+        # Calculate specific algorithm
+        output_data = None
+
+        # --- ALGORITHMS ---
+
+        if self.algorithm == 'NDVI':
+            red, err1 = read_band('red')
+            nir, err2 = read_band('nir')
+            if err1 or err2: raise ValueError(err1 or err2)
+            output_data = (nir - red) / (nir + red + 1e-6)
+
+        elif self.algorithm == 'NDTI':
+            # NDTI (Turbidity): (Red - Green) / (Red + Green)
+            red, err1 = read_band('red')
+            green, err2 = read_band('green')
+            if err1 or err2: raise ValueError(err1 or err2)
+            output_data = (red - green) / (red + green + 1e-6)
+
+        elif self.algorithm == 'NDBI':
+            # NDBI: (SWIR - NIR) / (SWIR + NIR)
+            swir, err1 = read_band('swir')
+            nir, err2 = read_band('nir')
+            if err1 or err2: raise ValueError(err1 or err2)
+            output_data = (swir - nir) / (swir + nir + 1e-6)
+
+        elif self.algorithm == 'NGRDI':
+            # NGRDI: (Green - Red) / (Green + Red)
+            green, err1 = read_band('green')
+            red, err2 = read_band('red')
+            if err1 or err2: raise ValueError(err1 or err2)
+            output_data = (green - red) / (green + red + 1e-6)
+
+        elif self.algorithm == 'RVI':
+            # RVI: NIR / Red
+            nir, err1 = read_band('nir')
+            red, err2 = read_band('red')
+            if err1 or err2: raise ValueError(err1 or err2)
+            output_data = nir / (red + 1e-6)
+
+        elif self.algorithm == 'SAVI':
+            # SAVI: ((NIR - Red) / (NIR + Red + L)) * (1 + L), L=0.5
+            nir, err1 = read_band('nir')
+            red, err2 = read_band('red')
+            if err1 or err2: raise ValueError(err1 or err2)
+            L = 0.5
+            output_data = ((nir - red) / (nir + red + L)) * (1 + L)
+
+        elif self.algorithm == 'EVI':
+            # EVI: 2.5 * ((NIR - Red) / (NIR + 6*Red - 7.5*Blue + 1))
+            nir, err1 = read_band('nir')
+            red, err2 = read_band('red')
+            blue, err3 = read_band('blue')
+            if err1 or err2 or err3: raise ValueError(err1 or err2 or err3)
+            output_data = 2.5 * ((nir - red) / (nir + 6 * red - 7.5 * blue + 1 + 1e-6))
+
+        elif self.algorithm == 'GNDVI':
+            # GNDVI: (NIR - Green) / (NIR + Green)
+            nir, err1 = read_band('nir')
+            green, err2 = read_band('green')
+            if err1 or err2: raise ValueError(err1 or err2)
+            output_data = (nir - green) / (nir + green + 1e-6)
+
+        elif self.algorithm == 'ARVI':
+            # ARVI: (NIR - (2 * Red - Blue)) / (NIR + (2 * Red - Blue))
+            nir, err1 = read_band('nir')
+            red, err2 = read_band('red')
+            blue, err3 = read_band('blue')
+            if err1 or err2 or err3: raise ValueError(err1 or err2 or err3)
+            rb = 2 * red - blue
+            output_data = (nir - rb) / (nir + rb + 1e-6)
+
+        elif self.algorithm == 'MSAVI':
+            # MSAVI2: (2 * NIR + 1 - sqrt((2 * NIR + 1)^2 - 8 * (NIR - Red))) / 2
+            nir, err1 = read_band('nir')
+            red, err2 = read_band('red')
+            if err1 or err2: raise ValueError(err1 or err2)
+            output_data = (2 * nir + 1 - np.sqrt(np.square(2 * nir + 1) - 8 * (nir - red))) / 2
+
+        elif self.algorithm == 'CLGREEN':
+            # CLGREEN: (NIR / Green) - 1
+            nir, err1 = read_band('nir')
+            green, err2 = read_band('green')
+            if err1 or err2: raise ValueError(err1 or err2)
+            output_data = (nir / (green + 1e-6)) - 1
+
+        elif self.algorithm == 'TCI':
+            # TCI: True Color Image (Red, Green, Blue) -> 3 Bands
+            red, err1 = read_band('red')
+            green, err2 = read_band('green')
+            blue, err3 = read_band('blue')
+            if err1 or err2 or err3: raise ValueError(err1 or err2 or err3)
+
+            # Stack bands (3 band output, see output_band_count)
+            output_data = np.stack([red, green, blue])
+
+        else:
+            raise ValueError(f"Unknown algorithm: {self.algorithm}")
+
+        return output_data
+
+def create_preview_png(tif_path, png_path, algo, max_size=1024, statistics=None, display=None):
     """Buat PNG preview dari file TIF dengan support Transparency"""
+    # display: DisplayGrid -> preview is warped to EPSG:3857 instead of the native grid
     try:
         with rasterio.open(tif_path) as src:
-            data = src.read()
-            
-            # Normalisasi untuk display
-            if algo == 'TCI':
-                # RGB - Normalize each band
-                display_data = np.zeros(data.shape, dtype=np.uint8)
-                for i in range(min(data.shape[0], 3)):
-                    band = data[i]
-                    # Handle NaNs
-                    valid_mask = np.isfinite(band)
-                    if not np.any(valid_mask):
-                        continue
-                        
-                    p2, p98 = np.percentile(band[valid_mask], (2, 98))
-                    
-                    norm = np.zeros_like(band)
-                    if p98 - p2 > 0:
-                        norm[valid_mask] = (band[valid_mask] - p2) / (p98 - p2) * 255
-                    
-                    display_data[i] = np.clip(norm, 0, 255)
-                
-                # Transpose (C, H, W) -> (H, W, C)
-                img_array = np.transpose(display_data[:3], (1, 2, 0))
-                img = Image.fromarray(img_array) # RGB (No Alpha for TCI yet)
-                
+            if display is not None:
+                data = display.read(src)
             else:
-                # Single Band Index
-                band = data[0].astype(np.float32)
-                
-                # Create Mask for Valid Data (Not NaN, Not Inf)
-                mask = np.isfinite(band)
-                
-                # If empty
-                if not np.any(mask):
-                    print("Warning: Image contains no valid data.")
-                    return False
+                # Decimated read: the preview never needs more than max_size pixels a side
+                scale = min(1.0, max_size / max(src.width, src.height))
+                out_shape = (src.count, max(1, int(src.height * scale)), max(1, int(src.width * scale)))
+                data = src.read(out_shape=out_shape)
+    except Exception as e:
+        print(f"Gagal membuat PNG preview: {str(e)}")
+        return False
+    return render_preview_png(data, png_path, algo, max_size=max_size, statistics=statistics)
 
-                valid_data = band[mask]
-                
-                # Percentile on valid data only
-                p2, p98 = np.percentile(valid_data, (2, 98))
+def render_preview_png(data, png_path, algo, max_size=1024, statistics=None):
+    """Buat PNG preview dari array (bands, h, w); juga dipakai untuk preview bertahap"""
+    # statistics: per-band dicts from write_statistics (p2/p98 reused instead of np.percentile)
+    def stretch_limits(band_index, values):
+        if statistics and band_index < len(statistics) and statistics[band_index].get('count'):
+            return statistics[band_index]['p2'], statistics[band_index]['p98']
+        return np.percentile(values, (2, 98))
+
+    try:
+        # Normalisasi untuk display
+        if algo == 'TCI':
+            # RGB - Normalize each band
+            display_data = np.zeros(data.shape, dtype=np.uint8)
+            for i in range(min(data.shape[0], 3)):
+                band = data[i]
+                # Handle NaNs
+                valid_mask = np.isfinite(band)
+                if not np.any(valid_mask):
+                    continue
+                    
+                p2, p98 = stretch_limits(i, band[valid_mask])
                 
-                # Normalize
                 norm = np.zeros_like(band)
                 if p98 - p2 > 0:
-                    norm[mask] = (band[mask] - p2) / (p98 - p2) * 255
-                
-                img_gray = np.clip(norm, 0, 255).astype(np.uint8)
+                    norm[valid_mask] = (band[valid_mask] - p2) / (p98 - p2) * 255
                 
-                # Apply Colormap (Returns BGR)
-                img_color = cv2.applyColorMap(img_gray, cv2.COLORMAP_JET)
-                
-                # Create Alpha Channel
-                # 0 for Invalid/NaN, 255 for Valid
-                alpha = np.zeros_like(band, dtype=np.uint8)
-                alpha[mask] = 255
-                
-                # Convert BGR to RGB and Add Alpha
-                b, g, r = cv2.split(img_color)
-                img_rgba = cv2.merge((r, g, b, alpha))
-                
-                # Resize if too large
-                h, w = img_rgba.shape[:2]
-                if max(h, w) > max_size:
-                    scale = max_size / max(h, w)
-                    new_h, new_w = int(h * scale), int(w * scale)
-                    img_rgba = cv2.resize(img_rgba, (new_w, new_h), interpolation=cv2.INTER_NEAREST)
-                
-                img = Image.fromarray(img_rgba)
+                display_data[i] = np.clip(norm, 0, 255)
+            
+            # Transpose (C, H, W) -> (H, W, C)
+            img_array = np.transpose(display_data[:3], (1, 2, 0))
+            img = Image.fromarray(img_array) # RGB (No Alpha for TCI yet)
+            
+        else:
+            # Single Band Index
+            band = data[0].astype(np.float32)
+            
+            # Create Mask for Valid Data (Not NaN, Not Inf)
+            mask = np.isfinite(band)
+            
+            # If empty
+            if not np.any(mask):
+                print("Warning: Image contains no valid data.")
+                return False
 
-            img.save(png_path, 'PNG')
-            return True
+            valid_data = band[mask]
+            
+            # Percentile on valid data only
+            p2, p98 = stretch_limits(0, valid_data)
+            
+            # Normalize
+            norm = np.zeros_like(band)
+            if p98 - p2 > 0:
+                norm[mask] = (band[mask] - p2) / (p98 - p2) * 255
+            
+            img_gray = np.clip(norm, 0, 255).astype(np.uint8)
+            
+            # Apply Colormap (Returns BGR)
+            img_color = cv2.applyColorMap(img_gray, cv2.COLORMAP_JET)
+            
+            # Create Alpha Channel
+            # 0 for Invalid/NaN, 255 for Valid
+            alpha = np.zeros_like(band, dtype=np.uint8)
+            alpha[mask] = 255
+            
+            # Convert BGR to RGB and Add Alpha
+            b, g, r = cv2.split(img_color)
+            img_rgba = cv2.merge((r, g, b, alpha))
+            
+            # Resize if too large
+            h, w = img_rgba.shape[:2]
+            if max(h, w) > max_size:
+                scale = max_size / max(h, w)
+                new_h, new_w = int(h * scale), int(w * scale)
+                img_rgba = cv2.resize(img_rgba, (new_w, new_h), interpolation=cv2.INTER_NEAREST)
+            
+            img = Image.fromarray(img_rgba)
+
+        img.save(png_path, 'PNG')
+        return True
             
     except Exception as e:
         print(f"Gagal membuat PNG preview: {str(e)}")
         return False
 
 def get_bounds(tif_path):
-    """Dapatkan bounds dari file TIF"""
+    """Dapatkan bounds dari file TIF (derajat lon/lat, bukan CRS asli raster)"""
     try:
         with rasterio.open(tif_path) as src:
-            bounds = src.bounds
-            return {
-                "north": float(bounds.top),
-                "south": float(bounds.bottom),
-                "west": float(bounds.left),
-                "east": float(bounds.right)
-            }
+            return lonlat_bounds(src.crs, src.bounds)
     except Exception as e:
         return None
 
@@ -335,17 +567,38 @@ def main():
         'NDTI', 'NDVI', 'NDBI', 'NGRDI', 'RVI', 'SAVI', 'EVI', 
         'GNDVI', 'ARVI', 'MSAVI', 'TCI', 'CLGREEN'
     ], help='Algorithm to apply')
+    parser.add_argument('--resampling', default='nearest', choices=RESAMPLING_CHOICES,
+                        help='Kernel used to align bands that are on a different grid (per window)')
+    parser.add_argument('--grid', default='finest',
+                        help='Reference grid for mixed-resolution bands: finest, coarsest, or a band key (e.g. 4)')
+    parser.add_argument('--post', action='append', default=[],
+                        help=f"Focal post-processing on the result, repeatable and applied in order: "
+                             f"{', '.join(FOCAL_FUNCTIONS)} with optional odd window size, e.g. focal_median:5")
+    add_aoi_arguments(parser)
+    add_display_arguments(parser)
+    add_progress_arguments(parser)
+    add_memory_arguments(parser)
+    add_scratch_arguments(parser)
+    add_quality_arguments(parser)
     
-    parser.add_argument('--input', required=True, help='Input Multiband TIFF')
+    parser.add_argument('--input', required=True, nargs='+',
+                        help='Input Multiband TIFF/VRT, a folder of per-band files, or a list of per-band files')
     
-    args = parser.parse_args()
-    args = parser.parse_args()
-
     args = parser.parse_args()
 
     # --- SATELLITE & BAND PARSER ---
-    filename = os.path.basename(args.input)
+    filename = describe_input(args.input)
     band_indices = {}
+
+    # Per-band inputs (folder / list) are keyed by the band number in the filename
+    # (SR_B4 -> '4', B8A -> '8a'), so the mapping uses sensor band numbers directly
+    try:
+        with open_band_set(args.input) as band_set:
+            per_band_files = not band_set.is_single_file
+            if per_band_files:
+                filename = os.path.basename(band_set.paths[0])
+    except Exception:
+        per_band_files = False
     
     # Defaults
     detected_platform = "Unknown"
@@ -364,7 +617,11 @@ def main():
         
         # Check for Specific Stack: B2-B7 (6 bands)
         # B2(Blue), B3(Green), B4(Red), B5(NIR), B6(SWIR1), B7(SWIR2)
-        if 'B2-B7' in filename or 'stack_B2-B7' in filename:
+        if per_band_files:
+            # Separate SR_B2..SR_B7 files: keys are the Landsat band numbers
+            set_bands(r=4, g=3, b=2, n=5, s=6)
+
+        elif 'B2-B7' in filename or 'stack_B2-B7' in filename:
             # File Band 1 = L8 Band 2 (Blue)
             # File Band 2 = L8 Band 3 (Green)
             # File Band 3 = L8 Band 4 (Red)
@@ -388,10 +645,9 @@ def main():
     else:
         # Fallback: Try reading metadata if filename fails, or default to 1-5 mapping
         try:
-            with rasterio.open(args.input) as src:
-                descriptions = [d.lower() if d else "" for d in src.descriptions]
-                for i, desc in enumerate(descriptions):
-                    idx = i + 1
+            with open_band_set(args.input) as src:
+                descriptions = [src.description(k).lower() for k in src.keys]
+                for idx, desc in zip(src.keys, descriptions):
                     if 'red' in desc: band_indices['red'] = idx
                     elif 'green' in desc: band_indices['green'] = idx
                     elif 'blue' in desc: band_indices['blue'] = idx
@@ -414,7 +670,14 @@ def main():
 
 
     
-    data = Data(name=args.n, algorithm=args.algo)
+    data = Data(name=args.n, algorithm=args.algo, resampling=args.resampling, grid=args.grid,
+                aoi_options=aoi_options_from_args(args), post=args.post,
+                display_options=display_options_from_args(args),
+                progress=Progress(enabled=args.progress).listen(), memory_mb=args.memory_mb,
+                scratch=args.scratch, qa_flags=qa_flags_from_args(args))
+    if args.explain:
+        data.explain(args.input, band_indices)
+        return
     data.run(input_path=args.input, band_indices=band_indices)
 
 if __name__ == '__main__':
@@ -0,0 +1,114 @@
+import importlib
+import importlib.util
+import os
+import sys
+import time
+
+# --------------------------------------------------
+# Single backend entry point
+# --------------------------------------------------
+# One executable for every Python backend:  raster_backend <command> [args...]
+# e.g. raster_backend transform -n scene --algo NDVI --input B4.TIF B5.TIF
+# The arguments after the command are exactly those of the original script.
+# Only the module of the chosen command is imported, and cv2 is loaded lazily
+# by raster_common, so commands that never render or filter with it (bands,
+# sample, zonal, ...) do not import it. Built as a one-dir PyInstaller bundle
+# (StreamingAssets/Backend/raster_backend.spec): the libraries are shipped once
+# in the bundle folder instead of being unpacked to a temp dir per launch.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(SCRIPT_DIR, '..', 'StreamingAssets', 'Backend')
+
+# command -> (script, arguments put in front of the user's arguments)
+COMMANDS = {
+    'transform': ('rasterTransform.py', []),
+    'calc': ('raster_calculator_standalone (1).py', []),
+    'bands': ('raster_calculator_standalone (1).py', ['-b']),
+    'composite': ('composite2_standalone.py', []),
+    'sharpen': ('raster_sharpen.py', []),
+    'classify': ('raster_classify.py', []),
+    'temporal': ('raster_temporal.py', []),
+    'zonal': ('raster_zonal.py', []),
+    'sample': ('raster_sample.py', []),
+    'batch': ('raster_batch.py', []),
+    'service': ('raster_service.py', []),
+}
+# script -> command (for launching a backend through this entry point)
+SCRIPT_COMMANDS = {script: command for command, (script, prefix) in COMMANDS.items() if not prefix}
+
+ONE_DIR_EXE = os.path.join('raster_backend', 'raster_backend.exe' if os.name == 'nt' else 'raster_backend')
+
+
+def _search_dirs():
+    # Frozen build: sources that cannot be imported by name are bundled under Script/
+    frozen = getattr(sys, '_MEIPASS', None)
+    return [os.path.join(frozen, 'Script'), frozen] if frozen else [SCRIPT_DIR, BACKEND_DIR]
+
+
+def load_command(command):
+    """Import modul backend untuk satu command (hanya saat dipakai)"""
+    script, _ = COMMANDS[command]
+    name = os.path.splitext(script)[0]
+    for folder in _search_dirs():
+        if folder not in sys.path and os.path.isdir(folder):
+            sys.path.append(folder)
+    if name.isidentifier():
+        return importlib.import_module(name)
+
+    # File names such as 'raster_calculator_standalone (1).py' are loaded from their path
+    for folder in _search_dirs():
+        path = os.path.join(folder, script)
+        if os.path.exists(path):
+            spec = importlib.util.spec_from_file_location(f'backend_{command}', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return module
+    raise FileNotFoundError(f'Backend not found: {script}')
+
+
+def one_dir_command(script):
+    """[exe, command] dari build one-dir bila ada (None jika tidak)"""
+    command = SCRIPT_COMMANDS.get(script)
+    if command is None:
+        return None
+    if getattr(sys, 'frozen', False):
+        # Already running inside the bundle: re-launch itself with another command
+        return [sys.executable, command]
+    path = os.path.join(BACKEND_DIR, ONE_DIR_EXE)
+    return [path, command] if os.path.exists(path) else None
+
+
+def _usage():
+    lines = ['usage: raster_backend <command> [arguments...]', '', 'commands:']
+    lines += [f'  {command:<10} {script}' + (f" {' '.join(prefix)}" if prefix else '')
+              for command, (script, prefix) in COMMANDS.items()]
+    lines += ['', "Run 'raster_backend <command> --help' for the arguments of a command.",
+              "RASTER_BACKEND_TIMING=1 prints the import time of the command on stderr."]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(_usage())
+        return 0
+    command = argv[0]
+    if command not in COMMANDS:
+        print(f"ERROR: Unknown command '{command}'\n\n{_usage()}")
+        return 1
+
+    started = time.perf_counter()
+    module = load_command(command)
+    if os.environ.get('RASTER_BACKEND_TIMING') == '1':
+        print(f'[raster_backend] {command}: imported in {(time.perf_counter() - started) * 1000:.0f} ms',
+              file=sys.stderr)
+
+    # The backend parses sys.argv itself, as when it is run as a script
+    _, prefix = COMMANDS[command]
+    sys.argv = [f'raster_backend {command}'] + prefix + argv[1:]
+    result = module.main()
+    return result if isinstance(result, int) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,438 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from raster_backend import one_dir_command
+from raster_common import (
+    RASTER_EXTENSIONS, BAND_TOKEN_PATTERN, QA_BAND_PATTERN, RESAMPLING_CHOICES, add_aoi_arguments, available_memory,
+    add_quality_arguments, qa_flags_from_args,
+)
+
+# --------------------------------------------------
+# Batch processing
+# --------------------------------------------------
+# Runs the existing backends (rasterTransform, raster calculator, composite)
+# over many scenes. Every scene x product pair is one job; jobs run as
+# separate backend processes on a bounded pool, so a crash or a large scene
+# never takes the whole batch down, and memory is returned after each job.
+# Results of finished jobs are kept in <output>/batch_state.json; a job whose
+# inputs and options are unchanged (and whose output still exists) is skipped.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(SCRIPT_DIR, '..', 'StreamingAssets', 'Backend')
+
+TRANSFORM_ALGORITHMS = ('NDTI', 'NDVI', 'NDBI', 'NGRDI', 'RVI', 'SAVI', 'EVI',
+                        'GNDVI', 'ARVI', 'MSAVI', 'TCI', 'CLGREEN')
+
+# Rough peak memory of one backend process (interpreter + GDAL cache + a few windows)
+JOB_MEMORY_MB = 512
+STATE_FILE = 'batch_state.json'
+
+
+def backend_command(script, exe=None):
+    """Perintah untuk menjalankan backend: script .py jika ada, lalu build one-dir, lalu .exe lama"""
+    if not getattr(sys, 'frozen', False):
+        for folder in (SCRIPT_DIR, BACKEND_DIR):
+            path = os.path.join(folder, script)
+            if os.path.exists(path):
+                return [sys.executable, path]
+    # Shared one-dir build: raster_backend <command>
+    command = one_dir_command(script)
+    if command:
+        return command
+    if exe:
+        path = os.path.join(BACKEND_DIR, exe)
+        if os.path.exists(path):
+            return [path]
+    raise FileNotFoundError(f'Backend not found: {script}')
+
+
+# --------------------------------------------------
+# Scene discovery
+# --------------------------------------------------
+def _scene_prefix(path):
+    """'LC08_..._SR_B4.TIF' / 'LC08_..._QA_PIXEL.TIF' -> 'LC08_...' (None jika bukan file per-band)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    matches = list(QA_BAND_PATTERN.finditer(stem)) or list(BAND_TOKEN_PATTERN.finditer(stem))
+    if not matches:
+        return None
+    return stem[:matches[-1].start()].rstrip('_-.') or stem
+
+
+def _is_raster(name):
+    return name.lower().endswith(RASTER_EXTENSIONS)
+
+
+def discover_scenes(folder):
+    """Cari scene di folder: file multiband, grup file per-band, atau subfolder per-band"""
+    scenes = []
+    groups = {}
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isdir(path):
+            if any(_is_raster(n) for n in os.listdir(path)):
+                scenes.append({'name': name, 'input': [path]})
+        elif _is_raster(name):
+            prefix = _scene_prefix(path)
+            if prefix is None:
+                scenes.append({'name': os.path.splitext(name)[0], 'input': [path]})
+            else:
+                groups.setdefault(prefix, []).append(path)
+
+    # Per-band files of one scene share the name before the band token
+    for prefix, paths in groups.items():
+        name = os.path.splitext(os.path.basename(paths[0]))[0] if len(paths) == 1 else prefix
+        scenes.append({'name': name, 'input': paths})
+    return sorted(scenes, key=lambda s: s['name'])
+
+
+def load_manifest(path):
+    """Manifest: JSON list (path atau {"name", "input"}) atau file teks satu input per baris"""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        entries = json.loads(text)
+    except json.JSONDecodeError:
+        entries = [line.strip() for line in text.splitlines() if line.strip() and not line.startswith('#')]
+    if isinstance(entries, dict):
+        entries = entries.get('scenes', [])
+
+    scenes = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'input': entry}
+        inputs = entry['input'] if isinstance(entry['input'], list) else [entry['input']]
+        inputs = [p if os.path.isabs(p) else os.path.join(base, p) for p in inputs]
+        name = entry.get('name') or os.path.splitext(os.path.basename(inputs[0].rstrip('/\\')))[0]
+        scenes.append({'name': name, 'input': inputs})
+    return scenes
+
+
+def collect_scenes(inputs, manifest=None):
+    scenes = []
+    if manifest:
+        scenes.extend(load_manifest(manifest))
+    for path in inputs or []:
+        if os.path.isdir(path):
+            scenes.extend(discover_scenes(path))
+        else:
+            scenes.append({'name': os.path.splitext(os.path.basename(path))[0], 'input': [path]})
+
+    # Names are used for output folders, so they have to be unique
+    seen = {}
+    for scene in scenes:
+        count = seen.get(scene['name'], 0)
+        seen[scene['name']] = count + 1
+        if count:
+            scene['name'] = f"{scene['name']}_{count + 1}"
+        scene['input'] = [os.path.abspath(p) for p in scene['input']]
+    return scenes
+
+
+# --------------------------------------------------
+# Job graph (scene x product)
+# --------------------------------------------------
+def parse_products(args):
+    products = []
+    for algo in args.transform or []:
+        products.append({'kind': 'transform', 'name': algo.upper(), 'algo': algo.upper()})
+    for spec in args.calc or []:
+        name, sep, formula = spec.partition('=')
+        if not sep or not name.strip() or not formula.strip():
+            raise ValueError(f"Invalid --calc '{spec}' (use NAME=FORMULA)")
+        products.append({'kind': 'calc', 'name': name.strip(), 'formula': formula.strip()})
+    for spec in args.composite or []:
+        name, sep, bands = spec.partition('=')
+        bands = [b.strip() for b in bands.split(',') if b.strip()]
+        if not sep or not name.strip() or len(bands) != 3:
+            raise ValueError(f"Invalid --composite '{spec}' (use NAME=R,G,B)")
+        products.append({'kind': 'composite', 'name': name.strip(), 'bands': bands})
+    if not products:
+        raise ValueError('No products given (use --transform, --calc or --composite)')
+    return products
+
+
+def _aoi_arguments(args):
+    extra = []
+    if args.bbox:
+        extra += ['--bbox', args.bbox]
+    if args.aoi:
+        extra += ['--aoi', args.aoi]
+    if args.bbox or args.aoi:
+        extra += ['--aoi-crs', args.aoi_crs]
+    if args.mask_outside:
+        extra.append('--mask-outside')
+    return extra
+
+
+def _quality_arguments(args):
+    flags = qa_flags_from_args(args)
+    return ['--qa-mask', *flags] if flags else []
+
+
+def build_jobs(scenes, products, args):
+    """Satu job per (scene, product) dengan perintah backend dan signature untuk skip"""
+    jobs = []
+    # AOI and QA masking apply to every product
+    aoi = _aoi_arguments(args) + _quality_arguments(args)
+    for scene in scenes:
+        for product in products:
+            job = {
+                'id': f"{scene['name']}/{product['name']}",
+                'scene': scene['name'],
+                'product': product['name'],
+                'kind': product['kind'],
+                'input': scene['input'],
+            }
+            if product['kind'] == 'transform':
+                job['command'] = backend_command('rasterTransform.py', 'rasterTransform.exe') + [
+                    '-n', scene['name'], '--algo', product['algo'],
+                    '--resampling', args.resampling, '--grid', args.grid,
+                    '--input', *scene['input'], *aoi, '--memory-mb', str(args.job_memory_mb),
+                ] + (['--scratch'] if args.scratch else [])
+            elif product['kind'] == 'calc':
+                job['command'] = backend_command('raster_calculator_standalone (1).py') + [
+                    '-i', *scene['input'], '-f', product['formula'],
+                    '-n', f"{scene['name']}_{product['name']}", *aoi, '--memory-mb', str(args.job_memory_mb),
+                ] + (['--scratch'] if args.scratch else [])
+            else:
+                output = os.path.join('Composite', scene['name'], f"{scene['name']}_{product['name']}.tif")
+                job['output'] = output
+                job['command'] = backend_command('composite2_standalone.py', 'composite2_standalone.exe') + [
+                    '--input', *scene['input'], '--r', product['bands'][0], '--g', product['bands'][1],
+                    '--b', product['bands'][2], '--output', output, *aoi,
+                ] + (['--stretch'] if args.stretch else []) + (['--display', args.display] if args.display else [])
+            job['signature'] = job_signature(job)
+            jobs.append(job)
+    return jobs
+
+
+def job_signature(job):
+    """Hash dari opsi job + identitas file input (path, mtime, ukuran)"""
+    files = []
+    for path in job['input']:
+        paths = [os.path.join(path, n) for n in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for p in paths:
+            if os.path.isfile(p):
+                st = os.stat(p)
+                files.append([os.path.abspath(p), st.st_mtime_ns, st.st_size])
+    # The interpreter / exe path does not change the product
+    options = [a for a in job['command'] if a != sys.executable]
+    payload = json.dumps({'options': options[1:], 'backend': os.path.basename(options[0]), 'files': files})
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def is_up_to_date(job, state):
+    previous = state.get(job['id'])
+    if not previous or previous.get('signature') != job['signature']:
+        return False
+    path = previous.get('path')
+    return bool(path) and os.path.exists(path)
+
+
+# --------------------------------------------------
+# Execution
+# --------------------------------------------------
+def _last_json(lines):
+    for line in reversed(lines):
+        line = line.strip()
+        if line.startswith('{'):
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if result.get('status') in ('success', 'failed', 'cancelled'):
+                return result
+    return None
+
+
+def parse_backend_result(job, returncode, lines, stderr, output_dir):
+    """Ubah stdout backend (JSON atau teks composite) ke format hasil job"""
+    result = {'status': 'failed', 'messages': 'Backend produced no result', 'path': None,
+              'preview_png': None, 'bounds': {}}
+    if job['kind'] == 'composite':
+        if returncode == 0:
+            preview = next((l.split(':', 1)[1].strip() for l in lines if l.startswith('Preview:')), None)
+            result.update(status='success', messages='RGB composite created successfully',
+                          path=os.path.join(output_dir, job['output']),
+                          preview_png=os.path.basename(preview) if preview else None)
+            parsed = _last_json(lines)
+            if parsed and parsed.get('statistics'):
+                result['statistics'] = parsed['statistics']
+        elif any(l.startswith('CANCELLED:') for l in lines):
+            result.update(status='cancelled', messages='Cancelled by request')
+        else:
+            errors = [l for l in lines if l.startswith('ERROR')]
+            result['messages'] = errors[-1][len('ERROR:'):].strip() if errors else result['messages']
+    else:
+        parsed = _last_json(lines)
+        if parsed:
+            result.update(status=parsed['status'], messages=parsed.get('messages'),
+                          preview_png=parsed.get('preview_png'), bounds=parsed.get('bounds') or {})
+            if parsed.get('statistics'):
+                result['statistics'] = parsed['statistics']
+            if parsed.get('path'):
+                result['path'] = os.path.join(output_dir, parsed['path'])
+
+    if result['status'] == 'failed' and returncode and not lines and stderr:
+        result['messages'] = stderr.strip().splitlines()[-1]
+    return result
+
+
+def parse_data_result(returncode, lines, stderr, output_dir):
+    """Hasil lengkap backend data (zonal, sample): seluruh JSON terakhir diteruskan apa adanya"""
+    parsed = _last_json(lines)
+    if parsed is None:
+        result = {'status': 'failed', 'messages': 'Backend produced no result'}
+        if returncode and stderr:
+            result['messages'] = stderr.strip().splitlines()[-1]
+        return result
+    if parsed.get('path'):
+        parsed['path'] = os.path.join(output_dir, parsed['path'])
+    return parsed
+
+
+def run_job(job, output_dir):
+    """Jalankan satu backend dan ubah hasilnya ke format hasil batch"""
+    start = time.perf_counter()
+    if job.get('output'):
+        # Composite backend writes to --output as given and does not create folders
+        os.makedirs(os.path.join(output_dir, os.path.dirname(job['output'])), exist_ok=True)
+    try:
+        proc = subprocess.run(job['command'], cwd=output_dir, capture_output=True, text=True)
+        returncode, lines, stderr = proc.returncode, proc.stdout.splitlines(), proc.stderr
+    except Exception as e:
+        returncode, lines, stderr = None, [f'ERROR: {e}'], ''
+
+    result = parse_backend_result(job, returncode, lines, stderr, output_dir)
+    result['elapsed'] = round(time.perf_counter() - start, 2)
+    return result
+
+
+def default_workers(job_memory_mb=JOB_MEMORY_MB):
+    """Jumlah worker: dibatasi jumlah core dan memori yang tersedia"""
+    cores = os.cpu_count() or 1
+    free = available_memory()
+    if free is None:
+        return max(1, min(cores, 4))
+    return max(1, min(cores, int(free // (job_memory_mb * 1024 * 1024))))
+
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+
+def emit(record):
+    print(json.dumps(record), flush=True)
+
+
+def run_batch(jobs, output_dir, workers, force=False):
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_FILE)
+    state = load_state(state_path)
+    total = len(jobs)
+    counts = {'success': 0, 'skipped': 0, 'failed': 0}
+
+    def finish(job, result):
+        # Selalu dipanggil dari thread utama (as_completed), jadi state tidak perlu lock
+        counts[result['status'] if result['status'] in counts else 'failed'] += 1
+        if result['status'] == 'success':
+            state[job['id']] = dict(result, signature=job['signature'])
+            save_state(state_path, state)
+        emit(dict(result, job=job['id'], scene=job['scene'], product=job['product'],
+                  done=sum(counts.values()), total=total))
+
+    pending = []
+    for job in jobs:
+        if not force and is_up_to_date(job, state):
+            previous = {k: v for k, v in state[job['id']].items() if k != 'signature'}
+            finish(job, dict(previous, status='skipped', messages='Up to date', elapsed=0.0))
+        else:
+            pending.append(job)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(run_job, job, output_dir): job for job in pending}
+        for future in as_completed(futures):
+            finish(futures[future], future.result())
+
+    status = 'failed' if counts['failed'] and not (counts['success'] or counts['skipped']) else 'success'
+    emit({
+        'status': status,
+        'messages': f"Batch finished: {counts['success']} done, {counts['skipped']} up to date, "
+                    f"{counts['failed']} failed",
+        'total': total,
+        'succeeded': counts['success'],
+        'skipped': counts['skipped'],
+        'failed': counts['failed'],
+        'state': state_path,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch raster processing over many scenes')
+    parser.add_argument('-i', '--input', nargs='*', default=[],
+                        help='Scene files or folders (a folder of scenes, or one folder of per-band files)')
+    parser.add_argument('--manifest', help='JSON list of scenes ({"name", "input"}) or text file, one input per line')
+    parser.add_argument('-o', '--output', default='BATCH', help='Output folder (default BATCH)')
+    parser.add_argument('--transform', nargs='+', type=str.upper, choices=TRANSFORM_ALGORITHMS,
+                        help='Index products, e.g. --transform NDVI EVI')
+    parser.add_argument('--calc', action='append', help='Formula product NAME=FORMULA, e.g. ndwi="(b3-b5)/(b3+b5)"')
+    parser.add_argument('--composite', action='append', help='Composite product NAME=R,G,B, e.g. falsecolor=5,4,3')
+    parser.add_argument('--stretch', action='store_true', help='Percentile stretch for composites')
+    parser.add_argument('--display', choices=('uint8', 'uint16'),
+                        help='Write composites as compact stretched RGB + alpha display products')
+    parser.add_argument('--scratch', action='store_true',
+                        help='Write transform/calc products uncompressed for fast re-reads (e.g. by raster_temporal)')
+    parser.add_argument('--resampling', default='nearest', choices=RESAMPLING_CHOICES)
+    parser.add_argument('--grid', default='finest')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Parallel jobs (default: from CPU cores and free memory)')
+    parser.add_argument('--job-memory-mb', type=int, default=JOB_MEMORY_MB,
+                        help='Memory budget per job: sets the default worker count and is passed to '
+                             'transform/calc jobs as --memory-mb')
+    parser.add_argument('--force', action='store_true', help='Re-run jobs that are already up to date')
+    parser.add_argument('--dry-run', action='store_true', help='Only print the job list')
+    add_aoi_arguments(parser)
+    add_quality_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        scenes = collect_scenes(args.input, args.manifest)
+        if not scenes:
+            raise ValueError('No scenes found')
+        products = parse_products(args)
+        jobs = build_jobs(scenes, products, args)
+    except Exception as e:
+        emit({'status': 'failed', 'messages': str(e)})
+        sys.exit(1)
+
+    workers = args.workers or default_workers(args.job_memory_mb)
+    if args.dry_run:
+        emit({'status': 'success', 'messages': f'{len(jobs)} jobs over {len(scenes)} scenes',
+              'workers': workers, 'jobs': [{'job': j['id'], 'input': j['input']} for j in jobs]})
+        return
+
+    emit({'status': 'info', 'messages': f'{len(jobs)} jobs over {len(scenes)} scenes, {workers} workers',
+          'total': len(jobs)})
+    run_batch(jobs, os.path.abspath(args.output), workers, force=args.force)
+
+
+if __name__ == '__main__':
+    main()
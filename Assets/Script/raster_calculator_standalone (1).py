@@ -1,17 +1,77 @@
 import argparse
 import json
 import os
+import re
 import sys
+import time
 from datetime import datetime
 import rasterio
 import numpy as np
 from PIL import Image
-import cv2
+
+from raster_common import (
+    open_band_set, open_band_sets, MultiBandSet, build_band_vrt, resolve_region, add_aoi_arguments, aoi_options_from_args,
+    TILED_PROFILE, expand_window, normalize_key, EXTENT_CHOICES, RESAMPLING_CHOICES,
+    BandStatistics, write_statistics, lonlat_bounds, add_display_arguments, display_options_from_args,
+    output_display_grid, write_display_tif, geotiff_profile, scratch_profile, add_scratch_arguments,
+    Progress, Cancelled, PreviewCanvas, remove_outputs, add_progress_arguments,
+    plan_memory, source_layout, add_memory_arguments,
+    QualityMask, QA_DEFAULT_FLAGS, add_quality_arguments, qa_flags_from_args,
+    cv2,  # lazy: only imported when the preview is resized
+)
+from raster_expression import ArrayCache, FormulaEvaluator, file_identity, resolve_reductions, estimated_passes
+
+# Named inputs for multi-file formulas: -i a=before.tif b=after.tif -> a.b5, b.b5
+INPUT_ALIAS = re.compile(r'^([A-Za-z_]\w*)=(.+)$')
+
+# --change presets over the 'before' and 'after' inputs
+CHANGE_FORMULAS = {
+    'diff': 'after.{band} - before.{band}',
+    'ratio': 'after.{band} / before.{band}',
+    'relative': '(after.{band} - before.{band}) / np.abs(before.{band})',
+    # -1 decrease, 0 no change, 1 increase (|diff| above the threshold)
+    'mask': 'np.sign(after.{band} - before.{band}) * (np.abs(after.{band} - before.{band}) > {threshold})',
+}
+
+
+def parse_inputs(inputs):
+    """-i list -> list of paths, or {alias: [paths]} when every entry is NAME=PATH"""
+    if isinstance(inputs, (str, dict)):
+        return inputs
+    matches = [None if os.path.exists(p) else INPUT_ALIAS.match(p) for p in inputs]
+    if not any(matches):
+        return list(inputs)
+    if not all(matches):
+        raise ValueError('Mix of named (a=path) and plain inputs; name every input or none')
+    named = {}
+    for match in matches:
+        named.setdefault(match.group(1), []).append(match.group(2))
+    return named
+
+
+def band_key(name):
+    """Nama band formula -> key band set: 'b5' -> '5', 'a.b5' -> 'a.5' (None jika bukan band)"""
+    alias, _, band = name.rpartition('.')
+    if not band.startswith('b') or len(band) < 2:
+        return None
+    return f'{alias}.{normalize_key(band[1:])}' if alias else band[1:]
+
 
 class Data:
-    def __init__(self, name, formula):
+    def __init__(self, name, formula, aoi_options=None, cache=None, resampling='nearest', extent='intersection',
+                 display_options=None, progress=None, memory_mb=None, scratch=False, qa_flags=None):
         self.prefix_name = name
         self.formula = formula
+        self.aoi_options = aoi_options or {}
+        self.cache = cache  # ArrayCache shared across requests in --serve mode
+        self.resampling = resampling  # Alignment kernel for bands/inputs on another grid
+        self.extent = extent          # Common extent of named inputs: intersection / union
+        self.display_options = display_options or {}  # web_mercator / display_tif / size
+        self.progress = progress or Progress()  # JSON-lines events + cancel checks (--progress)
+        self.memory_mb = memory_mb     # Memory budget for the window/thread plan (None = from free RAM)
+        self.scratch = scratch         # Uncompressed output for batch/temporal intermediates
+        self.qa_flags = qa_flags       # QA flags read as NaN in every band (None = no QA masking)
+        self.quality = None
         self.base_folder = 'Calculator'
         
         # Use same name for prefix and output folder
@@ -29,6 +89,10 @@ class Data:
         self.png_filename = f'{self.prefix_name}_custom_{self.ymdhms}_preview.png'
         self.png_path = os.path.join(self.folder_output, self.png_filename)
 
+        # Optional EPSG:3857 overview GeoTIFF (--display-tif)
+        self.display_filename = f'{self.prefix_name}_custom_{self.ymdhms}_3857.tif'
+        self.display_path = os.path.join(self.folder_output, self.display_filename)
+
         self.status = 'running'
         self.messages = 'Initializing...'
 
@@ -36,94 +100,305 @@ class Data:
         self.now = datetime.now()
         self.ymdhms = datetime.now().strftime('%y%m%d%H%M%S')
 
+    def _band_scope(self, src, window, out_shape=None):
+        """Kunci cache: identitas file input + window + resolusi baca"""
+        files = tuple(file_identity(p) for p in src.paths)
+        win = None if window is None else (int(window.col_off), int(window.row_off), int(window.width), int(window.height))
+        return (files, src.resampling, src.grid[1], win, out_shape, self.qa_flags)
+
+    def _evaluator(self, src):
+        # --- VALIDATE FORMULA VARIABLES ---
+        # Formula is parsed into a canonical expression DAG; band names (b1, b2, ...)
+        # must exist in the input. Per-band inputs use the band number from the
+        # filename (SR_B5 -> b5). Only referenced bands are read, each from its own file.
+        # Named inputs (-i a=... b=...) are addressed as a.b5, b.b5
+        evaluator = FormulaEvaluator(self.formula, cache=self.cache)
+        for name in evaluator.band_names():
+            key = band_key(name)
+            if key is None or not src.has(key):
+                raise ValueError(f"Formula evaluation failed: name '{name}' is not defined")
+        self.quality = QualityMask(src, self.qa_flags) if self.qa_flags else None
+        return evaluator
+
+    def _open(self, input_path):
+        """Band set untuk satu input, atau grid bersama untuk input ber-alias"""
+        inputs = parse_inputs(input_path)
+        if isinstance(inputs, dict):
+            return open_band_sets(inputs, resampling=self.resampling, extent=self.extent)
+        return open_band_set(inputs, resampling=self.resampling)
+
+    def _band_reader(self, src, window, out_shape=None):
+        def read_band(name):
+            # Read band as float32 for calculation
+            data = src.read(band_key(name), window=window, out_shape=out_shape)
+            if self.quality:
+                # Pixels flagged in the QA band read as NaN (use np.nanmean etc. for scene statistics)
+                flagged = self.quality.read(window, out_shape, key=band_key(name))
+                if flagged is not None:
+                    data[flagged] = np.nan
+            return data
+        return read_band
+
+    def _evaluate(self, evaluator, src, window, out_shape=None, node=None):
+        """Evaluasi formula (atau satu node) untuk satu window, termasuk halo untuk fungsi focal"""
+        node = evaluator.tree.body if node is None else node
+
+        # Focal functions (focal_mean, sobel, ...) need neighbours: read the window
+        # with a halo and crop afterwards so tile seams are invisible
+        halo = 0 if out_shape else evaluator.halo(node)
+        read_window, crop = expand_window(window, halo, src.width, src.height)
+
+        # --- CALCULATION ---
+        try:
+            # Evaluate the formula
+            # Note: only bands, numbers, np.* and focal functions are reachable from a formula.
+            # 1e-6 is often used for stability in division, user might include it in formula or we can suggest it.
+            # The user provided formula logic in raster_calculator.py usually assumes GEE syntax
+            # but here we use Python/Numpy syntax. b1 + b2 works in both.
+            # Sub-expressions shared with earlier formulas come from the cache (see --serve).
+            result = evaluator.evaluate_node(node, self._band_reader(src, read_window, out_shape),
+                                             self._band_scope(src, read_window, out_shape))
+
+        except Exception as eval_err:
+            raise ValueError(f"Formula evaluation failed: {eval_err}")
+
+        # Handle result
+        if result is None:
+            raise ValueError("Calculation resulted in None")
+        shape = out_shape or (int(read_window.height), int(read_window.width))
+        return np.broadcast_to(np.asarray(result, dtype=np.float32), shape)[crop]
+
     def run(self, input_path):
         try:
-            if not os.path.exists(input_path):
-                raise FileNotFoundError(f"Input file not found: {input_path}")
-
-            with rasterio.open(input_path) as src:
-                # Prepare context for eval
-                context = {'np': np}
-                
-                # Dynamic band loading: b1, b2, ...
-                # We load all bands available in the image
-                for i in range(1, src.count + 1):
-                    # Read band as float32 for calculation
-                    band_data = src.read(i).astype(np.float32)
-                    context[f'b{i}'] = band_data
-
-                # --- VALIDATE FORMULA VARIABLES ---
-                # Check if formula uses bands that don't exist
-                # This is a basic check. eval() will fail if variable is missing.
-                
-                # --- CALCULATION ---
-                try:
-                    # Evaluate the formula
-                    # Note: We trust the user implementation/input as this is a local tool.
-                    # Security warning: eval() is dangerous if input is untrusted, 
-                    # but here it is a local tool executing user command.
-                    
-                    # 1e-6 is often used for stability in division, user might include it in formula or we can suggest it.
-                    # The user provided formula logic in raster_calculator.py usually assumes GEE syntax 
-                    # but here we use Python/Numpy syntax. b1 + b2 works in both.
-                    
-                    result = eval(self.formula, {"__builtins__": None}, context)
-                    
-                except Exception as eval_err:
-                    raise ValueError(f"Formula evaluation failed: {eval_err}")
+            with self._open(input_path) as src:
+                # Only the AOI window is read (whole raster without --bbox/--aoi)
+                region = resolve_region(src, **self.aoi_options)
+                evaluator = self._evaluator(src)
+                # Named inputs: pixels an input does not cover stay nodata instead of 0;
+                # the same holds for bands warped beyond their own footprint and for
+                # pixels flagged in the QA band
+                keep_missing = isinstance(src, MultiBandSet) or src.is_mixed_grid or bool(self.quality)
 
-                # Handle result
-                if result is None:
-                    raise ValueError("Calculation resulted in None")
+                # Window size and GDAL threads from the memory budget (formula DAG size,
+                # focal halo and reduction passes decide the per-pixel cost)
+                plan = self.memory_plan(evaluator, src, region)
+                windows = list(region.windows(plan.window))
 
-                # Handle NaN/Inf
-                result = np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0)
+                # Scene-wide reductions (np.mean(b4), np.percentile(b4, 98), ...) are computed
+                # first in streaming statistics passes and substituted as constants, so the
+                # per-pixel pass below can run window by window with the same results
+                self.progress.stage('statistics')
+                try:
+                    passes = resolve_reductions(
+                        evaluator, [w for w, _ in windows],
+                        lambda node, w: self._checked(self._evaluate(evaluator, src, w, node=node)),
+                        tag=repr(self._band_scope(src, region.window)),
+                    )
+                except Cancelled:
+                    raise
+                except Exception as eval_err:
+                    message = str(eval_err)
+                    if not message.startswith('Formula evaluation failed'):
+                        message = f"Formula evaluation failed: {message}"
+                    raise ValueError(message)
 
                 # Prepare profile for output
-                profile = src.profile.copy()
+                profile = region.update_profile(src.profile.copy())
                 profile.update(
                     dtype=rasterio.float32,
                     count=1,
-                    compress='lzw'
+                    compress='lzw',
+                    **TILED_PROFILE
                 )
-                
-                # Reshape if necessary
-                if result.ndim == 2:
-                    result = result[np.newaxis, :, :]
+                if region.is_masked or keep_missing:
+                    profile.update(nodata=np.nan)
+                profile.update(num_threads=plan.threads)
+                if self.scratch:
+                    profile = scratch_profile(profile)
+
+                # --progress: quick preview from decimated bands before the full pass
+                if self.progress.enabled:
+                    self.progress.stage('coarse_preview')
+                    self.coarse_preview(evaluator, src, region)
+
+                # Write output window by window, tracking the range for the preview
+                self.progress.stage('write', total=len(windows))
+                canvas = PreviewCanvas(region.width, region.height) if self.progress.enabled else None
+                band_stats = BandStatistics()
+                with rasterio.Env(**plan.env()), \
+                        rasterio.open(self.output_final_path, 'w', **geotiff_profile(profile)) as dst:
+                    for window, dst_window in windows:
+                        result = self._evaluate(evaluator, src, window)
+
+                        # Handle NaN/Inf (boolean masks become 0/1 float)
+                        missing = np.isnan(result) if keep_missing else None
+                        result = np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0)
+                        if missing is not None:
+                            result[missing] = np.nan
+
+                        # Pixels outside the AOI polygon become nodata
+                        outside = region.outside_mask(dst_window)
+                        if outside is not None:
+                            result = np.where(outside, np.nan, result)
 
-                # Write output
-                with rasterio.open(self.output_final_path, 'w', **profile) as dst:
-                    dst.write(result.astype(rasterio.float32))
+                        band_stats.update(result)
+
+                        dst.write(result[np.newaxis, :, :].astype(rasterio.float32), window=dst_window)
+
+                        # Cancel check at the window boundary; refined previews at 25/50/75%
+                        if canvas is not None:
+                            canvas.paste(dst_window, result[np.newaxis, :, :])
+                        self.progress.advance()
+                        if self.progress.preview_due() and band_stats.n:
+                            self.create_preview(canvas.data[0], (band_stats.vmin, band_stats.vmax))
+                            self.progress.preview(self.png_path, 'refined')
+
+            # Statistics/histogram sidecar (.aux.xml), accumulated during the write pass
+            statistics = write_statistics(self.output_final_path, [band_stats])
 
             # Success
             self.status = 'success'
             self.messages = f'Calculation successful: {self.formula}'
             
-            # Create Preview
-            self.create_preview(result[0])
+            # Create Preview (decimated read of the result, stretched with the full range);
+            # --web-mercator warps it to EPSG:3857 with a warp grid cached per source grid
+            value_range = (statistics[0]['min'], statistics[0]['max']) if statistics[0]['count'] else (0.0, 0.0)
+            display = output_display_grid(self.output_final_path, self.display_options)
+            if display:
+                with rasterio.open(self.output_final_path) as src:
+                    display_data = display.read(src)
+                self.create_preview(display_data[0], value_range)
+            else:
+                self.create_preview(read_preview_array(self.output_final_path), value_range)
             
             # Get Bounds
-            bounds = self.get_bounds(self.output_final_path)
+            bounds = display.bounds() if display else self.get_bounds(self.output_final_path)
+
+            extra = {'stat_passes': passes, 'statistics': statistics,
+                     'plan': {'window': plan.window, 'threads': plan.threads, 'peak_mb': plan.peak_mb}}
+            if self.quality:
+                extra['qa_mask'] = self.quality.describe()
+            if display:
+                extra.update(display_crs='EPSG:3857', warp_cached=display.cached)
+                if self.display_options.get('display_tif'):
+                    write_display_tif(self.display_path, display, display_data)
+                    extra['display_tif'] = self.display_filename
             
-            self._print_result(bounds)
+            self.progress.preview(self.png_path, 'final')
+            self._print_result(bounds, extra=extra)
+
+        except Cancelled as e:
+            # Stopped at a window boundary: nothing half-written is left behind
+            remove_outputs(self.output_final_path, self.png_path, self.display_path)
+            self.status = 'cancelled'
+            self.messages = str(e)
+            self._print_result()
 
         except Exception as e:
             self.status = 'failed'
             self.messages = str(e)
             self._print_result()
 
-    def create_preview(self, data, max_size=1024):
+    def memory_plan(self, evaluator, src, region):
+        """Rencana window/thread untuk formula ini"""
+        keys = list(dict.fromkeys(band_key(name) for name in evaluator.band_names()))
+        if self.quality:
+            keys += self.quality.keys
+        source_bytes, blocks = source_layout(src, keys)
+        return plan_memory(
+            region.width, region.height, bands_in=len(keys), bands_out=1,
+            source_bytes=source_bytes, source_blocks=blocks,
+            temporaries=evaluator.temporaries(), halo=evaluator.halo(),
+            passes=estimated_passes(evaluator.tree), budget_mb=self.memory_mb,
+        )
+
+    def explain(self, input_path):
+        """Cetak rencana memori/IO tanpa menghitung formula"""
+        try:
+            with self._open(input_path) as src:
+                region = resolve_region(src, **self.aoi_options)
+                plan = self.memory_plan(self._evaluator(src), src, region)
+            print(json.dumps({'status': 'success', 'mode': 'explain', 'formula': self.formula,
+                              'plan': plan.to_dict()}))
+        except Exception as e:
+            print(json.dumps({'status': 'failed', 'mode': 'explain', 'messages': str(e), 'formula': self.formula}))
+
+    def _checked(self, value):
+        # Cancel point inside the statistics passes
+        self.progress.check()
+        return value
+
+    def coarse_preview(self, evaluator, src, region, size=256):
+        """Preview kasar dari band decimated, sebelum pass penuh"""
+        scale = min(1.0, size / max(region.width, region.height))
+        out_shape = (max(1, round(region.height * scale)), max(1, round(region.width * scale)))
+        result = self._evaluate(evaluator, src, region.window, out_shape=out_shape)
+        result = np.where(np.isfinite(result), result, np.nan)
+        outside = region.outside_mask(out_shape=out_shape)
+        if outside is not None:
+            result = np.where(outside, np.nan, result)
+        if np.isfinite(result).any():
+            self.create_preview(result)
+            self.progress.preview(self.png_path, 'coarse')
+
+    def run_preview(self, input_path, size=512):
+        """Evaluasi formula pada band yang di-decimate (cepat, untuk cek formula sebelum commit)"""
+        started = time.perf_counter()
+        try:
+            with self._open(input_path) as src:
+                region = resolve_region(src, **self.aoi_options)
+
+                # Screen-sized read: GDAL serves it from overviews when the file has them
+                scale = min(1.0, size / max(region.width, region.height))
+                out_shape = (max(1, round(region.height * scale)), max(1, round(region.width * scale)))
+
+                # Decimated arrays are small, so reductions are evaluated directly on them
+                result = self._evaluate(self._evaluator(src), src, region.window, out_shape=out_shape)
+
+                outside = region.outside_mask(out_shape=out_shape)
+                stats = preview_statistics(result, outside)
+
+                # Same display as the full run (NaN/Inf -> 0, outside AOI transparent)
+                display = np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0)
+                if isinstance(src, MultiBandSet) or self.quality:
+                    display[np.isnan(result)] = np.nan
+                if outside is not None:
+                    display = np.where(outside, np.nan, display)
+
+            self.png_filename = f'{self.prefix_name}_formula_preview.png'
+            self.png_path = os.path.join(self.folder_output, self.png_filename)
+            self.create_preview(display)
+
+            self.status = 'success'
+            self.messages = f'Preview successful: {self.formula}'
+            self._print_result(region.bounds(src.crs), extra={
+                'mode': 'preview',
+                'shape': [int(out_shape[0]), int(out_shape[1])],
+                'full_shape': [region.height, region.width],
+                'stats': stats,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            })
+
+        except Exception as e:
+            self.status = 'failed'
+            self.messages = str(e)
+            self._print_result(extra={'mode': 'preview'})
+
+    def create_preview(self, data, value_range=None, max_size=1024):
         try:
             # Normalize Min-Max
-            min_val = np.nanmin(data)
-            max_val = np.nanmax(data)
+            if value_range is None:
+                min_val = np.nanmin(data)
+                max_val = np.nanmax(data)
+            else:
+                min_val, max_val = value_range
             
             if max_val - min_val > 0:
                 norm = (data - min_val) / (max_val - min_val) * 255
             else:
                 norm = data * 0
             
-            img_array = np.clip(norm, 0, 255).astype(np.uint8)
+            img_array = np.clip(np.nan_to_num(norm), 0, 255).astype(np.uint8)
             
             # Resize
             h, w = img_array.shape
@@ -139,20 +414,15 @@ class Data:
             print(f"Warning: Failed to create preview: {e}", file=sys.stderr)
 
     def get_bounds(self, tif_path):
+        """Bounds hasil dalam derajat lon/lat (overlay peta), bukan CRS asli raster"""
         try:
             with rasterio.open(tif_path) as src:
-                bounds = src.bounds
-                return {
-                    "north": float(bounds.top),
-                    "south": float(bounds.bottom),
-                    "west": float(bounds.left),
-                    "east": float(bounds.right)
-                }
+                return lonlat_bounds(src.crs, src.bounds)
         except Exception:
             return {}
 
 
-    def _print_result(self, bounds=None):
+    def _print_result(self, bounds=None, extra=None):
         result = {
             'status': self.status,
             'messages': self.messages,
@@ -162,48 +432,204 @@ class Data:
             'bounds': bounds if bounds else {},
             'formula': self.formula
         }
-        print(json.dumps(result))
+        if self.status == 'success' and extra and extra.get('mode') == 'preview':
+            # Preview mode does not write a GeoTIFF
+            result['filename'] = None
+            result['path'] = None
+        if extra:
+            result.update(extra)
+        print(json.dumps(result), flush=True)
+
+def read_preview_array(tif_path, max_size=1024):
+    """Baca band 1 hasil secara decimated (tanpa memuat raster penuh)"""
+    with rasterio.open(tif_path) as src:
+        scale = min(1.0, max_size / max(src.width, src.height))
+        out_shape = (max(1, int(src.height * scale)), max(1, int(src.width * scale)))
+        return src.read(1, out_shape=out_shape).astype(np.float32)
+
+def preview_statistics(data, outside=None):
+    """Statistik nilai (finite saja) untuk preview formula"""
+    valid = np.isfinite(data)
+    if outside is not None:
+        valid &= ~outside
+    values = data[valid]
+    if values.size == 0:
+        return {'valid_pixels': 0}
+    p2, p50, p98 = np.percentile(values, (2, 50, 98))
+    return {
+        'valid_pixels': int(values.size),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'p2': float(p2),
+        'median': float(p50),
+        'p98': float(p98),
+    }
 
 def get_bands(file_path):
     try:
-        if not os.path.exists(file_path):
-            print(json.dumps({'status': 'failed', 'message': f"File not found: {file_path}"}))
+        paths = [file_path] if isinstance(file_path, str) else list(file_path)
+        missing = [p for p in paths if not os.path.exists(p)]
+        if missing:
+            print(json.dumps({'status': 'failed', 'message': f"File not found: {missing[0]}"}))
             return
 
-        with rasterio.open(file_path) as src:
+        with open_band_set(paths) as src:
             bands = []
             # Try to get descriptions, fallback to Index
-            for i in range(1, src.count + 1):
-                desc = src.descriptions[i-1]
-                if desc:
+            for key in src.keys:
+                ds, bidx = src.dataset(key)
+                desc = ds.descriptions[bidx - 1]
+                if desc and src.is_single_file:
                     bands.append(desc)
                 else:
-                    bands.append(f"b{i}")
+                    bands.append(f"b{key}")
             
-            print(json.dumps({'status': 'success', 'bands': bands, 'count': src.count, 'type': 'GeoTIFF'}))
+            input_type = 'GeoTIFF' if src.is_single_file else 'BandSet'
+            print(json.dumps({'status': 'success', 'bands': bands, 'count': src.count, 'type': input_type}))
 
     except Exception as e:
         print(json.dumps({'status': 'failed', 'message': f"Failed to read bands: {str(e)}"}))
 
+def serve(cache_mb=512):
+    """Backend persisten: satu request JSON per baris di stdin, satu hasil JSON per baris di stdout
+
+    Request fields: input (path, list, or {alias: path} for a.b5 formulas), formula, name,
+    preview, preview_size, bbox, aoi, aoi_crs, mask_outside, resampling, extent, memory_mb, scratch, qa_mask (list of flags, or true for the defaults).
+    Commands: {"cmd": "stats"}, {"cmd": "clear"}, {"cmd": "exit"}.
+    Band reads and sub-expressions stay cached between requests, so refining a
+    formula step by step only computes the new parts.
+    """
+    cache = ArrayCache(max_bytes=cache_mb * 1024 * 1024)
+    sys.stdout.reconfigure(line_buffering=True)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            print(json.dumps({'status': 'failed', 'messages': f'Invalid request: {e}'}))
+            continue
+
+        cmd = request.get('cmd')
+        if cmd == 'exit':
+            break
+        if cmd == 'clear':
+            cache.clear()
+        if cmd in ('stats', 'clear'):
+            print(json.dumps({'status': 'success', 'cache': cache.stats()}))
+            continue
+
+        if not all(request.get(k) for k in ('input', 'formula', 'name')):
+            print(json.dumps({'status': 'failed', 'messages': 'Fields input, formula and name are required'}))
+            continue
+
+        aoi_options = {
+            'bbox': request.get('bbox'),
+            'aoi': request.get('aoi'),
+            'aoi_crs': request.get('aoi_crs', 'lonlat'),
+            'mask': bool(request.get('mask_outside')),
+        }
+        data = Data(request['name'], request['formula'], aoi_options=aoi_options, cache=cache,
+                    resampling=request.get('resampling', 'nearest'), extent=request.get('extent', 'intersection'),
+                    progress=Progress(enabled=bool(request.get('progress'))),
+                    memory_mb=request.get('memory_mb'), scratch=bool(request.get('scratch')),
+                    qa_flags=None if request.get('qa_mask') in (None, False)
+                    else tuple(request['qa_mask'] if isinstance(request['qa_mask'], list) else ()) or QA_DEFAULT_FLAGS,
+                    display_options={
+                        'web_mercator': bool(request.get('web_mercator') or request.get('display_tif')),
+                        'display_tif': bool(request.get('display_tif')),
+                        'size': int(request.get('display_size', 1024)),
+                    })
+        if request.get('preview'):
+            data.run_preview(request['input'], size=int(request.get('preview_size', 512)))
+        else:
+            data.run(request['input'])
+
 def main():
     parser = argparse.ArgumentParser(description='Standalone Raster Calculator')
-    parser.add_argument('-i', '--input', required=False, help='Input Image Path (TIFF)')
-    parser.add_argument('-f', '--formula', required=False, help='Formula (e.g., "(b5-b4)/(b5+b4)")')
+    parser.add_argument('-i', '--input', required=False, nargs='+',
+                        help='Input Image Path (TIFF/VRT), a folder of per-band files, or a list of per-band files; '
+                             'several named inputs as a=before.tif b=after.tif (formula uses a.b5, b.b5)')
+    parser.add_argument('-f', '--formula', required=False,
+                        help='Formula (e.g., "(b5-b4)/(b5+b4)"); focal_mean/std/min/max/median(x, size) and sobel(x) are available')
     parser.add_argument('-n', '--name', required=False, help='Output Prefix Name')
-    parser.add_argument('-b', '--bands', required=False, help='Check bands in file (Input Path)')
+    parser.add_argument('-b', '--bands', required=False, nargs='+', help='Check bands in file (Input Path)')
+    parser.add_argument('--build-vrt', required=False,
+                        help='Write a VRT referencing the per-band files of -i (no pixel copy) and exit')
+    parser.add_argument('--preview', action='store_true',
+                        help='Evaluate the formula on decimated bands and only write a preview PNG + statistics')
+    parser.add_argument('--preview-size', type=int, default=512,
+                        help='Longest side (pixels) of the preview evaluation grid')
+    parser.add_argument('--resampling', default='nearest', choices=RESAMPLING_CHOICES,
+                        help='Kernel used to align bands or named inputs that are on a different grid (per window)')
+    parser.add_argument('--extent', default='intersection', choices=EXTENT_CHOICES,
+                        help='Common extent of named inputs (pixels an input does not cover become nodata)')
+    parser.add_argument('--change', choices=sorted(CHANGE_FORMULAS),
+                        help='Two-date change detection between --before and --after (replaces -i/-f)')
+    parser.add_argument('--before', help='Earlier raster for --change (e.g. NDVI of the first date)')
+    parser.add_argument('--after', help='Later raster for --change')
+    parser.add_argument('--change-band', default='1', help='Band compared by --change (default 1)')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Minimum absolute difference counted as change by --change mask')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run as a persistent backend reading JSON requests from stdin (keeps a formula cache)')
+    parser.add_argument('--cache-mb', type=int, default=512,
+                        help='Size limit of the band/sub-expression cache in --serve mode')
+    add_aoi_arguments(parser)
+    add_display_arguments(parser)
+    add_progress_arguments(parser)
+    add_memory_arguments(parser)
+    add_scratch_arguments(parser)
+    add_quality_arguments(parser)
     
     args = parser.parse_args()
 
+    if args.serve:
+        serve(cache_mb=args.cache_mb)
+        return
+
     if args.bands:
         get_bands(args.bands)
         return
 
+    if args.build_vrt:
+        if not args.input:
+            parser.error("Argument -i is required for --build-vrt.")
+        try:
+            with open_band_set(args.input) as src:
+                build_band_vrt(src, args.build_vrt)
+            print(json.dumps({'status': 'success', 'path': args.build_vrt}))
+        except Exception as e:
+            print(json.dumps({'status': 'failed', 'message': str(e)}))
+        return
+
+    if args.change:
+        if not all([args.before, args.after, args.name]):
+            parser.error("Arguments --before, --after and -n are required for --change.")
+        # Change detection is a formula over two named inputs on a common grid
+        args.input = [f'before={args.before}', f'after={args.after}']
+        args.formula = CHANGE_FORMULAS[args.change].format(
+            band=f'b{normalize_key(args.change_band)}', threshold=repr(abs(args.threshold)))
+
     if not all([args.input, args.formula, args.name]):
         parser.error("Arguments -i, -f, and -n are required for calculation.")
     
     # Instantiate and Run
-    data = Data(args.name, args.formula)
-    data.run(args.input)
+    data = Data(args.name, args.formula, aoi_options=aoi_options_from_args(args),
+                resampling=args.resampling, extent=args.extent,
+                display_options=display_options_from_args(args),
+                progress=Progress(enabled=args.progress).listen(), memory_mb=args.memory_mb,
+                scratch=args.scratch, qa_flags=qa_flags_from_args(args))
+    if args.explain:
+        data.explain(args.input)
+    elif args.preview:
+        data.run_preview(args.input, size=args.preview_size)
+    else:
+        data.run(args.input)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,502 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import rasterio
+from affine import Affine
+from PIL import Image
+from rasterio.features import shapes
+from rasterio.warp import transform as transform_coords
+
+from raster_common import (
+    iter_windows, geotiff_profile, lonlat_bounds, Progress, Cancelled, remove_outputs, add_progress_arguments,
+    BLOCK_SIZE, TILED_PROFILE, LONLAT_CRS,
+)
+
+# --------------------------------------------------
+# Classification + polygonization
+# --------------------------------------------------
+# Index values are binned with np.digitize into a uint8 class raster (0 =
+# nodata) with a color table, window by window. The same windows are
+# polygonized right away. Polygons that end on a window seam are kept as
+# pixel-corner rings and merged afterwards: the shared seam edges of
+# neighbouring pieces cancel out and the remaining edges are chained back into
+# rings, so no full-size raster or geometry library is needed.
+
+PRESETS = {
+    'ndvi': {
+        'breaks': [0.0, 0.2, 0.5],
+        'labels': ['water', 'bare', 'sparse', 'dense'],
+        'colors': ['#2c7bb6', '#d8b365', '#a6d96a', '#1a9641'],
+    },
+    'ndbi': {
+        'breaks': [-0.1, 0.1],
+        'labels': ['vegetation', 'mixed', 'built-up'],
+        'colors': ['#1a9641', '#fdae61', '#d7191c'],
+    },
+    'ndwi': {
+        'breaks': [0.0, 0.3],
+        'labels': ['dry', 'moist', 'water'],
+        'colors': ['#d8b365', '#91bfdb', '#2c7bb6'],
+    },
+}
+
+DEFAULT_COLORS = ['#2c7bb6', '#abd9e9', '#ffffbf', '#fdae61', '#d7191c', '#1a9641', '#a6d96a', '#762a83']
+
+
+def parse_color(text):
+    text = text.lstrip('#')
+    if len(text) != 6:
+        raise ValueError(f"Invalid color '#{text}' (use #rrggbb)")
+    return tuple(int(text[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def classify(values, breaks, nodata=None):
+    """Nilai -> kelas uint8 (1..len(breaks)+1), 0 untuk nodata/NaN"""
+    classes = (np.digitize(values, breaks) + 1).astype(np.uint8)
+    invalid = ~np.isfinite(values)
+    if nodata is not None and not np.isnan(nodata):
+        invalid |= values == nodata
+    classes[invalid] = 0
+    return classes
+
+
+# --------------------------------------------------
+# Ring geometry (pixel-corner coordinates)
+# --------------------------------------------------
+def ring_area(ring):
+    """Luas bertanda (shoelace); positif = CCW pada sumbu x kanan / y atas"""
+    if len(ring) < 64:
+        # Most rings are a handful of pixel corners: plain Python beats numpy here
+        return 0.5 * sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring[:-1], ring[1:]))
+    pts = np.asarray(ring, dtype=np.float64)
+    x, y = pts[:, 0], pts[:, 1]
+    return 0.5 * float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+
+def _drop_collinear(ring):
+    """Hapus titik yang tidak mengubah arah (ring tertutup)"""
+    pts = ring[:-1]
+    keep = []
+    n = len(pts)
+    for i in range(n):
+        prev, cur, nxt = pts[i - 1], pts[i], pts[(i + 1) % n]
+        if (cur[0] - prev[0]) * (nxt[1] - cur[1]) - (cur[1] - prev[1]) * (nxt[0] - cur[0]) != 0:
+            keep.append(cur)
+    return keep + keep[:1]
+
+
+def simplify_ring(ring, tolerance):
+    """Douglas-Peucker untuk ring tertutup (dibagi di titik terjauh dari titik awal)"""
+    pts = np.asarray(ring[:-1], dtype=np.float64)
+    if tolerance <= 0 or len(pts) < 4:
+        return ring
+    far = int(np.argmax(((pts - pts[0]) ** 2).sum(axis=1)))
+    keep = np.zeros(len(pts) + 1, dtype=bool)
+    closed = np.vstack([pts, pts[:1]])
+    keep[0] = keep[far] = keep[-1] = True
+
+    stack = [(0, far), (far, len(pts))]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = closed[start], closed[end]
+        seg = closed[start + 1:end]
+        d = b - a
+        length = np.hypot(d[0], d[1])
+        if length == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(d[0] * (seg[:, 1] - a[1]) - d[1] * (seg[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    out = [tuple(p) for p in closed[keep]]
+    return out if len(out) >= 4 else ring
+
+
+def _point_in_ring(x, y, ring):
+    pts = np.asarray(ring, dtype=np.float64)
+    x0, y0 = pts[:-1, 0], pts[:-1, 1]
+    x1, y1 = pts[1:, 0], pts[1:, 1]
+    crosses = (y0 > y) != (y1 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xs = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    return bool(np.count_nonzero(crosses & (x < xs)) % 2)
+
+
+class SeamMerger:
+    """Gabungkan potongan poligon yang terpotong batas window (per kelas)"""
+
+    # Turn order at a vertex with several outgoing edges: left, straight, right
+    # (interior is on the left, so a left turn keeps diagonal pixels apart, as
+    # 4-connected polygonization does)
+
+    def __init__(self, seams_x, seams_y):
+        self.seams_x = set(seams_x)
+        self.seams_y = set(seams_y)
+        self.pieces = []   # (class, rings) with exterior CCW, holes CW
+        self.parent = []
+        self.edges = {}    # (class, a, b) seam unit edge -> piece index
+
+    def touches_seam(self, rings):
+        # A piece lies inside its window, so it can only touch a seam with its bounding box
+        xs = [p[0] for p in rings[0]]
+        ys = [p[1] for p in rings[0]]
+        return (min(xs) in self.seams_x or max(xs) in self.seams_x or
+                min(ys) in self.seams_y or max(ys) in self.seams_y)
+
+    def _find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def _segments(self, ring):
+        """Segmen ring; segmen di atas seam dipecah menjadi sisi 1 piksel"""
+        for (x0, y0), (x1, y1) in zip(ring[:-1], ring[1:]):
+            if (x0 == x1 and x0 in self.seams_x) or (y0 == y1 and y0 in self.seams_y):
+                step = (int(np.sign(x1 - x0)), int(np.sign(y1 - y0)))
+                n = int(abs(x1 - x0) + abs(y1 - y0))
+                for k in range(n):
+                    a = (x0 + step[0] * k, y0 + step[1] * k)
+                    yield a, (a[0] + step[0], a[1] + step[1]), True
+            else:
+                yield (x0, y0), (x1, y1), False
+
+    def add(self, value, rings):
+        index = len(self.pieces)
+        self.pieces.append((value, rings))
+        self.parent.append(index)
+        for ring in rings:
+            for a, b, on_seam in self._segments(ring):
+                if not on_seam:
+                    continue
+                other = self.edges.get((value, b, a))
+                if other is not None:
+                    ra, rb = self._find(index), self._find(other)
+                    if ra != rb:
+                        self.parent[ra] = rb
+                self.edges[(value, a, b)] = index
+
+    def merged(self):
+        """Yield (class, [exterior, holes...]) untuk setiap komponen gabungan"""
+        groups = {}
+        for i in range(len(self.pieces)):
+            groups.setdefault(self._find(i), []).append(i)
+
+        for members in groups.values():
+            value = self.pieces[members[0]][0]
+            seam_edges = set()
+            outgoing = {}
+            for i in members:
+                for ring in self.pieces[i][1]:
+                    for a, b, on_seam in self._segments(ring):
+                        if on_seam:
+                            seam_edges.add((a, b))
+                        outgoing.setdefault(a, []).append(b)
+            # Shared seam edges (a->b in one piece, b->a in the neighbour) cancel
+            for a, b in seam_edges:
+                if (b, a) in seam_edges:
+                    outgoing[a].remove(b)
+
+            rings = self._chain(outgoing)
+            exteriors = [r for r in rings if ring_area(r) > 0]
+            holes = [r for r in rings if ring_area(r) < 0]
+            polygons = [[e] for e in exteriors]
+            for hole in holes:
+                # Pixel just inside the region next to the hole's first edge
+                (x0, y0), (x1, y1) = hole[0], hole[1]
+                dx, dy = np.sign(x1 - x0), np.sign(y1 - y0)
+                px, py = (x0 + x1) / 2 - dy * 0.5, (y0 + y1) / 2 + dx * 0.5
+                owner = next((p for p in polygons if _point_in_ring(px, py, p[0])), None)
+                if owner is not None:
+                    owner.append(hole)
+            for polygon in polygons:
+                yield value, polygon
+
+    @staticmethod
+    def _chain(outgoing):
+        rings = []
+        # Start at vertices with a single way out, so a ring is never closed early
+        # at a vertex where two rings touch
+        for start in sorted(outgoing, key=lambda v: len(outgoing[v]) > 1):
+            while outgoing.get(start):
+                ring = [start]
+                prev, cur = start, outgoing[start].pop()
+                while cur != start:
+                    ring.append(cur)
+                    options = outgoing[cur]
+                    if len(options) == 1:
+                        nxt = options.pop()
+                    else:
+                        dx, dy = cur[0] - prev[0], cur[1] - prev[1]
+                        dx, dy = int(np.sign(dx)), int(np.sign(dy))
+
+                        def turn(b, dx=dx, dy=dy):
+                            ox, oy = int(np.sign(b[0] - cur[0])), int(np.sign(b[1] - cur[1]))
+                            if (ox, oy) == (-dy, dx):
+                                return 0   # left
+                            if (ox, oy) == (dx, dy):
+                                return 1   # straight
+                            return 2       # right
+                        nxt = min(options, key=turn)
+                        options.remove(nxt)
+                    prev, cur = cur, nxt
+                ring.append(start)
+                rings.append(_drop_collinear(ring))
+        return rings
+
+
+def _oriented(rings):
+    """Exterior CCW / holes CW (pada sumbu x kanan / y atas)"""
+    out = []
+    for i, ring in enumerate(rings):
+        ring = [(int(x), int(y)) for x, y in ring]
+        area = ring_area(ring)
+        if (i == 0 and area < 0) or (i > 0 and area > 0):
+            ring = ring[::-1]
+        out.append(ring)
+    return out
+
+
+class Data:
+    def __init__(self, name, breaks, labels, colors, band=1, simplify=1.0, min_pixels=4, polygonize=True,
+                 progress=None):
+        self.prefix_name = name
+        self.breaks = list(breaks)
+        self.labels = list(labels)
+        self.colors = [parse_color(c) for c in colors]
+        self.band = band
+        self.simplify = simplify       # Douglas-Peucker tolerance in pixels
+        self.min_pixels = min_pixels   # Polygons/holes smaller than this are dropped
+        self.polygonize = polygonize
+        self.progress = progress or Progress()  # JSON-lines events + cancel checks (--progress)
+        self.base_folder = 'CLASSIFY'
+
+        if sorted(self.breaks) != self.breaks:
+            raise ValueError('Class breaks must be increasing')
+        if len(self.labels) != len(self.breaks) + 1:
+            raise ValueError(f'{len(self.breaks)} breaks need {len(self.breaks) + 1} labels')
+        if len(self.colors) < len(self.labels):
+            raise ValueError(f'{len(self.labels)} classes need {len(self.labels)} colors')
+
+        self.output_folder_name = os.path.join(self.base_folder, self.prefix_name)
+        self.set_ymdhms()
+
+        self.folder_output = f'{self.output_folder_name}'
+        if not os.path.exists(self.folder_output):
+            os.makedirs(self.folder_output, exist_ok=True)
+
+        self.filename = f'{self.prefix_name}_classes_{self.ymdhms}.tif'
+        self.output_final_path = os.path.join(self.folder_output, self.filename)
+        self.geojson_filename = f'{self.prefix_name}_classes_{self.ymdhms}.geojson'
+        self.geojson_path = os.path.join(self.folder_output, self.geojson_filename)
+        self.png_filename = f'{self.prefix_name}_classes_{self.ymdhms}_preview.png'
+        self.png_path = os.path.join(self.folder_output, self.png_filename)
+
+        self.status = 'running'
+        self.messages = 'Initializing...'
+
+    def set_ymdhms(self):
+        self.now = datetime.now()
+        self.ymdhms = datetime.now().strftime('%y%m%d%H%M%S')
+
+    def colormap(self):
+        cmap = {0: (0, 0, 0, 0)}
+        for value, color in enumerate(self.colors[:len(self.labels)], start=1):
+            cmap[value] = color + (255,)
+        return cmap
+
+    def run(self, input_path):
+        try:
+            if not os.path.exists(input_path):
+                raise FileNotFoundError(f'Input file not found: {input_path}')
+
+            features = []
+            pixels = np.zeros(len(self.labels) + 1, dtype=np.int64)
+            with rasterio.open(input_path) as src:
+                if not 1 <= self.band <= src.count:
+                    raise ValueError(f'Band {self.band} is invalid (input has {src.count} bands)')
+
+                profile = src.profile.copy()
+                profile.update(dtype=rasterio.uint8, count=1, nodata=0, compress='lzw', **TILED_PROFILE)
+                profile.pop('photometric', None)
+
+                windows = list(iter_windows(src.width, src.height, BLOCK_SIZE))
+                merger = SeamMerger(
+                    seams_x=sorted({int(w.col_off) for w in windows if w.col_off > 0}),
+                    seams_y=sorted({int(w.row_off) for w in windows if w.row_off > 0}),
+                )
+                polygons = []
+
+                self.progress.stage('classify', total=len(windows))
+                with rasterio.open(self.output_final_path, 'w', **geotiff_profile(profile)) as dst:
+                    dst.write_colormap(1, self.colormap())
+                    dst.update_tags(classes=json.dumps(self.class_table()))
+                    for window in windows:
+                        values = src.read(self.band, window=window)
+                        classes = classify(values, self.breaks, src.nodata)
+                        dst.write(classes, 1, window=window)
+                        pixels += np.bincount(classes.ravel(), minlength=len(pixels))
+                        self.progress.advance()
+
+                        if not self.polygonize:
+                            continue
+                        # Pixel-corner coordinates of the whole raster (integers)
+                        offset = Affine.translation(window.col_off, window.row_off)
+                        for geom, value in shapes(classes, mask=classes > 0, connectivity=4, transform=offset):
+                            rings = _oriented(geom['coordinates'])
+                            if merger.touches_seam(rings):
+                                merger.add(int(value), rings)
+                            elif ring_area(rings[0]) >= self.min_pixels:
+                                polygons.append((int(value), rings))
+
+                if self.polygonize:
+                    self.progress.stage('polygonize')
+                    polygons.extend(merger.merged())
+                    features = self._features(polygons, src.transform, src.crs)
+                    with open(self.geojson_path, 'w', encoding='utf-8') as f:
+                        json.dump({'type': 'FeatureCollection', 'features': features}, f, separators=(',', ':'))
+
+                bounds = lonlat_bounds(src.crs, src.bounds)
+
+            self.create_preview()
+            self.status = 'success'
+            self.messages = f'Classification into {len(self.labels)} classes successful'
+            table = self.class_table()
+            for entry in table:
+                entry['pixels'] = int(pixels[entry['value']])
+            self._print_result(bounds, extra={'classes': table, 'feature_count': len(features)})
+
+        except Cancelled as e:
+            # Stopped at a window boundary: nothing half-written is left behind
+            remove_outputs(self.output_final_path, self.geojson_path, self.png_path)
+            self.status = 'cancelled'
+            self.messages = str(e)
+            self._print_result()
+
+        except Exception as e:
+            self.status = 'failed'
+            self.messages = str(e)
+            self._print_result()
+
+    def class_table(self):
+        table = []
+        for value, label in enumerate(self.labels, start=1):
+            low = self.breaks[value - 2] if value > 1 else None
+            high = self.breaks[value - 1] if value <= len(self.breaks) else None
+            table.append({'value': value, 'label': label, 'color': '#%02x%02x%02x' % self.colors[value - 1],
+                          'min': low, 'max': high})
+        return table
+
+    def _features(self, polygons, transform, crs):
+        """Ring piksel -> GeoJSON lon/lat (disederhanakan, poligon kecil dibuang)"""
+        kept_polygons = []
+        for value, rings in polygons:
+            if abs(ring_area(rings[0])) < self.min_pixels:
+                continue
+            holes = [r for r in rings[1:] if abs(ring_area(r)) >= self.min_pixels]
+            pixels = abs(ring_area(rings[0])) - sum(abs(ring_area(r)) for r in holes)
+            rings = [simplify_ring(r, self.simplify) for r in [rings[0]] + holes]
+            kept_polygons.append((value, int(pixels), rings))
+        if not kept_polygons:
+            return []
+
+        # All vertices go through the pixel -> map -> lon/lat transform in one call
+        pts = np.asarray([p for _, _, rings in kept_polygons for ring in rings for p in ring], dtype=np.float64)
+        xs, ys = transform * (pts[:, 0], pts[:, 1])
+        if crs and crs != LONLAT_CRS:
+            xs, ys = transform_coords(crs, LONLAT_CRS, xs, ys)
+        coords = np.round(np.column_stack([xs, ys]), 6).tolist()
+
+        # RFC 7946: exterior counter-clockwise, holes clockwise; a north-up grid
+        # (negative pixel height) mirrors the pixel-space orientation
+        flip = (transform.a * transform.e - transform.b * transform.d) < 0
+
+        features = []
+        pos = 0
+        for value, pixels, rings in kept_polygons:
+            geometry = []
+            for ring in rings:
+                ring_ll = coords[pos:pos + len(ring)]
+                pos += len(ring)
+                geometry.append(ring_ll[::-1] if flip else ring_ll)
+            features.append({
+                'type': 'Feature',
+                'properties': {'class': value, 'label': self.labels[value - 1], 'pixels': pixels},
+                'geometry': {'type': 'Polygon', 'coordinates': geometry},
+            })
+        return features
+
+    def create_preview(self, max_size=1024):
+        """Preview PNG berwarna dari raster kelas (decimated, nodata transparan)"""
+        try:
+            with rasterio.open(self.output_final_path) as src:
+                scale = min(1.0, max_size / max(src.width, src.height))
+                out_shape = (max(1, int(src.height * scale)), max(1, int(src.width * scale)))
+                classes = src.read(1, out_shape=out_shape)
+            palette = np.zeros((256, 4), dtype=np.uint8)
+            for value, color in self.colormap().items():
+                palette[value] = color
+            Image.fromarray(palette[classes], 'RGBA').save(self.png_path, 'PNG')
+        except Exception as e:
+            print(f"Gagal membuat PNG preview: {str(e)}")
+
+    def _print_result(self, bounds=None, extra=None):
+        result = {
+            'status': self.status,
+            'messages': self.messages,
+            'filename': self.filename if self.status == 'success' else None,
+            'path': self.output_final_path if self.status == 'success' else None,
+            'preview_png': self.png_filename if self.status == 'success' else None,
+            'geojson': self.geojson_path if self.status == 'success' and self.polygonize else None,
+            'bounds': bounds if bounds else {},
+        }
+        if extra:
+            result.update(extra)
+        print(json.dumps(result), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify an index raster and polygonize the classes')
+    parser.add_argument('-i', '--input', required=True, help='Index raster (rasterTransform / calculator output)')
+    parser.add_argument('-n', required=True, help='Output Prefix Name')
+    parser.add_argument('--preset', choices=sorted(PRESETS), help='Predefined breaks/labels/colors')
+    parser.add_argument('--breaks', type=float, nargs='+', help='Increasing class boundaries, e.g. 0 0.2 0.5')
+    parser.add_argument('--labels', nargs='+', help='Class names (one more than --breaks)')
+    parser.add_argument('--colors', nargs='+', help='Class colors as #rrggbb')
+    parser.add_argument('--band', type=int, default=1, help='Band to classify (default 1)')
+    parser.add_argument('--simplify', type=float, default=1.0,
+                        help='Polygon simplification tolerance in pixels (0 = keep pixel edges)')
+    parser.add_argument('--min-pixels', type=int, default=4,
+                        help='Drop polygons and holes smaller than this many pixels')
+    parser.add_argument('--no-polygons', action='store_true', help='Only write the class raster')
+    add_progress_arguments(parser)
+    args = parser.parse_args()
+
+    preset = PRESETS.get(args.preset, {})
+    breaks = args.breaks or preset.get('breaks')
+    if not breaks:
+        parser.error('Give --preset or --breaks')
+    labels = args.labels or preset.get('labels') or [f'class {i}' for i in range(1, len(breaks) + 2)]
+    colors = args.colors or preset.get('colors') or DEFAULT_COLORS
+
+    try:
+        data = Data(args.n, breaks, labels, colors, band=args.band, simplify=args.simplify,
+                    min_pixels=args.min_pixels, polygonize=not args.no_polygons,
+                    progress=Progress(enabled=args.progress).listen())
+    except ValueError as e:
+        print(json.dumps({'status': 'failed', 'messages': str(e)}))
+        return
+    data.run(args.input)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1663 @@
+import hashlib
+import importlib
+import json
+import math
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import warnings
+from xml.sax.saxutils import escape
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.coords import BoundingBox
+from rasterio.crs import CRS
+from rasterio.enums import Interleaving, Resampling
+from rasterio.features import geometry_mask
+from rasterio.transform import array_bounds
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import calculate_default_transform, transform_bounds, transform_geom
+from rasterio.warp import transform as transform_coords
+from rasterio.windows import Window, from_bounds
+from rasterio.windows import transform as window_transform
+
+
+class _LazyModule:
+    """Modul yang baru di-import saat pertama dipakai (cv2 hanya untuk focal, remap dan preview)"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+cv2 = _LazyModule('cv2')
+
+
+# --------------------------------------------------
+# Band-set input
+# --------------------------------------------------
+# A band set is either one multiband file (GeoTIFF / VRT) or a group of
+# single-band files (a downloaded_bands folder or an explicit list).
+# Bands are addressed by key: '1'..'n' for a multiband file, or the band
+# token from the filename for per-band files (LC08_..._SR_B4.TIF -> '4',
+# T50_..._B8A.jp2 -> '8a'). Every band is read from its own file on demand,
+# so no stacked copy is ever written.
+
+RASTER_EXTENSIONS = ('.tif', '.tiff', '.jp2', '.vrt', '.img')
+
+# Kernels offered for aligning bands that sit on a different grid
+RESAMPLING_CHOICES = ('nearest', 'bilinear', 'average')
+
+# Output layout for windowed writers
+BLOCK_SIZE = 512
+TILED_PROFILE = {'tiled': True, 'blockxsize': 256, 'blockysize': 256}
+
+# Uncompressed GeoTIFF bands are read through np.memmap instead of GDAL
+# (RASTER_MEMMAP=0 turns the fast path off)
+MEMMAP_READS = os.environ.get('RASTER_MEMMAP', '1') != '0'
+
+# Classic TIFF addresses at most 4 GiB; outputs estimated above this size are
+# written as BigTIFF (margin for tile indexes, tags and incompressible tiles)
+BIGTIFF_THRESHOLD = 3_900_000_000
+
+BAND_TOKEN_PATTERN = re.compile(r'(?:^|[_\-.])(?:SR_|ST_)?B0*(\d{1,2}A?)(?=[_\-.]|$)', re.IGNORECASE)
+# Quality bands next to the spectral bands: Landsat QA_PIXEL, Sentinel-2 SCL / QA60
+QA_BAND_PATTERN = re.compile(r'(?:^|[_\-.])(QA_PIXEL|SCL|QA60)(?=[_\-.]|$)', re.IGNORECASE)
+
+
+def parse_band_token(filename):
+    """Ambil nomor band dari nama file, misal '..._SR_B4.TIF' -> '4', '..._QA_PIXEL.TIF' -> 'qa_pixel'"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    qa = QA_BAND_PATTERN.search(stem)
+    if qa:
+        return qa.group(1).lower()
+    matches = BAND_TOKEN_PATTERN.findall(stem)
+    if not matches:
+        return None
+    return matches[-1].lower()
+
+
+def _band_sort_key(key):
+    digits = re.match(r'(\d+)', key)
+    return (int(digits.group(1)) if digits else 999, key)
+
+
+def normalize_key(key):
+    return str(key).strip().lower().lstrip('b') or str(key)
+
+
+def _grid_of(ds):
+    return (ds.crs, ds.transform, ds.width, ds.height)
+
+
+class BandSet:
+    """Lazy view over the bands of a multiband file or of per-band files."""
+
+    def __init__(self, sources, resampling='nearest', grid='finest'):
+        # sources: list of (key, path, band index inside that file)
+        # grid: 'finest', 'coarsest', a band key, or an explicit grid tuple
+        # (crs, transform, width, height) such as another scene's BandSet.grid;
+        # bands on another grid are resampled to it window by window through a WarpedVRT
+        if not sources:
+            raise ValueError('Band set is empty')
+        if resampling not in RESAMPLING_CHOICES:
+            raise ValueError(f"Unknown resampling '{resampling}' (use {', '.join(RESAMPLING_CHOICES)})")
+        self.resampling = resampling
+        self.sources = {}
+        self.keys = []
+        for key, path, bidx in sources:
+            key = normalize_key(key)
+            if key in self.sources:
+                raise ValueError(f"Duplicate band '{key}' in band set ({path})")
+            self.sources[key] = (path, bidx)
+            self.keys.append(key)
+
+        self._datasets = {}
+        self._aligned = {}
+        self._maps = {}
+        if isinstance(grid, tuple):
+            # Grid of another raster (e.g. the first date of a time series)
+            ref = self._open(self.sources[self.keys[0]][0])
+            crs, transform, width, height = grid
+        else:
+            ref = self._open(self.sources[self._reference_key(grid)][0])
+            crs, transform, width, height = _grid_of(ref)
+        self.profile = ref.profile.copy()
+        self.profile.update(count=1, crs=crs, transform=transform, width=width, height=height)
+        self.width = width
+        self.height = height
+        self.transform = transform
+        self.crs = crs
+        self.bounds = BoundingBox(*array_bounds(height, width, transform))
+        self.nodata = ref.nodata
+        self.grid = (crs, transform, width, height)
+
+    def _reference_key(self, grid):
+        grid = str(grid or 'finest').lower()
+        if grid not in ('finest', 'coarsest'):
+            if normalize_key(grid) not in self.sources:
+                raise ValueError(f"Reference band '{grid}' not found in input")
+            return normalize_key(grid)
+        # Pixel area per band; ties keep the band order
+        areas = []
+        for key in self.keys:
+            ds = self._open(self.sources[key][0])
+            areas.append((abs(ds.transform.a * ds.transform.e), key))
+        pick = min if grid == 'finest' else max
+        target = pick(a for a, _ in areas)
+        return next(key for a, key in areas if a == target)
+
+    @property
+    def is_mixed_grid(self):
+        return any(_grid_of(self._open(path)) != self.grid for path in self.paths)
+
+    @property
+    def count(self):
+        return len(self.keys)
+
+    @property
+    def paths(self):
+        seen = []
+        for key in self.keys:
+            path = self.sources[key][0]
+            if path not in seen:
+                seen.append(path)
+        return seen
+
+    @property
+    def is_single_file(self):
+        return len(self.paths) == 1
+
+    def _open(self, path):
+        ds = self._datasets.get(path)
+        if ds is None:
+            ds = rasterio.open(path)
+            self._datasets[path] = ds
+        return ds
+
+    def dataset(self, key):
+        path, bidx = self.sources[normalize_key(key)]
+        return self._open(path), bidx
+
+    def _aligned_dataset(self, key):
+        """Dataset to read from, warped on the fly when its grid differs from the reference"""
+        ds, bidx = self.dataset(key)
+        if _grid_of(ds) == self.grid:
+            return ds, bidx
+        # Bit flags / class codes cannot be interpolated
+        resampling = 'nearest' if normalize_key(key) in QA_FLAGS else self.resampling
+        vrt = self._aligned.get((ds.name, resampling))
+        if vrt is None:
+            crs, transform, width, height = self.grid
+            vrt = WarpedVRT(
+                ds, crs=crs, transform=transform, width=width, height=height,
+                resampling=Resampling[resampling],
+            )
+            self._aligned[(ds.name, resampling)] = vrt
+        return vrt, bidx
+
+    def has(self, key):
+        return normalize_key(key) in self.sources
+
+    def description(self, key):
+        ds, bidx = self.dataset(key)
+        desc = ds.descriptions[bidx - 1]
+        if desc:
+            return desc
+        if self.is_single_file:
+            return f'b{normalize_key(key)}'
+        return os.path.splitext(os.path.basename(ds.name))[0]
+
+    def read(self, key, window=None, out_shape=None, dtype=np.float32):
+        """Baca satu band (opsional per window) langsung dari file asalnya"""
+        key = normalize_key(key)
+        if key not in self.sources:
+            raise ValueError(f"Band '{key}' not found in input (available: {', '.join(self.keys)})")
+        view = self.view(key, window) if out_shape is None else None
+        if view is not None:
+            # Uncompressed band: the mapped pixels are cast straight into the result (one copy)
+            return view.astype(dtype)
+        ds, bidx = self._aligned_dataset(key)
+        data = ds.read(bidx, window=window, out_shape=out_shape).astype(dtype, copy=False)
+        if ds is not self.dataset(key)[0] and np.issubdtype(data.dtype, np.floating):
+            # Warped band: pixels beyond the file's own extent are missing, not 0
+            self._mask_outside_footprint(key, data, window)
+        return data
+
+    def view(self, key, window=None):
+        """View read-only (dtype file) dari band tak terkompresi, atau None jika harus dibaca lewat GDAL"""
+        key = normalize_key(key)
+        if key not in self._maps:
+            ds, bidx = self._aligned_dataset(key)
+            # Bands warped to the reference grid have no file layout to map
+            self._maps[key] = memmap_band(ds, bidx) if ds is self.dataset(key)[0] else None
+        band = self._maps[key]
+        if band is None or window is None:
+            return band
+        col, row = int(window.col_off), int(window.row_off)
+        width, height = int(window.width), int(window.height)
+        if (col, row, width, height) != (window.col_off, window.row_off, window.width, window.height) \
+                or col < 0 or row < 0 or col + width > self.width or row + height > self.height:
+            return None
+        return band[row:row + height, col:col + width]
+
+    def _mask_outside_footprint(self, key, data, window):
+        ds, _ = self.dataset(key)
+        bounds = ds.bounds
+        if ds.crs and self.crs and ds.crs != self.crs:
+            bounds = transform_bounds(ds.crs, self.crs, *bounds, densify_pts=21)
+        footprint = from_bounds(*bounds, transform=self.transform)
+        if window is None:
+            window = Window(0, 0, self.width, self.height)
+        # Pixel centres of the (possibly decimated) read, in reference grid pixels
+        rows = window.row_off + (np.arange(data.shape[0]) + 0.5) * window.height / data.shape[0]
+        cols = window.col_off + (np.arange(data.shape[1]) + 0.5) * window.width / data.shape[1]
+        data[(rows < footprint.row_off) | (rows > footprint.row_off + footprint.height), :] = np.nan
+        data[:, (cols < footprint.col_off) | (cols > footprint.col_off + footprint.width)] = np.nan
+
+    def close(self):
+        for vrt in self._aligned.values():
+            vrt.close()
+        for ds in self._datasets.values():
+            ds.close()
+        self._aligned = {}
+        self._datasets = {}
+        self._maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def memmap_band(ds, bidx):
+    """np.memmap read-only atas satu band GeoTIFF tak terkompresi dengan strip berurutan (None jika tidak bisa)"""
+    if not MEMMAP_READS or ds.driver != 'GTiff' or ds.compression is not None or not os.path.isfile(ds.name):
+        return None
+    rows, cols = ds.block_shapes[bidx - 1]
+    if cols != ds.width or ds.tags(ns='IMAGE_STRUCTURE').get('NBITS'):
+        return None  # tiled, or sub-byte samples
+    dtype = np.dtype(ds.dtypes[bidx - 1])
+    pixel = ds.count > 1 and ds.interleaving == Interleaving.pixel
+    samples = ds.count if pixel else 1
+    strip_bytes = rows * ds.width * samples * dtype.itemsize
+    tag_band = 1 if pixel else bidx
+
+    # Strips must follow each other without gaps, so the band is one array on disk
+    try:
+        offsets = [int(ds.get_tag_item(f'BLOCK_OFFSET_0_{y}', 'TIFF', bidx=tag_band))
+                   for y in range(math.ceil(ds.height / rows))]
+        if int(ds.get_tag_item('BLOCK_SIZE_0_0', 'TIFF', bidx=tag_band)) != strip_bytes:
+            return None
+    except (TypeError, ValueError):
+        return None  # strip not written (sparse file)
+    if any(offset != offsets[0] + y * strip_bytes for y, offset in enumerate(offsets)):
+        return None
+
+    with open(ds.name, 'rb') as f:
+        order = f.read(2)
+    dtype = dtype.newbyteorder('<' if order == b'II' else '>')
+    shape = (ds.height, ds.width, samples) if pixel else (ds.height, ds.width)
+    data = np.memmap(ds.name, dtype=dtype, mode='r', offset=offsets[0], shape=shape)
+    return data[:, :, bidx - 1] if pixel else data
+
+
+def _list_band_files(folder):
+    files = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(RASTER_EXTENSIONS) and not name.lower().endswith('_preview.png'):
+            files.append(os.path.join(folder, name))
+    return files
+
+
+def _sources_from_files(paths):
+    sources = []
+    tokens = [parse_band_token(p) for p in paths]
+    use_tokens = all(tokens) and len(set(tokens)) == len(tokens)
+    position = 1
+    for path, token in zip(paths, tokens):
+        with rasterio.open(path) as ds:
+            count = ds.count
+        for bidx in range(1, count + 1):
+            if use_tokens and count == 1:
+                key = token
+            else:
+                key = str(position)
+            sources.append((key, path, bidx))
+            position += 1
+    if use_tokens:
+        sources.sort(key=lambda s: _band_sort_key(s[0]))
+    return sources
+
+
+def open_band_set(inputs, resampling='nearest', grid='finest'):
+    """Buka input sebagai band set: file multiband, VRT, folder, atau list file"""
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    inputs = [p for p in inputs if p]
+    if not inputs:
+        raise ValueError('No input given')
+
+    for path in inputs:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'Input file not found: {path}')
+
+    if len(inputs) == 1 and os.path.isdir(inputs[0]):
+        files = _list_band_files(inputs[0])
+        if not files:
+            raise FileNotFoundError(f'No raster files found in folder: {inputs[0]}')
+        return BandSet(_sources_from_files(files), resampling=resampling, grid=grid)
+
+    if len(inputs) == 1:
+        path = inputs[0]
+        with rasterio.open(path) as ds:
+            count = ds.count
+        return BandSet([(str(i), path, i) for i in range(1, count + 1)], resampling=resampling, grid=grid)
+
+    return BandSet(_sources_from_files(inputs), resampling=resampling, grid=grid)
+
+
+# --------------------------------------------------
+# Multi-file input (a.b5, b.b5)
+# --------------------------------------------------
+# Several named inputs (e.g. before/after scenes) share one grid: the CRS and
+# pixel size of the first input, over the intersection or union of all
+# extents. Each input is warped to it window by window, so two scenes are
+# never loaded side by side; pixels an input does not cover read as NaN.
+
+EXTENT_CHOICES = ('intersection', 'union')
+
+
+class MultiBandSet:
+    """Band sets of several named inputs on one common grid; keys are 'alias.band'."""
+
+    def __init__(self, inputs, resampling='nearest', extent='intersection'):
+        if extent not in EXTENT_CHOICES:
+            raise ValueError(f"Unknown extent '{extent}' (use {', '.join(EXTENT_CHOICES)})")
+        if not inputs:
+            raise ValueError('No input given')
+        self.resampling = resampling
+        self.extent = extent
+
+        aliases = list(inputs)
+        with open_band_set(inputs[aliases[0]], resampling=resampling) as first:
+            crs, transform, _, _ = first.grid
+        boxes = []
+        for alias in aliases:
+            with open_band_set(inputs[alias], resampling=resampling) as band_set:
+                bounds = tuple(band_set.bounds)
+                if band_set.crs and crs and band_set.crs != crs:
+                    bounds = transform_bounds(band_set.crs, crs, *bounds, densify_pts=21)
+                boxes.append(bounds)
+
+        if extent == 'intersection':
+            box = (max(b[0] for b in boxes), max(b[1] for b in boxes),
+                   min(b[2] for b in boxes), min(b[3] for b in boxes))
+        else:
+            box = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                   max(b[2] for b in boxes), max(b[3] for b in boxes))
+        if box[2] <= box[0] or box[3] <= box[1]:
+            raise ValueError('Inputs do not overlap')
+
+        # Snap to the first input's pixel grid (inward for intersection, outward for union)
+        win = from_bounds(*box, transform=transform)
+        snap_start, snap_end = (math.ceil, math.floor) if extent == 'intersection' else (math.floor, math.ceil)
+        eps = 1e-6 if extent == 'intersection' else -1e-6
+        col0, row0 = snap_start(win.col_off - eps), snap_start(win.row_off - eps)
+        col1 = snap_end(win.col_off + win.width + eps)
+        row1 = snap_end(win.row_off + win.height + eps)
+        if col1 <= col0 or row1 <= row0:
+            raise ValueError('Inputs do not overlap')
+        window = Window(col0, row0, col1 - col0, row1 - row0)
+        self.grid = (crs, window_transform(window, transform), col1 - col0, row1 - row0)
+
+        self.sets = {}
+        try:
+            for alias in aliases:
+                self.sets[alias] = open_band_set(inputs[alias], resampling=resampling, grid=self.grid)
+        except Exception:
+            self.close()
+            raise
+        self.keys = [f'{alias}.{key}' for alias, band_set in self.sets.items() for key in band_set.keys]
+
+        first = self.sets[aliases[0]]
+        self.profile = first.profile.copy()
+        self.crs, self.transform, self.width, self.height = self.grid
+        self.bounds = first.bounds
+        self.nodata = None
+
+    def _split(self, key):
+        alias, _, band = str(key).partition('.')
+        if alias not in self.sets or not band:
+            raise ValueError(f"Band '{key}' not found in input (use alias.band, e.g. {self.keys[0]})")
+        return self.sets[alias], band
+
+    @property
+    def count(self):
+        return len(self.keys)
+
+    @property
+    def paths(self):
+        return [p for band_set in self.sets.values() for p in band_set.paths]
+
+    @property
+    def is_single_file(self):
+        return False
+
+    def has(self, key):
+        alias, _, band = str(key).partition('.')
+        return alias in self.sets and bool(band) and self.sets[alias].has(band)
+
+    def dataset(self, key):
+        band_set, band = self._split(key)
+        return band_set.dataset(band)
+
+    def description(self, key):
+        band_set, band = self._split(key)
+        return f"{str(key).partition('.')[0]}.{band_set.description(band)}"
+
+    def read(self, key, window=None, out_shape=None, dtype=np.float32):
+        band_set, band = self._split(key)
+        return band_set.read(band, window=window, out_shape=out_shape, dtype=dtype)
+
+    def view(self, key, window=None):
+        band_set, band = self._split(key)
+        return band_set.view(band, window=window)
+
+    def close(self):
+        for band_set in self.sets.values():
+            band_set.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_band_sets(inputs, resampling='nearest', extent='intersection'):
+    """Buka beberapa input ber-alias ({'a': path, 'b': [paths]}) pada satu grid bersama"""
+    return MultiBandSet(inputs, resampling=resampling, extent=extent)
+
+
+# --------------------------------------------------
+# Quality masks (QA_PIXEL / SCL / QA60)
+# --------------------------------------------------
+# The quality band delivered with a scene is decoded per window: bit flags
+# with one AND against the combined flag bits, scene classes with one
+# lookup table gather. Flagged pixels become nodata (NaN) in every index,
+# formula and composite, so clouds never reach statistics or previews.
+# The quality band is found by key (per-band files named ..._QA_PIXEL.TIF,
+# ..._SCL_20m.jp2, ..._QA60.tif) or by band description in a multiband file.
+
+QA_FLAGS = {
+    # Landsat Collection 2 QA_PIXEL bits (dilated cloud counts as cloud)
+    'qa_pixel': {'fill': 1 << 0, 'cloud': (1 << 1) | (1 << 3), 'cirrus': 1 << 2,
+                 'shadow': 1 << 4, 'snow': 1 << 5, 'water': 1 << 7},
+    # Sentinel-2 QA60 bits (opaque clouds, cirrus)
+    'qa60': {'cloud': 1 << 10, 'cirrus': 1 << 11},
+    # Sentinel-2 L2A scene classification codes
+    'scl': {'fill': (0, 1), 'shadow': (2, 3), 'water': (6,), 'cloud': (8, 9), 'cirrus': (10,), 'snow': (11,)},
+}
+QA_FLAG_CHOICES = ('fill', 'cloud', 'cirrus', 'shadow', 'snow', 'water')
+QA_DEFAULT_FLAGS = ('fill', 'cloud', 'cirrus', 'shadow')
+
+
+def _qa_decoder(kind, flags):
+    codes = QA_FLAGS[kind]
+    if kind == 'scl':
+        lut = np.zeros(1 << 16, dtype=bool)
+        for flag in flags:
+            lut[list(codes.get(flag, ()))] = True
+        return lambda qa: lut[qa]
+    bits = 0
+    for flag in flags:
+        bits |= codes.get(flag, 0)
+    return lambda qa: (qa & bits) != 0
+
+
+class QualityMask:
+    """Mask piksel ber-flag (awan, bayangan, ...) dari band QA, didekode per window"""
+
+    def __init__(self, band_set, flags=QA_DEFAULT_FLAGS):
+        unknown = [f for f in flags if f not in QA_FLAG_CHOICES]
+        if unknown:
+            raise ValueError(f"Unknown QA flag '{unknown[0]}' (use {', '.join(QA_FLAG_CHOICES)})")
+        self.band_set = band_set
+        self.flags = tuple(flags)
+        self.sources = {}  # input alias ('' for a single input) -> (QA band key, kind, decoder)
+        for key in band_set.keys:
+            alias, _, band = key.rpartition('.')
+            kind = band if band in QA_FLAGS else parse_band_token(band_set.description(key))
+            if kind in QA_FLAGS and alias not in self.sources:
+                self.sources[alias] = (key, kind, _qa_decoder(kind, self.flags))
+        if not self.sources:
+            raise ValueError('No QA band (QA_PIXEL, SCL or QA60) found in input for --qa-mask')
+        self._last = {}
+
+    @property
+    def keys(self):
+        return [key for key, _, _ in self.sources.values()]
+
+    def describe(self):
+        return {'flags': list(self.flags), 'bands': {key: kind for key, kind, _ in self.sources.values()}}
+
+    def read(self, window=None, out_shape=None, key=''):
+        """True = piksel ber-flag (nodata) untuk band `key`; None jika inputnya tanpa band QA"""
+        alias = str(key).rpartition('.')[0]
+        source = self.sources.get(alias)
+        if source is None:
+            return None
+        # Bands of one window share the decoded mask
+        scope = (None if window is None else tuple(int(v) for v in window.flatten()), out_shape)
+        last = self._last.get(alias)
+        if last is not None and last[0] == scope:
+            return last[1]
+        qa_key, _, decode = source
+        qa = self.band_set.view(qa_key, window) if out_shape is None else None
+        if qa is None:
+            qa = self.band_set.read(qa_key, window=window, out_shape=out_shape, dtype=np.uint16)
+        mask = decode(qa)
+        self._last[alias] = (scope, mask)
+        return mask
+
+
+def add_quality_arguments(parser):
+    """Argumen CLI mask QA yang sama untuk semua backend"""
+    parser.add_argument('--qa-mask', nargs='*', choices=QA_FLAG_CHOICES, metavar='FLAG',
+                        help='Turn pixels flagged in the QA band (QA_PIXEL, SCL, QA60) into nodata; '
+                             f"flags: {', '.join(QA_FLAG_CHOICES)} (default: {' '.join(QA_DEFAULT_FLAGS)})")
+
+
+def qa_flags_from_args(args):
+    """None tanpa --qa-mask, flag default untuk --qa-mask tanpa nilai"""
+    if args.qa_mask is None:
+        return None
+    return tuple(args.qa_mask) or QA_DEFAULT_FLAGS
+
+
+# --------------------------------------------------
+# System resources
+# --------------------------------------------------
+def available_memory():
+    """Free physical memory in bytes (None if it cannot be determined)"""
+    try:
+        import psutil
+        return int(psutil.virtual_memory().available)
+    except ImportError:
+        pass
+    if os.name == 'nt':
+        import ctypes
+
+        class _MemoryStatus(ctypes.Structure):
+            _fields_ = [
+                ('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+            ]
+
+        status = _MemoryStatus()
+        status.dwLength = ctypes.sizeof(_MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return int(status.ullAvailPhys)
+        return None
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+# --------------------------------------------------
+# Memory planning
+# --------------------------------------------------
+# Peak memory of a windowed run is about
+#   fixed (interpreter, GDAL block cache) + window pixels x bytes per pixel
+# where bytes per pixel counts the float32 input bands, the temporaries of
+# the algorithm/formula and the output copies. The planner picks the largest
+# window (a multiple of the output tile and, when possible, of the source
+# block) that fits the budget, plus the GDAL threads used to decompress input
+# blocks and compress output tiles. --explain prints the plan without running.
+
+WINDOW_CHOICES = (256, 512, 1024, 2048, 4096)
+BASE_MEMORY_MB = 150        # interpreter + numpy/rasterio/cv2 imports
+GDAL_CACHE_MB = 64          # GDAL block cache kept during the run
+# Outside the planned pass (preview / display reads of the output) GDAL would use
+# its default cache of 5% of the RAM; the same cap keeps those reads in the plan
+os.environ.setdefault('GDAL_CACHEMAX', str(GDAL_CACHE_MB))
+BUDGET_FRACTION = 0.5       # default budget: half of the free memory
+DEFAULT_BUDGET_MB = 1024    # when free memory cannot be determined
+
+
+class MemoryPlan:
+    """Ukuran window + thread GDAL hasil perencanaan, dengan estimasi memori dan IO"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def env(self):
+        """Opsi rasterio.Env untuk run ini"""
+        return {'GDAL_NUM_THREADS': str(self.threads), 'GDAL_CACHEMAX': GDAL_CACHE_MB}
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def source_layout(band_set, keys):
+    """(byte per piksel yang dibaca, ukuran blok sumber) untuk band yang dipakai"""
+    itemsize = 0
+    blocks = set()
+    for key in keys:
+        ds, bidx = band_set.dataset(key)
+        itemsize += np.dtype(ds.dtypes[bidx - 1]).itemsize
+        blocks.add(tuple(ds.block_shapes[bidx - 1]))
+    return itemsize, sorted(blocks)
+
+
+def plan_memory(width, height, bands_in, bands_out, source_bytes=None, source_blocks=(),
+                temporaries=3, halo=0, passes=0, budget_mb=None, cores=None):
+    """Pilih ukuran window dan jumlah thread agar estimasi puncak memori <= budget"""
+    if budget_mb is None:
+        free = available_memory()
+        budget_mb = DEFAULT_BUDGET_MB if free is None else max(256, free * BUDGET_FRACTION / 2 ** 20)
+    budget = budget_mb * 2 ** 20
+    cores = cores or os.cpu_count() or 1
+    source_bytes = source_bytes if source_bytes is not None else 4 * bands_in
+
+    # Inputs as float32, temporaries, output + cast copy, float64 copy for the statistics
+    per_pixel = 4 * bands_in + 4 * temporaries + 8 * bands_out + 8 * bands_out
+    fixed = (BASE_MEMORY_MB + GDAL_CACHE_MB) * 2 ** 20
+
+    # Windows aligned to the source blocks read whole blocks only once
+    tiled = [bw for bh, bw in source_blocks if 1 < bh < height and 1 < bw < width]
+    choices = [c for c in WINDOW_CHOICES if all(c % bw == 0 for bw in tiled)] or list(WINDOW_CHOICES)
+    largest = max(width, height)
+    window = choices[0]
+    for size in choices:
+        if fixed + (size + 2 * halo) ** 2 * per_pixel > budget:
+            break
+        window = size
+        if size >= largest:
+            break
+
+    # (De)compression threads: each keeps a few tiles in flight
+    tile_bytes = 256 * 256 * 4 * max(bands_in, bands_out)
+    spare = budget - fixed - (window + 2 * halo) ** 2 * per_pixel
+    threads = int(max(1, min(cores, spare // (4 * tile_bytes) if spare > 0 else 1)))
+
+    windows = math.ceil(width / window) * math.ceil(height / window)
+    halo_factor = ((window + 2 * halo) / window) ** 2
+    pixels = width * height
+    peak = fixed + (window + 2 * halo) ** 2 * per_pixel + threads * 4 * tile_bytes
+    return MemoryPlan(
+        width=int(width), height=int(height), window=int(window), windows=int(windows), threads=threads,
+        budget_mb=round(budget_mb, 1), peak_mb=round(peak / 2 ** 20, 1),
+        bytes_per_pixel=int(per_pixel), bands_in=int(bands_in), bands_out=int(bands_out),
+        temporaries=int(temporaries), halo=int(halo), passes=int(passes),
+        source_blocks=[list(b) for b in source_blocks],
+        read_mb=round(pixels * source_bytes * halo_factor * (1 + passes) / 2 ** 20, 1),
+        write_mb=round(pixels * 4 * bands_out / 2 ** 20, 1),
+        whole_array_mb=round((fixed + pixels * per_pixel) / 2 ** 20, 1),
+    )
+
+
+def add_memory_arguments(parser):
+    """Argumen CLI perencanaan memori yang sama untuk semua backend"""
+    parser.add_argument('--memory-mb', type=float,
+                        help='Memory budget in MB (default: half of the free memory)')
+    parser.add_argument('--explain', action='store_true',
+                        help='Print the memory/IO plan (window size, threads, peak memory, bytes read) and exit')
+
+
+# --------------------------------------------------
+# Windowed processing
+# --------------------------------------------------
+def iter_windows(width, height, block_size=BLOCK_SIZE):
+    """Bagi raster menjadi window persegi (baris demi baris)"""
+    for row_off in range(0, height, block_size):
+        h = min(block_size, height - row_off)
+        for col_off in range(0, width, block_size):
+            w = min(block_size, width - col_off)
+            yield Window(col_off, row_off, w, h)
+
+
+def expand_window(window, halo, width, height):
+    """Perbesar window dengan halo (dipotong ke batas raster) + slice untuk crop hasil"""
+    if halo <= 0:
+        return window, (slice(None), slice(None))
+    col0 = max(0, int(window.col_off) - halo)
+    row0 = max(0, int(window.row_off) - halo)
+    col1 = min(width, int(window.col_off + window.width) + halo)
+    row1 = min(height, int(window.row_off + window.height) + halo)
+    big = Window(col0, row0, col1 - col0, row1 - row0)
+    top = int(window.row_off) - row0
+    left = int(window.col_off) - col0
+    crop = (slice(top, top + int(window.height)), slice(left, left + int(window.width)))
+    return big, crop
+
+
+def estimated_size(profile):
+    """Ukuran data output tak terkompresi (byte) dari profile rasterio"""
+    return int(profile['width']) * int(profile['height']) * int(profile.get('count', 1)) * \
+        np.dtype(profile['dtype']).itemsize
+
+
+def geotiff_profile(profile):
+    """Profile output GeoTIFF; BIGTIFF=YES otomatis bila estimasi ukuran melewati batas TIFF klasik"""
+    # Profiles copied from VRT / JP2 inputs carry their driver; outputs are always GeoTIFF
+    profile['driver'] = 'GTiff'
+    profile.pop('bigtiff', None)
+    if estimated_size(profile) > BIGTIFF_THRESHOLD:
+        profile['BIGTIFF'] = 'YES'
+    else:
+        profile.pop('BIGTIFF', None)
+    return profile
+
+
+def scratch_profile(profile):
+    """Profile output tak terkompresi (strip, band per band) yang dibaca ulang lewat memmap"""
+    # Intermediates for batch/temporal jobs: bigger files, but a later read is a
+    # page-cache copy instead of a decode (see memmap_band)
+    for key in ('compress', 'predictor', 'zlevel', 'tiled', 'blockxsize', 'blockysize'):
+        profile.pop(key, None)
+    profile.update(interleave='band')
+    return profile
+
+
+def add_scratch_arguments(parser):
+    parser.add_argument('--scratch', action='store_true',
+                        help='Write the output uncompressed (intermediate for batch/temporal jobs, '
+                             're-read through memory mapping)')
+
+
+# --------------------------------------------------
+# Output statistics (accumulated while writing)
+# --------------------------------------------------
+# Every writer feeds its output windows to one BandStatistics per band, so
+# min/max/mean/std, a 256-bucket histogram and approximate percentiles are
+# known when the file is closed. They are stored the way GDAL stores computed
+# statistics (a PAM .aux.xml next to the file: STATISTICS_* metadata plus the
+# histogram) and returned in the JSON result, so previews, legends and
+# re-stretching never rescan the raster.
+
+HISTOGRAM_BUCKETS = 256
+STAT_PERCENTILES = (2, 50, 98)
+
+
+class BandStatistics:
+    """Statistik berjalan satu band; histogram melebar (bin digabung) saat rentang bertambah"""
+
+    def __init__(self, nodata=None, buckets=HISTOGRAM_BUCKETS):
+        self.nodata = nodata
+        self.buckets = buckets
+        self.total = 0          # all pixels seen (valid + nodata)
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.vmin = math.inf
+        self.vmax = -math.inf
+        self.lo = None          # histogram range [lo, hi)
+        self.hi = None
+        self.counts = np.zeros(buckets, dtype=np.int64)
+
+    def update(self, values):
+        flat = np.asarray(values).ravel()
+        self.total += flat.size
+        valid = np.isfinite(flat) if flat.dtype.kind == 'f' else np.ones(flat.size, dtype=bool)
+        if self.nodata is not None and not (isinstance(self.nodata, float) and math.isnan(self.nodata)):
+            valid &= flat != self.nodata
+        data = flat[valid].astype(np.float64)
+        if data.size == 0:
+            return
+
+        # Chan et al. merge of count / mean / M2
+        n_b = data.size
+        mean_b = float(data.mean())
+        m2_b = float(((data - mean_b) ** 2).sum())
+        delta = mean_b - self.mean
+        n = self.n + n_b
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.n = n
+        dmin, dmax = float(data.min()), float(data.max())
+        self.vmin = min(self.vmin, dmin)
+        self.vmax = max(self.vmax, dmax)
+
+        self._cover(dmin, dmax)
+        index = ((data - self.lo) * (self.buckets / (self.hi - self.lo))).astype(np.int64)
+        np.clip(index, 0, self.buckets - 1, out=index)
+        self.counts += np.bincount(index, minlength=self.buckets)
+
+    def _cover(self, dmin, dmax):
+        """Perlebar rentang histogram (kelipatan 2, bin berpasangan digabung) sampai mencakup data"""
+        if self.lo is None:
+            self.lo = dmin
+            if dmax > dmin:
+                self.hi = dmax
+            else:
+                # Constant data: a width that still moves the value (|v| >~ 1e16: v + 1.0 == v)
+                self.hi = dmin + max(1.0, abs(dmin) * np.finfo(float).eps * self.buckets)
+            # Keep the top value inside the last bucket
+            self.hi = max(self.hi + (self.hi - self.lo) * 1e-9, np.nextafter(self.hi, math.inf))
+            return
+        half = self.buckets // 2
+        while dmin < self.lo or dmax >= self.hi:
+            merged = self.counts.reshape(half, 2).sum(axis=1)
+            self.counts = np.zeros(self.buckets, dtype=np.int64)
+            width = self.hi - self.lo
+            if dmin < self.lo:
+                self.counts[half:] = merged
+                self.lo = self.hi - 2 * width
+            else:
+                self.counts[:half] = merged
+                self.hi = self.lo + 2 * width
+
+    def percentile(self, q):
+        if self.n == 0:
+            return None
+        target = self.n * q / 100.0
+        cumulative = np.cumsum(self.counts)
+        i = int(np.searchsorted(cumulative, target))
+        i = min(i, self.buckets - 1)
+        before = cumulative[i - 1] if i else 0
+        inside = self.counts[i]
+        width = (self.hi - self.lo) / self.buckets
+        frac = (target - before) / inside if inside else 0.0
+        value = self.lo + (i + frac) * width
+        return float(min(max(value, self.vmin), self.vmax))
+
+    def to_dict(self, histogram=True):
+        if self.n == 0:
+            return {'count': 0}
+        result = {
+            'count': int(self.n),
+            'min': self.vmin,
+            'max': self.vmax,
+            'mean': self.mean,
+            'std': math.sqrt(self.m2 / self.n),
+            'valid_percent': 100.0 * self.n / self.total,
+        }
+        for q in STAT_PERCENTILES:
+            result[f'p{q}'] = self.percentile(q)
+        if histogram:
+            result['histogram'] = {'min': self.lo, 'max': self.hi, 'counts': self.counts.tolist()}
+        return result
+
+
+def write_statistics(path, statistics):
+    """Simpan statistik ke <path>.aux.xml (format PAM GDAL) dan kembalikan list dict untuk JSON"""
+    bands = []
+    lines = ['<PAMDataset>']
+    for index, stats in enumerate(statistics, start=1):
+        info = stats.to_dict()
+        bands.append(dict(info, band=index))
+        if not info['count']:
+            continue
+        lines.append(f'  <PAMRasterBand band="{index}">')
+        lines.append('    <Histograms>')
+        lines.append('      <HistItem>')
+        lines.append(f'        <HistMin>{stats.lo!r}</HistMin>')
+        lines.append(f'        <HistMax>{stats.hi!r}</HistMax>')
+        lines.append(f'        <BucketCount>{stats.buckets}</BucketCount>')
+        lines.append('        <IncludeOutOfRange>0</IncludeOutOfRange>')
+        lines.append('        <Approximate>0</Approximate>')
+        lines.append('        <HistCounts>' + '|'.join(str(c) for c in stats.counts.tolist()) + '</HistCounts>')
+        lines.append('      </HistItem>')
+        lines.append('    </Histograms>')
+        lines.append('    <Metadata>')
+        metadata = {
+            'STATISTICS_MAXIMUM': info['max'],
+            'STATISTICS_MEAN': info['mean'],
+            'STATISTICS_MINIMUM': info['min'],
+            'STATISTICS_STDDEV': info['std'],
+            'STATISTICS_VALID_PERCENT': info['valid_percent'],
+        }
+        for q in STAT_PERCENTILES:
+            metadata[f'STATISTICS_PERCENTILE_{q}'] = info[f'p{q}']
+        for key, value in metadata.items():
+            lines.append(f'      <MDI key="{key}">{value!r}</MDI>')
+        lines.append('    </Metadata>')
+        lines.append('  </PAMRasterBand>')
+    lines.append('</PAMDataset>')
+    with open(path + '.aux.xml', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return bands
+
+
+def read_statistics(path, band=1):
+    """Statistik tersimpan (STATISTICS_*) satu band, atau None jika belum ada"""
+    try:
+        with rasterio.open(path) as ds:
+            tags = ds.tags(band)
+    except Exception:
+        return None
+    if 'STATISTICS_MINIMUM' not in tags:
+        return None
+    result = {
+        'min': float(tags['STATISTICS_MINIMUM']),
+        'max': float(tags['STATISTICS_MAXIMUM']),
+        'mean': float(tags.get('STATISTICS_MEAN', 'nan')),
+        'std': float(tags.get('STATISTICS_STDDEV', 'nan')),
+    }
+    for q in STAT_PERCENTILES:
+        key = f'STATISTICS_PERCENTILE_{q}'
+        if key in tags:
+            result[f'p{q}'] = float(tags[key])
+    return result
+
+
+# --------------------------------------------------
+# Focal (neighborhood) operations
+# --------------------------------------------------
+# Each function works on one 2D window. Callers read the window with a halo of
+# radius = size // 2 (see expand_window) and crop afterwards, so tile seams are
+# invisible; at the real raster edge cv2's reflect border matches a whole-image run.
+# NaN pixels (nodata, QA-flagged) are ignored by their neighbours and stay NaN;
+# a pixel whose whole neighbourhood is NaN becomes NaN.
+
+def _focal_input(x):
+    return np.ascontiguousarray(x, dtype=np.float32)
+
+
+def _odd_size(size):
+    size = int(size)
+    if size < 1 or size % 2 == 0:
+        raise ValueError(f'Focal window size must be an odd number >= 1 (got {size})')
+    return size
+
+
+def _nan_mask(data):
+    """Mask NaN, atau None bila window tidak punya NaN (jalur cepat tanpa mask)"""
+    missing = np.isnan(data)
+    return missing if missing.any() else None
+
+
+def _box_sum(data, size):
+    return cv2.boxFilter(data, -1, (size, size), normalize=False, borderType=cv2.BORDER_REFLECT_101)
+
+
+def _valid_mean(data, missing, size, dtype=np.float32):
+    """Rata-rata focal dari piksel valid saja: (jumlah nilai valid, jumlah piksel valid)"""
+    values = np.where(missing, 0, data).astype(dtype)
+    count = _box_sum((~missing).astype(dtype), size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return _box_sum(values, size) / count, count
+
+
+def focal_mean(x, size=3):
+    size = _odd_size(size)
+    if np.ndim(x) != 2:
+        return x
+    data = _focal_input(x)
+    missing = _nan_mask(data)
+    if missing is None:
+        return cv2.blur(data, (size, size), borderType=cv2.BORDER_REFLECT_101)
+    mean, _ = _valid_mean(data, missing, size)
+    mean[missing] = np.nan
+    return mean
+
+
+def focal_std(x, size=3):
+    size = _odd_size(size)
+    if np.ndim(x) != 2:
+        return np.zeros_like(x, dtype=np.float32)
+    data = _focal_input(x).astype(np.float64)
+    missing = _nan_mask(data)
+    if missing is None:
+        mean = cv2.blur(data, (size, size), borderType=cv2.BORDER_REFLECT_101)
+        mean_sq = cv2.blur(data * data, (size, size), borderType=cv2.BORDER_REFLECT_101)
+        return np.sqrt(np.maximum(mean_sq - mean * mean, 0)).astype(np.float32)
+    mean, _ = _valid_mean(data, missing, size, np.float64)
+    mean_sq, _ = _valid_mean(data * data, missing, size, np.float64)
+    result = np.sqrt(np.maximum(mean_sq - mean * mean, 0)).astype(np.float32)
+    result[missing] = np.nan
+    return result
+
+
+def _focal_extreme(x, size, op, fill):
+    data = _focal_input(x)
+    missing = _nan_mask(data)
+    kernel = np.ones((size, size), np.uint8)
+    if missing is None:
+        return op(data, kernel, borderType=cv2.BORDER_REFLECT_101)
+    # NaN never wins: replaced by +inf for the minimum, -inf for the maximum
+    result = op(np.where(missing, fill, data), kernel, borderType=cv2.BORDER_REFLECT_101)
+    result[missing | np.isinf(result)] = np.nan
+    return result
+
+
+def focal_min(x, size=3):
+    size = _odd_size(size)
+    if np.ndim(x) != 2:
+        return x
+    return _focal_extreme(x, size, cv2.erode, np.inf)
+
+
+def focal_max(x, size=3):
+    size = _odd_size(size)
+    if np.ndim(x) != 2:
+        return x
+    return _focal_extreme(x, size, cv2.dilate, -np.inf)
+
+
+def focal_median(x, size=3):
+    size = _odd_size(size)
+    if np.ndim(x) != 2:
+        return x
+    data = _focal_input(x)
+    r = size // 2
+    missing = _nan_mask(data)
+    if missing is None and size in (3, 5):
+        # cv2 handles float32 medians for 3x3 and 5x5, but only with a replicate
+        # border: pad with reflect-101 like the other focal ops, then crop
+        padded = cv2.copyMakeBorder(data, r, r, r, r, cv2.BORDER_REFLECT_101)
+        return cv2.medianBlur(padded, size)[r:-r, r:-r]
+    # np.pad 'reflect' is reflect-101 (the edge pixel is not repeated)
+    padded = np.pad(data, r, mode='reflect')
+    view = np.lib.stride_tricks.sliding_window_view(padded, (size, size))
+    if missing is None:
+        return np.median(view, axis=(-2, -1)).astype(np.float32)
+    result = np.empty(data.shape, dtype=np.float32)
+    # nanmedian copies every neighbourhood: done in row chunks of about 16 MB
+    step = max(1, 2 ** 22 // (data.shape[1] * size * size))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN neighbourhoods -> NaN
+        for row in range(0, data.shape[0], step):
+            result[row:row + step] = np.nanmedian(view[row:row + step], axis=(-2, -1))
+    result[missing] = np.nan
+    return result
+
+
+def sobel(x, size=3):
+    size = _odd_size(size)
+    if np.ndim(x) != 2:
+        return np.zeros_like(x, dtype=np.float32)
+    data = _focal_input(x)
+    missing = _nan_mask(data)
+    if missing is not None:
+        # Gaps are filled with the mean of their valid neighbours before differentiating
+        fill, count = _valid_mean(data, missing, size)
+        data = np.where(missing, np.where(count > 0, fill, 0), data).astype(np.float32)
+    gx = cv2.Sobel(data, cv2.CV_32F, 1, 0, ksize=size, borderType=cv2.BORDER_REFLECT_101)
+    gy = cv2.Sobel(data, cv2.CV_32F, 0, 1, ksize=size, borderType=cv2.BORDER_REFLECT_101)
+    result = np.sqrt(gx * gx + gy * gy)
+    if missing is not None:
+        result[missing] = np.nan
+    return result
+
+
+FOCAL_FUNCTIONS = {
+    'focal_mean': focal_mean,
+    'focal_std': focal_std,
+    'focal_min': focal_min,
+    'focal_max': focal_max,
+    'focal_median': focal_median,
+    'sobel': sobel,
+}
+
+
+def parse_post_ops(specs):
+    """'focal_mean:5' / 'sobel' -> [(func, size), ...]"""
+    ops = []
+    for spec in specs or []:
+        name, _, size = spec.partition(':')
+        name = name.strip().lower()
+        if name not in FOCAL_FUNCTIONS:
+            raise ValueError(f"Unknown post-processing '{name}' (use {', '.join(FOCAL_FUNCTIONS)})")
+        ops.append((FOCAL_FUNCTIONS[name], _odd_size(size or 3)))
+    return ops
+
+
+def post_ops_halo(ops):
+    return sum(size // 2 for _, size in ops)
+
+
+# --------------------------------------------------
+# Area of interest (AOI) clipping
+# --------------------------------------------------
+# --bbox / --aoi are turned into a pixel window on the reference grid, so only
+# that part of the scene is read and written. A polygon AOI can additionally
+# mask pixels outside the polygon.
+
+LONLAT_CRS = 'EPSG:4326'
+
+
+class Region:
+    """Part of the reference grid that is processed (the whole raster without AOI)"""
+
+    def __init__(self, window, transform, geometries=None):
+        self.window = window
+        self.transform = transform
+        self.geometries = geometries
+
+    @property
+    def width(self):
+        return int(self.window.width)
+
+    @property
+    def height(self):
+        return int(self.window.height)
+
+    @property
+    def is_masked(self):
+        return bool(self.geometries)
+
+    def update_profile(self, profile):
+        profile.update(width=self.width, height=self.height, transform=self.transform)
+        return profile
+
+    def bounds(self, crs=None):
+        """Bounds region dalam format JSON hasil backend (derajat lon/lat jika crs raster diberikan)"""
+        return lonlat_bounds(crs, array_bounds(self.height, self.width, self.transform))
+
+    def windows(self, block_size=BLOCK_SIZE):
+        """Yield (source window, output window) pairs covering the region"""
+        for dst in iter_windows(self.width, self.height, block_size):
+            src = Window(dst.col_off + self.window.col_off, dst.row_off + self.window.row_off,
+                         dst.width, dst.height)
+            yield src, dst
+
+    def outside_mask(self, dst_window=None, out_shape=None):
+        """True for pixels outside the AOI polygon (None when there is no polygon mask)"""
+        if not self.geometries:
+            return None
+        if dst_window is None:
+            dst_window = Window(0, 0, self.width, self.height)
+        transform = window_transform(dst_window, self.transform)
+        if out_shape is None:
+            out_shape = (int(dst_window.height), int(dst_window.width))
+        else:
+            # Decimated read of the window (preview): coarser pixels over the same extent
+            transform = transform * Affine.scale(dst_window.width / out_shape[1], dst_window.height / out_shape[0])
+        return geometry_mask(self.geometries, out_shape=out_shape, transform=transform)
+
+
+def load_features(source):
+    """GeoJSON (path file atau string) -> list of feature dict dengan geometry"""
+    if os.path.exists(source):
+        with open(source, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    else:
+        data = json.loads(source)
+    if data.get('type') == 'FeatureCollection':
+        features = [feat for feat in data.get('features', []) if feat.get('geometry')]
+    elif data.get('type') == 'Feature':
+        features = [data] if data.get('geometry') else []
+    else:
+        features = [{'type': 'Feature', 'properties': {}, 'geometry': data}]
+    return features
+
+
+def _load_geometries(aoi):
+    """AOI bisa berupa path file GeoJSON atau string GeoJSON langsung"""
+    geoms = [feat['geometry'] for feat in load_features(aoi)]
+    if not geoms:
+        raise ValueError('AOI contains no geometry')
+    return geoms
+
+
+def resolve_crs(crs, raster_crs):
+    """'lonlat' / 'raster' / string CRS lain -> CRS yang dipakai untuk transformasi"""
+    if str(crs).lower() in ('lonlat', 'wgs84', LONLAT_CRS.lower()):
+        return LONLAT_CRS
+    if str(crs).lower() == 'raster':
+        return raster_crs
+    return crs
+
+
+def geometry_bounds(geoms):
+    xs, ys = [], []
+
+    def walk(coords):
+        if isinstance(coords[0], (int, float)):
+            xs.append(coords[0])
+            ys.append(coords[1])
+        else:
+            for c in coords:
+                walk(c)
+
+    for geom in geoms:
+        walk(geom['coordinates'])
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def parse_bbox(text):
+    parts = [float(v) for v in re.split(r'[,\s]+', text.strip()) if v]
+    if len(parts) != 4:
+        raise ValueError('--bbox needs 4 numbers: minx,miny,maxx,maxy')
+    minx, miny, maxx, maxy = parts
+    if minx >= maxx or miny >= maxy:
+        raise ValueError('--bbox must be given as minx,miny,maxx,maxy')
+    return minx, miny, maxx, maxy
+
+
+def resolve_region(band_set, bbox=None, aoi=None, aoi_crs='lonlat', mask=False):
+    """Terjemahkan --bbox/--aoi menjadi Region (window baca) pada grid referensi"""
+    full = Window(0, 0, band_set.width, band_set.height)
+    if not bbox and not aoi:
+        return Region(full, band_set.transform)
+
+    src_crs = resolve_crs(aoi_crs, band_set.crs)
+
+    geometries = None
+    if aoi:
+        geoms = _load_geometries(aoi)
+        if band_set.crs and src_crs != band_set.crs:
+            geoms = [transform_geom(src_crs, band_set.crs, g) for g in geoms]
+        bounds = geometry_bounds(geoms)
+        if mask:
+            geometries = geoms
+    else:
+        bounds = parse_bbox(bbox) if isinstance(bbox, str) else tuple(bbox)
+        if band_set.crs and src_crs != band_set.crs:
+            bounds = transform_bounds(src_crs, band_set.crs, *bounds, densify_pts=21)
+
+    win = from_bounds(*bounds, transform=band_set.transform)
+    col0 = max(0, math.floor(win.col_off))
+    row0 = max(0, math.floor(win.row_off))
+    col1 = min(band_set.width, math.ceil(win.col_off + win.width))
+    row1 = min(band_set.height, math.ceil(win.row_off + win.height))
+    if col1 <= col0 or row1 <= row0:
+        raise ValueError('AOI does not overlap the raster')
+
+    window = Window(col0, row0, col1 - col0, row1 - row0)
+    return Region(window, window_transform(window, band_set.transform), geometries)
+
+
+def add_aoi_arguments(parser):
+    """Argumen CLI AOI yang sama untuk semua backend"""
+    parser.add_argument('--bbox', required=False,
+                        help='Only process this box: minx,miny,maxx,maxy (see --aoi-crs)')
+    parser.add_argument('--aoi', required=False,
+                        help='Only process the extent of this polygon (GeoJSON file or GeoJSON string)')
+    parser.add_argument('--aoi-crs', default='lonlat',
+                        help='CRS of --bbox/--aoi: lonlat (default), raster, or any CRS string like EPSG:32750')
+    parser.add_argument('--mask-outside', action='store_true',
+                        help='Set pixels outside the --aoi polygon to nodata')
+
+
+def describe_input(inputs):
+    """Nama dasar input (untuk deteksi platform dari nama file)"""
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    first = inputs[0].rstrip('/\\')
+    return os.path.basename(first)
+
+
+def build_band_vrt(band_set, vrt_path):
+    """Tulis VRT yang menunjuk ke file per-band (tanpa menyalin piksel)"""
+    dtype_map = {
+        'uint8': 'Byte', 'uint16': 'UInt16', 'int16': 'Int16', 'uint32': 'UInt32',
+        'int32': 'Int32', 'float32': 'Float32', 'float64': 'Float64',
+    }
+    lines = [f'<VRTDataset rasterXSize="{band_set.width}" rasterYSize="{band_set.height}">']
+    if band_set.crs:
+        lines.append(f'  <SRS>{escape(band_set.crs.to_wkt())}</SRS>')
+    gt = band_set.transform.to_gdal()
+    lines.append('  <GeoTransform>' + ', '.join(repr(float(v)) for v in gt) + '</GeoTransform>')
+
+    vrt_dir = os.path.dirname(os.path.abspath(vrt_path))
+    for out_idx, key in enumerate(band_set.keys, start=1):
+        ds, bidx = band_set.dataset(key)
+        if _grid_of(ds) != band_set.grid:
+            raise ValueError(f"Band '{key}' is on a different grid; a plain VRT cannot stack it")
+        dtype = dtype_map.get(ds.dtypes[bidx - 1], 'Float32')
+        src_path = os.path.relpath(os.path.abspath(ds.name), vrt_dir)
+        lines.append(f'  <VRTRasterBand dataType="{dtype}" band="{out_idx}">')
+        lines.append(f'    <Description>{escape(band_set.description(key))}</Description>')
+        if ds.nodata is not None:
+            lines.append(f'    <NoDataValue>{ds.nodata}</NoDataValue>')
+        lines.append('    <SimpleSource>')
+        lines.append(f'      <SourceFilename relativeToVRT="1">{escape(src_path)}</SourceFilename>')
+        lines.append(f'      <SourceBand>{bidx}</SourceBand>')
+        lines.append('    </SimpleSource>')
+        lines.append('  </VRTRasterBand>')
+    lines.append('</VRTDataset>')
+
+    with open(vrt_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return vrt_path
+
+
+def aoi_options_from_args(args):
+    """Kwargs untuk resolve_region dari argumen add_aoi_arguments"""
+    return {'bbox': args.bbox, 'aoi': args.aoi, 'aoi_crs': args.aoi_crs, 'mask': args.mask_outside}
+
+
+# --------------------------------------------------
+# Display products (Web Mercator)
+# --------------------------------------------------
+# The map draws a PNG overlay as an axis-aligned lon/lat rectangle on an
+# EPSG:3857 slippy map, so display products are warped to EPSG:3857 and
+# reported with lon/lat bounds. The warp is a lookup table (display pixel ->
+# source pixel) that only depends on the source grid and the display size:
+# it is computed once per grid (exact on a coarse lattice, bilinear between
+# lattice points), cached on disk, and every later product of the same scene
+# is a single cv2.remap.
+
+DISPLAY_CRS = 'EPSG:3857'
+WARP_CACHE_DIR = os.environ.get('RASTER_WARP_CACHE', os.path.join('CACHE', 'warp'))
+WARP_LATTICE = 16  # display pixels between exactly transformed points
+REMAP_DTYPES = (np.uint8, np.uint16, np.int16, np.float32, np.float64)
+
+
+def lonlat_bounds(crs, bounds):
+    """(left, bottom, right, top) dalam crs -> dict north/south/west/east dalam derajat"""
+    left, bottom, right, top = bounds
+    if crs and CRS.from_user_input(crs) != CRS.from_user_input(LONLAT_CRS):
+        left, bottom, right, top = transform_bounds(crs, LONLAT_CRS, left, bottom, right, top, densify_pts=21)
+    return {
+        "north": float(max(top, bottom)),
+        "south": float(min(top, bottom)),
+        "west": float(min(left, right)),
+        "east": float(max(left, right)),
+    }
+
+
+def _lattice(size, step):
+    # Lattice positions 0, step, ..., size (always at least two points)
+    return np.unique(np.append(np.arange(0, size, step), size)).astype(np.float64)
+
+
+def _bilinear(values, xs, ys, width, height):
+    # Upsample lattice values (len(ys), len(xs)) to every display pixel centre
+    cols = np.arange(width) + 0.5
+    rows = np.arange(height) + 0.5
+    ix = np.clip(np.searchsorted(xs, cols, side='right') - 1, 0, len(xs) - 2)
+    iy = np.clip(np.searchsorted(ys, rows, side='right') - 1, 0, len(ys) - 2)
+    fx = ((cols - xs[ix]) / (xs[ix + 1] - xs[ix]))[None, :]
+    fy = ((rows - ys[iy]) / (ys[iy + 1] - ys[iy]))[:, None]
+    top = values[iy][:, ix] * (1 - fx) + values[iy][:, ix + 1] * fx
+    bottom = values[iy + 1][:, ix] * (1 - fx) + values[iy + 1][:, ix + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+class DisplayGrid:
+    """Grid EPSG:3857 untuk produk display + lookup piksel sumber (untuk cv2.remap)"""
+
+    def __init__(self, transform, width, height, map_x, map_y, src_shape, cached=False):
+        self.transform = transform
+        self.width = width
+        self.height = height
+        self.map_x = map_x          # source column of each display pixel (full-resolution pixels)
+        self.map_y = map_y
+        self.src_shape = src_shape  # (height, width) of the source grid
+        self.cached = cached
+
+    def bounds(self):
+        return lonlat_bounds(DISPLAY_CRS, array_bounds(self.height, self.width, self.transform))
+
+    def warp(self, data, nodata=np.nan):
+        """Warp (bands, h, w) atau (h, w) pada grid sumber (boleh decimated) ke grid display"""
+        data = np.asarray(data)
+        scale_y = data.shape[-2] / self.src_shape[0]
+        scale_x = data.shape[-1] / self.src_shape[1]
+        # Pixel centres: full-resolution coordinate c maps to (c + 0.5) * scale - 0.5
+        map_x = ((self.map_x + 0.5) * scale_x - 0.5).astype(np.float32)
+        map_y = ((self.map_y + 0.5) * scale_y - 0.5).astype(np.float32)
+        if data.dtype not in REMAP_DTYPES:
+            data = data.astype(np.float32)
+        fill = nodata if data.dtype.kind == 'f' else (0 if nodata is None or np.isnan(nodata) else nodata)
+        bands = data.reshape((-1,) + data.shape[-2:])
+        out = np.stack([
+            cv2.remap(band, map_x, map_y, interpolation=cv2.INTER_NEAREST,
+                      borderMode=cv2.BORDER_CONSTANT, borderValue=float(fill))
+            for band in bands
+        ])
+        return out if data.ndim == 3 else out[0]
+
+    def read(self, src, indexes=None):
+        """Baca dataset sumber secara decimated (±resolusi display) lalu warp ke grid display"""
+        indexes = indexes or list(range(1, src.count + 1))
+        factor = max(1.0, min(src.height / (2 * self.height), src.width / (2 * self.width)))
+        out_shape = (len(indexes), max(1, int(src.height / factor)), max(1, int(src.width / factor)))
+        data = src.read(indexes, out_shape=out_shape)
+        if src.nodata is not None and data.dtype.kind == 'f' and not np.isnan(src.nodata):
+            data[data == src.nodata] = np.nan
+        return self.warp(data, nodata=np.nan if data.dtype.kind == 'f' else src.nodata)
+
+
+def display_grid(crs, transform, width, height, max_size=1024, cache_dir=WARP_CACHE_DIR):
+    """DisplayGrid EPSG:3857 untuk grid sumber; lookup di-cache per grid sumber + ukuran display"""
+    if not crs:
+        raise ValueError('Raster has no CRS; it cannot be warped to EPSG:3857')
+    crs = CRS.from_user_input(crs)
+    key = hashlib.sha1(repr((crs.to_wkt(), tuple(transform)[:6], int(width), int(height),
+                             int(max_size), WARP_LATTICE)).encode('utf-8')).hexdigest()[:20]
+    cache_path = os.path.join(cache_dir, f'warp_{key}.npz') if cache_dir else None
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                map_x, map_y = cached['map_x'], cached['map_y']
+                return DisplayGrid(Affine(*cached['transform']), map_x.shape[1], map_x.shape[0],
+                                   map_x, map_y, (int(height), int(width)), cached=True)
+        except Exception:
+            pass  # Unreadable cache entry: rebuild it
+
+    left, bottom, right, top = array_bounds(height, width, transform)
+    dst_transform, dst_width, dst_height = calculate_default_transform(
+        crs, DISPLAY_CRS, width, height, left=left, bottom=bottom, right=right, top=top)
+    if max(dst_width, dst_height) > max_size:
+        # Coarser display pixels over the same extent
+        scale = max(dst_width, dst_height) / max_size
+        new_width, new_height = max(1, round(dst_width / scale)), max(1, round(dst_height / scale))
+        dst_transform = dst_transform * Affine.scale(dst_width / new_width, dst_height / new_height)
+        dst_width, dst_height = new_width, new_height
+
+    # Exact source position on the lattice, bilinear in between
+    xs, ys = _lattice(dst_width, WARP_LATTICE), _lattice(dst_height, WARP_LATTICE)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    mx, my = dst_transform * (grid_x.ravel(), grid_y.ravel())
+    sx, sy = transform_coords(DISPLAY_CRS, crs, mx, my)
+    px, py = ~Affine(*tuple(transform)[:6]) * (np.asarray(sx), np.asarray(sy))
+    shape = (len(ys), len(xs))
+    map_x = _bilinear(px.reshape(shape), xs, ys, dst_width, dst_height) - 0.5
+    map_y = _bilinear(py.reshape(shape), xs, ys, dst_width, dst_height) - 0.5
+    # Points the projection cannot map fall outside the source (-> nodata)
+    map_x = np.where(np.isfinite(map_x), map_x, -1).astype(np.float32)
+    map_y = np.where(np.isfinite(map_y), map_y, -1).astype(np.float32)
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + '.tmp.npz'
+            np.savez(tmp_path, map_x=map_x, map_y=map_y, transform=np.array(tuple(dst_transform)[:6]))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # Read-only location: the grid is just not reused
+    return DisplayGrid(dst_transform, dst_width, dst_height, map_x, map_y, (int(height), int(width)))
+
+
+def write_display_tif(path, grid, data, nodata=np.nan):
+    """Tulis array yang sudah di-warp (bands, h, w) sebagai GeoTIFF EPSG:3857 (overview display)"""
+    profile = {
+        'driver': 'GTiff', 'width': grid.width, 'height': grid.height, 'count': data.shape[0],
+        'dtype': data.dtype, 'crs': DISPLAY_CRS, 'transform': grid.transform,
+        'nodata': nodata, 'compress': 'deflate', **TILED_PROFILE,
+    }
+    with rasterio.open(path, 'w', **profile) as dst:
+        dst.write(data)
+    return path
+
+
+def add_display_arguments(parser):
+    """Argumen CLI produk display (EPSG:3857) yang sama untuk semua backend"""
+    parser.add_argument('--web-mercator', action='store_true',
+                        help='Warp the preview PNG to EPSG:3857 so it lines up with the slippy map')
+    parser.add_argument('--display-tif', action='store_true',
+                        help='Also write an EPSG:3857 overview GeoTIFF at preview resolution (implies --web-mercator)')
+    parser.add_argument('--display-size', type=int, default=1024,
+                        help='Longest side of the display products in pixels')
+
+
+def display_options_from_args(args):
+    """Opsi produk display dari argumen add_display_arguments"""
+    return {
+        'web_mercator': bool(args.web_mercator or args.display_tif),
+        'display_tif': bool(args.display_tif),
+        'size': args.display_size,
+    }
+
+
+def output_display_grid(tif_path, options):
+    """DisplayGrid untuk file output jika --web-mercator aktif, selain itu None"""
+    if not options or not options.get('web_mercator'):
+        return None
+    with rasterio.open(tif_path) as src:
+        return display_grid(src.crs, src.transform, src.width, src.height, max_size=options.get('size', 1024))
+
+
+# --------------------------------------------------
+# Progress events and cooperative cancellation
+# --------------------------------------------------
+# With --progress a backend streams JSON lines while it works, before the
+# final result line: {"status": "progress", "event": "stage" | "progress" |
+# "preview", ...}. The final line keeps its usual format, so callers that
+# only look at the last line (or the "success" line) still work. A run is
+# cancelled by a 'cancel' line on stdin or by SIGINT/SIGTERM (SIGBREAK on
+# Windows); it stops at the next window boundary and removes partial files.
+
+PREVIEW_STEPS = (25, 50, 75)  # percent done at which a refined preview is written
+
+
+class Cancelled(Exception):
+    """Run dihentikan karena permintaan cancel"""
+
+
+class Progress:
+    """Event JSON-lines (tahap, persen window, preview) + cek cancel di batas window"""
+
+    def __init__(self, enabled=False, interval=0.5):
+        self.enabled = enabled
+        self.interval = interval      # minimum seconds between percent events
+        self.cancel_event = threading.Event()
+        self.stage_name = None
+        self.total = 0
+        self.done = 0
+        self.started = time.perf_counter()
+        self._last_emit = 0.0
+        self._next_preview = 0
+
+    def listen(self, stdin=True):
+        """Pasang handler sinyal dan (opsional) pembaca 'cancel' dari stdin"""
+        for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+            sig = getattr(signal, name, None)
+            if sig is not None:
+                try:
+                    signal.signal(sig, lambda *_: self.cancel_event.set())
+                except (ValueError, OSError):
+                    pass  # Not the main thread / not supported here
+        if stdin and self.enabled and sys.stdin is not None and not sys.stdin.isatty():
+            threading.Thread(target=self._watch_stdin, daemon=True).start()
+        return self
+
+    def _watch_stdin(self):
+        try:
+            for line in sys.stdin:
+                text = line.strip().lower()
+                if text in ('cancel', 'stop') or '"cancel"' in text:
+                    self.cancel_event.set()
+                    return
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled('Cancelled by request')
+
+    def emit(self, event, **fields):
+        if self.enabled:
+            print(json.dumps({'status': 'progress', 'event': event, **fields}), flush=True)
+
+    def stage(self, name, total=0):
+        """Mulai tahap baru (total = jumlah window tahap ini)"""
+        self.check()
+        self.stage_name = name
+        self.total = int(total)
+        self.done = 0
+        self._next_preview = 0
+        self.emit('stage', stage=name, total=self.total)
+
+    @property
+    def percent(self):
+        return 100.0 * self.done / self.total if self.total else 0.0
+
+    def advance(self, n=1):
+        """Satu window selesai: kirim persen (dibatasi interval), lalu cek cancel"""
+        self.done += n
+        now = time.perf_counter()
+        if self.done >= self.total or now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self.emit('progress', stage=self.stage_name, done=self.done, total=self.total,
+                      percent=round(self.percent, 1), elapsed_s=round(now - self.started, 2))
+        self.check()
+
+    def preview_due(self):
+        """True sekali setiap melewati PREVIEW_STEPS (hanya jika event aktif)"""
+        if not self.enabled or self._next_preview >= len(PREVIEW_STEPS):
+            return False
+        if self.percent < PREVIEW_STEPS[self._next_preview]:
+            return False
+        while self._next_preview < len(PREVIEW_STEPS) and self.percent >= PREVIEW_STEPS[self._next_preview]:
+            self._next_preview += 1
+        return True
+
+    def preview(self, png_path, level):
+        """Preview baru tersedia: level 'coarse' (awal), 'refined' (sebagian), 'final'"""
+        self.emit('preview', level=level, preview_png=os.path.basename(png_path), path=png_path,
+                  percent=round(self.percent, 1))
+
+
+def remove_outputs(*paths):
+    """Hapus output parsial (dan sidecar .aux.xml) setelah run dibatalkan atau gagal"""
+    for path in paths:
+        for candidate in (path, f'{path}.aux.xml'):
+            try:
+                if candidate and os.path.exists(candidate):
+                    os.remove(candidate)
+            except OSError:
+                pass
+
+
+class PreviewCanvas:
+    """Preview decimated (nearest) yang diisi per window, untuk preview bertahap selama penulisan"""
+
+    def __init__(self, width, height, count=1, max_size=1024):
+        scale = min(1.0, max_size / max(width, height))
+        self.shape = (max(1, int(height * scale)), max(1, int(width * scale)))
+        # Source row/column sampled by each preview pixel (pixel centres)
+        self.rows = ((np.arange(self.shape[0]) + 0.5) * height / self.shape[0]).astype(np.int64)
+        self.cols = ((np.arange(self.shape[1]) + 0.5) * width / self.shape[1]).astype(np.int64)
+        self.data = np.full((count,) + self.shape, np.nan, dtype=np.float32)
+
+    def paste(self, window, data):
+        """Salin sampel window (bands, h, w) hasil tulis ke posisinya di preview"""
+        r0, c0 = int(window.row_off), int(window.col_off)
+        r1, c1 = r0 + int(window.height), c0 + int(window.width)
+        ri = np.arange(np.searchsorted(self.rows, r0), np.searchsorted(self.rows, r1))
+        ci = np.arange(np.searchsorted(self.cols, c0), np.searchsorted(self.cols, c1))
+        if ri.size and ci.size:
+            self.data[:, ri[:, None], ci[None, :]] = data[:, (self.rows[ri] - r0)[:, None], (self.cols[ci] - c0)[None, :]]
+
+
+def add_progress_arguments(parser):
+    """Argumen CLI event progress yang sama untuk semua backend"""
+    parser.add_argument('--progress', action='store_true',
+                        help="Stream JSON-lines progress events and previews while running; "
+                             "a 'cancel' line on stdin stops the run at the next window")
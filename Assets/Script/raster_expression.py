@@ -0,0 +1,684 @@
+import ast
+import hashlib
+import math
+import operator
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+from raster_common import FOCAL_FUNCTIONS
+
+# --------------------------------------------------
+# Formula engine for the raster calculator
+# --------------------------------------------------
+# The formula is parsed once into a canonical expression DAG: operands of
+# commutative operators are put in a fixed order and 'a < b' is written as
+# 'b > a', so '(b8-b4)/(b8+b4)' and '(b8-b4)/(b4+b8)' share the same nodes.
+# Every band read and every array-valued sub-expression is memoised in an
+# ArrayCache keyed by (input identity, window, node), so a long-running
+# backend only recomputes the parts of a formula that changed.
+
+BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+    ast.Pow: operator.pow, ast.BitAnd: operator.and_, ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor, ast.LShift: operator.lshift, ast.RShift: operator.rshift,
+}
+UNARY_OPS = {
+    ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Invert: operator.invert,
+    ast.Not: operator.not_,
+}
+COMPARE_OPS = {
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+COMMUTATIVE_OPS = (ast.Add, ast.Mult, ast.BitAnd, ast.BitOr, ast.BitXor)
+SWAPPED_COMPARE = {ast.Lt: ast.Gt, ast.LtE: ast.GtE}
+
+# Band of a named input in multi-file formulas: 'a.b5', 'after.b8a'
+ALIASED_BAND = re.compile(r'^b\d{1,2}a?$', re.IGNORECASE)
+
+
+class ArrayCache:
+    """LRU cache of numpy arrays bounded by total bytes"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.items = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        size = getattr(value, 'nbytes', 0)
+        if size > self.max_bytes:
+            return value
+        if key in self.items:
+            self.nbytes -= getattr(self.items.pop(key), 'nbytes', 0)
+        self.items[key] = value
+        self.nbytes += size
+        while self.nbytes > self.max_bytes and self.items:
+            _, old = self.items.popitem(last=False)
+            self.nbytes -= getattr(old, 'nbytes', 0)
+        return value
+
+    def clear(self):
+        self.items.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self.items),
+            'bytes': int(self.nbytes),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def file_identity(path):
+    """Identitas file input untuk kunci cache (berubah jika file ditimpa)"""
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+class _Canonicalizer(ast.NodeTransformer):
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, COMMUTATIVE_OPS):
+            left, right = ast.dump(node.left), ast.dump(node.right)
+            if right < left:
+                node.left, node.right = node.right, node.left
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1 and type(node.ops[0]) in SWAPPED_COMPARE:
+            node = ast.Compare(
+                left=node.comparators[0],
+                ops=[SWAPPED_COMPARE[type(node.ops[0])]()],
+                comparators=[node.left],
+            )
+        return node
+
+    def visit_Constant(self, node):
+        # 0.30 and 0.3 are the same node; int and float stay distinct
+        return ast.Constant(value=node.value)
+
+
+def parse_formula(formula):
+    """Parse dan kanonikalisasi formula menjadi AST ekspresi"""
+    try:
+        tree = ast.parse(formula.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Formula syntax error: {e.msg}")
+    tree = _Canonicalizer().visit(tree)
+    return ast.fix_missing_locations(tree)
+
+
+def node_key(node):
+    return ast.dump(node, annotate_fields=False)
+
+
+class FormulaEvaluator:
+    """Evaluate a canonical formula DAG with shared sub-expression caching"""
+
+    def __init__(self, formula, cache=None, names=None):
+        self.formula = formula
+        self.tree = parse_formula(formula)
+        self.cache = cache
+        # Extra names available to the formula besides bands (np + focal functions)
+        self.names = {'np': np}
+        self.names.update(FOCAL_FUNCTIONS)
+        if names:
+            self.names.update(names)
+
+    def band_name(self, node):
+        """'b5' untuk Name, 'a.b5' untuk band dari input ber-alias (multi-file), selain itu None"""
+        if isinstance(node, ast.Name) and node.id not in self.names:
+            return node.id
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) \
+                and node.value.id not in self.names and ALIASED_BAND.match(node.attr):
+            return f'{node.value.id}.{node.attr}'
+        return None
+
+    def band_names(self):
+        """Nama band (b1, b5, a.b5, ...) yang dipakai formula"""
+        found = []
+        aliased = {id(n.value) for n in ast.walk(self.tree)
+                   if isinstance(n, ast.Attribute) and ALIASED_BAND.match(n.attr)}
+        for node in ast.walk(self.tree):
+            if id(node) in aliased:
+                continue  # the 'a' of 'a.b5' is not a band by itself
+            name = self.band_name(node)
+            if name and name not in found:
+                found.append(name)
+        return found
+
+    def halo(self, node=None):
+        """Radius tambahan (piksel) yang dibutuhkan fungsi focal di dalam node"""
+        node = self.tree.body if node is None else node
+        own = 0
+        children = list(ast.iter_child_nodes(node))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FOCAL_FUNCTIONS:
+            size_node = node.args[1] if len(node.args) > 1 else next(
+                (kw.value for kw in node.keywords if kw.arg == 'size'), None)
+            size = 3 if size_node is None else _literal(size_node, self)
+            if isinstance(size, bool) or not isinstance(size, (int, np.integer)):
+                raise ValueError(f'{node.func.id}: window size must be a constant integer')
+            own = int(size) // 2
+        return own + max((self.halo(child) for child in children), default=0)
+
+    def temporaries(self):
+        """Jumlah array antara (operasi unik di DAG) untuk perkiraan memori per piksel"""
+        ops = (ast.BinOp, ast.UnaryOp, ast.Call, ast.Compare, ast.BoolOp, ast.IfExp)
+        return len({node_key(n) for n in ast.walk(self.tree) if isinstance(n, ops)})
+
+    def evaluate(self, read_band, scope):
+        """read_band(name) -> array; scope identifies input + window for the cache"""
+        return self.evaluate_node(self.tree.body, read_band, scope)
+
+    def evaluate_node(self, node, read_band, scope):
+        memo = {}
+        return self._eval(node, read_band, scope, memo)
+
+    def substitute(self, values, tag=''):
+        """Ganti node (berdasarkan node_key) dengan nilai konstan hasil reduksi"""
+        evaluator = self
+
+        class _Replace(ast.NodeTransformer):
+            def generic_visit(self, node):
+                key = node_key(node)
+                if key in values:
+                    # Name is derived from the node and the region, so cache keys stay unique
+                    digest = hashlib.sha1((key + tag).encode('utf-8')).hexdigest()[:16]
+                    name = f'_r{digest}'
+                    evaluator.names[name] = values[key]
+                    return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+                return super().generic_visit(node)
+
+        self.tree = ast.fix_missing_locations(_Replace().visit(self.tree))
+
+    def _cached(self, key, compute):
+        if self.cache is None:
+            return compute()
+        value = self.cache.get(key)
+        if value is None:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                # Cached arrays are shared between formulas, so they must never change in place
+                value.flags.writeable = False
+                self.cache.put(key, value)
+        return value
+
+    def _eval(self, node, read_band, scope, memo):
+        key = node_key(node)
+        if key in memo:
+            return memo[key]
+
+        band = self.band_name(node)
+        if band is not None:
+            value = self._cached(('band', scope, band), lambda: read_band(band))
+        elif isinstance(node, ast.Name):
+            value = self.names[node.id]
+        elif isinstance(node, ast.Constant):
+            value = node.value
+        elif isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call)):
+            value = self._cached(('node', scope, key), lambda: self._apply(node, read_band, scope, memo))
+        elif isinstance(node, ast.Attribute):
+            if node.attr.startswith('_'):
+                raise ValueError(f"Attribute '{node.attr}' is not allowed in formulas")
+            value = getattr(self._eval(node.value, read_band, scope, memo), node.attr)
+        elif isinstance(node, (ast.Tuple, ast.List)):
+            value = [self._eval(e, read_band, scope, memo) for e in node.elts]
+            value = tuple(value) if isinstance(node, ast.Tuple) else value
+        elif isinstance(node, ast.IfExp):
+            test = self._eval(node.test, read_band, scope, memo)
+            branch = node.body if test else node.orelse
+            value = self._eval(branch, read_band, scope, memo)
+        elif isinstance(node, ast.Subscript):
+            value = self._eval(node.value, read_band, scope, memo)[self._eval(node.slice, read_band, scope, memo)]
+        elif isinstance(node, ast.Slice):
+            parts = [None if p is None else self._eval(p, read_band, scope, memo)
+                     for p in (node.lower, node.upper, node.step)]
+            value = slice(*parts)
+        else:
+            raise ValueError(f"Unsupported formula syntax: {type(node).__name__}")
+
+        memo[key] = value
+        return value
+
+    def _apply(self, node, read_band, scope, memo):
+        ev = lambda n: self._eval(n, read_band, scope, memo)
+        if isinstance(node, ast.BinOp):
+            return BINARY_OPS[type(node.op)](ev(node.left), ev(node.right))
+        if isinstance(node, ast.UnaryOp):
+            return UNARY_OPS[type(node.op)](ev(node.operand))
+        if isinstance(node, ast.Compare):
+            left = ev(node.left)
+            result = None
+            for op, comp in zip(node.ops, node.comparators):
+                right = ev(comp)
+                step = COMPARE_OPS[type(op)](left, right)
+                result = step if result is None else (result & step)
+                left = right
+            return result
+        # ast.Call
+        func = ev(node.func)
+        args = [ev(a) for a in node.args]
+        kwargs = {kw.arg: ev(kw.value) for kw in node.keywords}
+        return func(*args, **kwargs)
+
+
+# --------------------------------------------------
+# Scene-wide reductions (two-pass streaming)
+# --------------------------------------------------
+# np.mean(b4), np.std(...), np.percentile(..., q), np.histogram(...) etc. need
+# the whole band. Instead of loading it, the calculator finds these calls,
+# computes them in statistics passes over streamed windows, substitutes the
+# results as constants and then runs the per-pixel pass. Nested reductions
+# (np.mean(b4 - np.mean(b4))) are resolved innermost first.
+
+MOMENT_REDUCTIONS = {
+    'mean', 'nanmean', 'std', 'nanstd', 'var', 'nanvar', 'sum', 'nansum',
+    'min', 'max', 'amin', 'amax', 'nanmin', 'nanmax',
+}
+ORDER_REDUCTIONS = {
+    'percentile', 'nanpercentile', 'quantile', 'nanquantile', 'median', 'nanmedian',
+}
+REDUCTIONS = MOMENT_REDUCTIONS | ORDER_REDUCTIONS | {'histogram'}
+METHOD_REDUCTIONS = {'mean', 'std', 'var', 'sum', 'min', 'max'}
+
+HISTOGRAM_BINS = 4096          # bins per refinement pass for exact percentiles
+GATHER_LIMIT = 2_000_000       # values collected in memory for the final exact pick
+
+
+def _reduction_name(node):
+    """Nama reduksi jika node adalah np.<reduksi>(x) / x.<reduksi>(), selain itu None"""
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+        return None
+    func = node.func
+    is_np = isinstance(func.value, ast.Name) and func.value.id == 'np'
+    if is_np and func.attr in REDUCTIONS and node.args:
+        return func.attr
+    if not is_np and func.attr in METHOD_REDUCTIONS:
+        return func.attr
+    return None
+
+
+def _contains_reduction(node):
+    return any(_reduction_name(n) for n in ast.walk(node))
+
+
+def _reduction_children(node):
+    is_np = isinstance(node.func.value, ast.Name) and node.func.value.id == 'np'
+    children = [] if is_np else [node.func.value]
+    return children + list(node.args) + [kw.value for kw in node.keywords]
+
+
+def find_reductions(tree):
+    """Reduksi paling dalam (argumennya tidak mengandung reduksi lain)"""
+    found = {}
+    for node in ast.walk(tree):
+        if not _reduction_name(node):
+            continue
+        if any(_contains_reduction(child) for child in _reduction_children(node)):
+            continue
+        found.setdefault(node_key(node), node)
+    return list(found.values())
+
+
+class _MomentStats:
+    """count / mean / M2 (Chan) / sum / min / max over streamed values"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.total = 0.0
+        self.vmin = None
+        self.vmax = None
+        self.fmin = None    # min/max over finite values only
+        self.fmax = None
+        self.has_nan = False
+        self.n_neginf = 0
+        self.n_posinf = 0
+        self.dtype = None
+
+    def update(self, values):
+        values = np.asarray(values)
+        if self.dtype is None:
+            self.dtype = values.dtype
+        flat = values.ravel()
+        nan = np.isnan(flat) if flat.dtype.kind == 'f' else None
+        if nan is not None and nan.any():
+            self.has_nan = True
+            flat = flat[~nan]
+        if flat.size == 0:
+            return
+        vmin, vmax = flat.min(), flat.max()
+        self.vmin = vmin if self.vmin is None else min(self.vmin, vmin)
+        self.vmax = vmax if self.vmax is None else max(self.vmax, vmax)
+        finite = flat
+        if flat.dtype.kind == 'f':
+            n_neginf = int(np.count_nonzero(flat == -np.inf))
+            n_posinf = int(np.count_nonzero(flat == np.inf))
+            self.n_neginf += n_neginf
+            self.n_posinf += n_posinf
+            if n_neginf or n_posinf:
+                finite = flat[np.isfinite(flat)]
+        if finite.size:
+            fmin, fmax = finite.min(), finite.max()
+            self.fmin = fmin if self.fmin is None else min(self.fmin, fmin)
+            self.fmax = fmax if self.fmax is None else max(self.fmax, fmax)
+
+        data = flat.astype(np.float64)
+        n_b = data.size
+        mean_b = float(data.mean())
+        m2_b = float(((data - mean_b) ** 2).sum())
+        self.total += float(data.sum())
+        n_a = self.n
+        delta = mean_b - self.mean
+        self.n = n_a + n_b
+        self.mean += delta * n_b / self.n
+        self.m2 += m2_b + delta * delta * n_a * n_b / self.n
+
+
+class _Reduction:
+    """Base: update(values) per window, finish_pass() -> True when the value is known"""
+
+    def __init__(self, func, kwargs):
+        self.func = func
+        self.kwargs = kwargs
+        self.value = None
+
+    def cast(self, value, dtype):
+        if dtype is not None and np.dtype(dtype).kind == 'f':
+            return np.asarray(value, dtype=dtype)[()]
+        return np.float64(value)
+
+
+class _MomentReduction(_Reduction):
+    def __init__(self, func, kwargs):
+        super().__init__(func, kwargs)
+        self.stats = _MomentStats()
+
+    def update(self, values):
+        self.stats.update(values)
+
+    def finish_pass(self):
+        st = self.stats
+        func = self.func.replace('amin', 'min').replace('amax', 'max')
+        ignore_nan = func.startswith('nan')
+        base = func[3:] if ignore_nan else func
+        if st.has_nan and not ignore_nan:
+            self.value = self.cast(np.nan, st.dtype)
+            return True
+        if st.n == 0:
+            if base in ('min', 'max'):
+                raise ValueError(f'np.{self.func}: no valid pixels')
+            self.value = self.cast(0.0 if base == 'sum' else np.nan, st.dtype)
+            return True
+        ddof = self.kwargs.get('ddof', 0)
+        if base == 'mean':
+            value = st.total / st.n if (st.n_neginf or st.n_posinf) else st.mean
+        elif base == 'sum':
+            value = st.total
+        elif base in ('std', 'var'):
+            var = st.m2 / (st.n - ddof) if st.n > ddof else np.nan
+            value = math.sqrt(var) if base == 'std' and var == var else var
+        elif base == 'min':
+            value = st.vmin
+        else:
+            value = st.vmax
+        self.value = self.cast(value, st.dtype)
+        return True
+
+
+class _OrderReduction(_Reduction):
+    """Exact percentile: histogram refinement around the needed ranks, then a small gather"""
+
+    def __init__(self, func, kwargs, q):
+        super().__init__(func, kwargs)
+        self.ignore_nan = func.startswith('nan')
+        base = func[3:] if self.ignore_nan else func
+        q = np.asarray(q, dtype=np.float64)
+        if base == 'median':
+            q = np.asarray(0.5)
+        elif base == 'percentile':
+            q = q / 100.0
+        if np.any((q < 0) | (q > 1)):
+            raise ValueError(f'np.{func}: q out of range')
+        self.q = q
+        self.stats = _MomentStats()
+        self.counting = True
+        self.targets = {}   # rank -> search state for the value at that rank
+
+    def update(self, values):
+        if self.counting:
+            self.stats.update(values)
+            return
+        flat = np.asarray(values).ravel().astype(np.float64)
+        for t in self.targets.values():
+            if t['value'] is not None:
+                continue
+            inside = flat[(flat >= t['lo']) & (flat < t['hi'])]
+            if t['gather']:
+                t['gathered'].append(inside)
+            else:
+                idx = np.searchsorted(t['edges'], inside, side='right') - 1
+                t['counts'] += np.bincount(np.clip(idx, 0, HISTOGRAM_BINS - 1), minlength=HISTOGRAM_BINS)
+
+    def _start_targets(self):
+        st = self.stats
+        n_finite = st.n - st.n_neginf - st.n_posinf
+        for q in np.atleast_1d(self.q):
+            below = int(math.floor(q * (st.n - 1)))
+            for r in (below, min(below + 1, st.n - 1)):
+                if r in self.targets:
+                    continue
+                t = {'value': None, 'gather': False, 'gathered': []}
+                if r < st.n_neginf:
+                    t['value'] = -np.inf
+                elif r >= st.n_neginf + n_finite:
+                    t['value'] = np.inf
+                else:
+                    # Search window [lo, hi) over finite values, 'below' values lie under lo
+                    t.update(rank=r - st.n_neginf, below=0, count_in=n_finite,
+                             lo=float(st.fmin), hi=float(np.nextafter(float(st.fmax), np.inf)))
+                self.targets[r] = t
+
+    def _prepare_pass(self):
+        """Set up the next pass; False when every rank value is known"""
+        busy = False
+        for t in self.targets.values():
+            if t['value'] is not None:
+                continue
+            if t['hi'] <= np.nextafter(t['lo'], np.inf):
+                # Only one representable value left in [lo, hi)
+                t['value'] = t['lo']
+                continue
+            t['gather'] = t['count_in'] <= GATHER_LIMIT
+            t['gathered'] = []
+            if not t['gather']:
+                t['edges'] = np.linspace(t['lo'], t['hi'], HISTOGRAM_BINS + 1)
+                t['edges'][-1] = t['hi']
+                t['counts'] = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+            busy = True
+        return busy
+
+    def finish_pass(self):
+        st = self.stats
+        if self.counting:
+            self.counting = False
+            if st.n == 0 or (st.has_nan and not self.ignore_nan):
+                self.value = self.cast(np.full(self.q.shape, np.nan), st.dtype)
+                return True
+            self._start_targets()
+        else:
+            for t in self.targets.values():
+                if t['value'] is not None:
+                    continue
+                if t['gather']:
+                    values = np.sort(np.concatenate(t['gathered']))
+                    t['value'] = values[t['rank'] - t['below']]
+                    t['gathered'] = []
+                    continue
+                cum = np.cumsum(t['counts'])
+                k = int(np.searchsorted(cum, t['rank'] - t['below'], side='right'))
+                t['below'] += int(cum[k - 1]) if k > 0 else 0
+                t['lo'], t['hi'] = float(t['edges'][k]), float(t['edges'][k + 1])
+                t['count_in'] = int(t['counts'][k])
+        if self._prepare_pass():
+            return False
+        self._finish_value()
+        return True
+
+    def _finish_value(self):
+        st = self.stats
+        out = []
+        for q in np.atleast_1d(self.q):
+            virtual = q * (st.n - 1)
+            below = int(math.floor(virtual))
+            above = min(below + 1, st.n - 1)
+            gamma = virtual - below
+            a = np.float64(self.targets[below]['value'])
+            b = np.float64(self.targets[above]['value'])
+            # Same interpolation as numpy's linear method (_lerp)
+            diff = b - a
+            value = b - diff * (1 - gamma) if gamma >= 0.5 else a + diff * gamma
+            out.append(value)
+        self.value = self.cast(np.asarray(out).reshape(self.q.shape), st.dtype)
+
+
+class _HistogramReduction(_Reduction):
+    def __init__(self, func, kwargs, bins, hist_range):
+        super().__init__(func, kwargs)
+        if not isinstance(bins, (int, np.integer)):
+            raise ValueError('np.histogram: only an integer bin count is supported in formulas')
+        self.bins = int(bins)
+        self.range = hist_range
+        self.density = bool(kwargs.get('density', False))
+        self.stats = _MomentStats()
+        self.edges = None
+        self.counts = None
+
+    def _set_edges(self, lo, hi, dtype):
+        sample = np.asarray([lo, hi], dtype=dtype)
+        self.edges = np.histogram_bin_edges(sample, bins=self.bins, range=self.range)
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+
+    def update(self, values):
+        if self.edges is None:
+            self.stats.update(values)
+        else:
+            hist, _ = np.histogram(values, bins=self.edges)
+            self.counts += hist
+
+    def finish_pass(self):
+        if self.edges is None:
+            st = self.stats
+            if self.range is not None:
+                self._set_edges(self.range[0], self.range[1], st.dtype or np.float64)
+            else:
+                if st.has_nan or st.n_neginf or st.n_posinf or st.n == 0:
+                    raise ValueError('np.histogram: autodetected range is not finite')
+                self._set_edges(st.vmin, st.vmax, st.dtype)
+            return False
+        counts = self.counts
+        if self.density:
+            counts = counts / counts.sum() / np.diff(self.edges)
+        self.value = (counts, self.edges)
+        return True
+
+
+def _literal(node, evaluator):
+    """Nilai argumen konstan reduksi (q, ddof, bins, range)"""
+    return evaluator.evaluate_node(node, lambda name: None, scope=None)
+
+
+def make_reduction(node, evaluator):
+    """Buat akumulator streaming untuk satu node reduksi"""
+    func = _reduction_name(node)
+    is_np = isinstance(node.func.value, ast.Name) and node.func.value.id == 'np'
+    data_node = node.args[0] if is_np else node.func.value
+    extra = list(node.args[1:] if is_np else node.args)
+    kwargs = {kw.arg: _literal(kw.value, evaluator) for kw in node.keywords}
+    if kwargs.get('axis') is not None or (func in MOMENT_REDUCTIONS and extra):
+        raise ValueError(f'np.{func}: axis is not supported for scene-wide reductions')
+    kwargs.pop('axis', None)
+
+    if func in MOMENT_REDUCTIONS:
+        return data_node, _MomentReduction(func, kwargs)
+    if func in ORDER_REDUCTIONS:
+        if func.endswith('median'):
+            q = 0.5
+        else:
+            q = _literal(extra[0], evaluator) if extra else kwargs.get('q')
+        if q is None:
+            raise ValueError(f'np.{func}: q is required')
+        method = kwargs.get('method', kwargs.get('interpolation', 'linear'))
+        if method != 'linear':
+            raise ValueError(f'np.{func}: only the linear method is supported in formulas')
+        return data_node, _OrderReduction(func, kwargs, q)
+    bins = _literal(extra[0], evaluator) if extra else kwargs.get('bins', 10)
+    hist_range = _literal(extra[1], evaluator) if len(extra) > 1 else kwargs.get('range')
+    return data_node, _HistogramReduction(func, kwargs, bins, hist_range)
+
+
+def estimated_passes(tree):
+    """Perkiraan jumlah pass statistik untuk reduksi formula (tanpa membaca data)"""
+    def levels(node):
+        # Nesting depth of reductions, and whether an order statistic sits on each level
+        depth, order = 0, False
+        for child in ast.iter_child_nodes(node):
+            d, o = levels(child)
+            depth, order = max(depth, d), order or o
+        name = _reduction_name(node)
+        if name:
+            return depth + 1, order or name in ORDER_REDUCTIONS
+        return depth, order
+
+    depth, order = levels(tree)
+    # Exact percentiles refine a histogram over a few passes before the final pick
+    return depth * (3 if order else 1)
+
+
+def resolve_reductions(evaluator, windows, evaluate_window, tag=''):
+    """Hitung semua reduksi global dengan pass statistik per window, lalu substitusi ke formula
+
+    windows: windows covering the region; evaluate_window(node, window) -> values of
+    node for that window (halo handled by the caller). Returns the number of passes.
+    """
+    passes = 0
+    while True:
+        nodes = find_reductions(evaluator.tree)
+        if not nodes:
+            return passes
+        pending = [(node_key(n),) + make_reduction(n, evaluator) for n in nodes]
+        values = {}
+        while pending:
+            passes += 1
+            for window in windows:
+                for _, data_node, reduction in pending:
+                    reduction.update(evaluate_window(data_node, window))
+            still = []
+            for item in pending:
+                key, _, reduction = item
+                if reduction.finish_pass():
+                    values[key] = reduction.value
+                else:
+                    still.append(item)
+            pending = still
+        evaluator.substitute(values, tag=tag)
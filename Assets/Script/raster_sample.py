@@ -0,0 +1,346 @@
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.warp import transform as transform_coords
+from rasterio.windows import Window
+
+from raster_common import load_features, resolve_crs, memmap_band, LONLAT_CRS
+
+# --------------------------------------------------
+# Point / transect sampling
+# --------------------------------------------------
+# All coordinates of a request are transformed to the raster CRS in one call
+# and turned into row/col with the inverse affine transform (vectorised).
+# Points are then grouped by the internal block they fall in, so each block is
+# read and decoded once however many points hit it; uncompressed strip
+# GeoTIFFs (e.g. --scratch outputs) are indexed straight through a memory map.
+# In --serve mode datasets (and their block cache) stay open between requests,
+# so map clicks and measurement lines only pay for the blocks they touch.
+
+EARTH_RADIUS = 6371008.8  # metres (mean radius), for transects on lon/lat rasters
+
+
+def parse_coordinates(source):
+    """Titik dari 'lon,lat lon,lat ...', list JSON [[lon, lat], ...] atau GeoJSON (file/string)"""
+    if isinstance(source, (list, tuple)):
+        if source and isinstance(source[0], str):
+            source = ' '.join(source)
+        else:
+            return [(float(c[0]), float(c[1])) for c in source]
+    text = source.strip()
+    if os.path.exists(text) or text.startswith('{'):
+        coords = []
+        for feature in load_features(text):
+            geom = feature['geometry']
+            if geom['type'] == 'Point':
+                coords.append(geom['coordinates'])
+            elif geom['type'] in ('MultiPoint', 'LineString'):
+                coords.extend(geom['coordinates'])
+            elif geom['type'] == 'MultiLineString':
+                for line in geom['coordinates']:
+                    coords.extend(line)
+            else:
+                raise ValueError(f"Unsupported geometry for sampling: {geom['type']}")
+        return [(float(c[0]), float(c[1])) for c in coords]
+    if text.startswith('['):
+        return [(float(c[0]), float(c[1])) for c in json.loads(text)]
+    pairs = [p for p in re.split(r'[;\s]+', text) if p]
+    coords = []
+    for pair in pairs:
+        parts = pair.split(',')
+        if len(parts) != 2:
+            raise ValueError(f"Invalid point '{pair}' (use x,y)")
+        coords.append((float(parts[0]), float(parts[1])))
+    return coords
+
+
+def _segment_lengths(xs, ys, geographic):
+    """Panjang tiap segmen polyline (meter untuk lon/lat, satuan CRS untuk proyeksi)"""
+    if not geographic:
+        return np.hypot(np.diff(xs), np.diff(ys))
+    lon, lat = np.radians(xs), np.radians(ys)
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def densify_line(xs, ys, step, geographic=False):
+    """Titik setiap `step` sepanjang polyline (vertex akhir selalu ikut) + jarak kumulatif"""
+    xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+    if xs.size < 2:
+        raise ValueError('A transect needs at least two vertices')
+    lengths = _segment_lengths(xs, ys, geographic)
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+    total = cumulative[-1]
+    if total == 0:
+        return xs[:1], ys[:1], np.zeros(1)
+    distance = np.arange(0.0, total, step)
+    distance = np.append(distance, total) if distance[-1] < total else distance
+    # Linear interpolation inside each segment (per coordinate)
+    return np.interp(distance, cumulative, xs), np.interp(distance, cumulative, ys), distance
+
+
+class RasterSampler:
+    """Dataset terbuka untuk sampling berulang (dibuka ulang bila file berubah)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp = self._stamp()
+        self.ds = rasterio.open(path)
+        self._maps = {}
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    @property
+    def is_stale(self):
+        try:
+            return self._stamp() != self.stamp
+        except OSError:
+            return True
+
+    def close(self):
+        self.ds.close()
+
+    def _map(self, bidx):
+        if bidx not in self._maps:
+            self._maps[bidx] = memmap_band(self.ds, bidx)
+        return self._maps[bidx]
+
+    def sample(self, xs, ys, crs='lonlat', bands=None):
+        """Nilai (bands x N, float64; NaN = nodata/di luar raster) dan jumlah block yang dibaca"""
+        ds = self.ds
+        bands = bands or list(range(1, ds.count + 1))
+        for b in bands:
+            if not 1 <= b <= ds.count:
+                raise ValueError(f'Band {b} is invalid for {os.path.basename(self.path)} ({ds.count} bands)')
+
+        # One batched transform for all points, then the inverse affine per point
+        src_crs = resolve_crs(crs, ds.crs)
+        xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+        if ds.crs and src_crs != ds.crs:
+            xs, ys = (np.asarray(v) for v in transform_coords(src_crs, ds.crs, xs, ys))
+        cols, rows = ~ds.transform * (xs, ys)
+        cols, rows = np.floor(cols).astype(np.int64), np.floor(rows).astype(np.int64)
+        inside = (cols >= 0) & (cols < ds.width) & (rows >= 0) & (rows < ds.height)
+
+        values = np.full((len(bands), xs.size), np.nan)
+        blocks_read = 0
+        index = np.flatnonzero(inside)
+        if index.size:
+            r, c = rows[index], cols[index]
+            mapped = [self._map(b) for b in bands]
+            if all(m is not None for m in mapped):
+                # Uncompressed bands: direct fancy indexing, no block decode
+                for i, band in enumerate(mapped):
+                    values[i, index] = band[r, c]
+            else:
+                bh, bw = ds.block_shapes[bands[0] - 1]
+                keys = (r // bh) * ((ds.width + bw - 1) // bw) + (c // bw)
+                order = np.argsort(keys, kind='stable')
+                starts = np.concatenate(([0], np.flatnonzero(np.diff(keys[order])) + 1, [order.size]))
+                for s, e in zip(starts[:-1], starts[1:]):
+                    group = order[s:e]
+                    row0 = int(r[group[0]] // bh) * bh
+                    col0 = int(c[group[0]] // bw) * bw
+                    window = Window(col0, row0, min(bw, ds.width - col0), min(bh, ds.height - row0))
+                    block = ds.read(bands, window=window)
+                    values[:, index[group]] = block[:, r[group] - row0, c[group] - col0]
+                    blocks_read += 1
+
+        nodata = ds.nodata
+        if nodata is not None and not np.isnan(nodata):
+            values[values == nodata] = np.nan
+        return values, blocks_read
+
+
+class SamplerCache:
+    """RasterSampler per path, dipakai bersama antar request (--serve)"""
+
+    def __init__(self):
+        self.samplers = {}
+
+    def get(self, path):
+        sampler = self.samplers.get(path)
+        if sampler is not None and sampler.is_stale:
+            sampler.close()
+            sampler = None
+        if sampler is None:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'Input file not found: {path}')
+            sampler = self.samplers[path] = RasterSampler(path)
+        return sampler
+
+    def clear(self):
+        for sampler in self.samplers.values():
+            sampler.close()
+        self.samplers.clear()
+
+    def stats(self):
+        return {'open': len(self.samplers), 'paths': list(self.samplers)}
+
+
+class Data:
+    def __init__(self, rasters, points=None, line=None, crs='lonlat', bands=None, step=None,
+                 cache=None, output=None):
+        self.rasters = rasters
+        self.points = points
+        self.line = line
+        self.crs = crs
+        self.bands = bands
+        self.step = step          # transect spacing (metres on lon/lat, CRS units otherwise)
+        self.cache = cache or SamplerCache()
+        self.output = output      # Optional JSON file with the same result
+
+        self.status = 'running'
+        self.messages = 'Initializing...'
+
+    def _coordinates(self):
+        """Koordinat sampel (x, y) dalam CRS request + jarak sepanjang transect (None untuk titik)"""
+        if self.line is not None:
+            coords = parse_coordinates(self.line)
+            first = self.cache.get(self.rasters[0]).ds
+            src_crs = resolve_crs(self.crs, first.crs)
+            geographic = CRS.from_user_input(src_crs).is_geographic
+            step = self.step
+            if not step:
+                # Default spacing: one pixel of the first raster
+                step = abs(first.transform.a)
+                if geographic and first.crs and first.crs.is_geographic:
+                    step *= math.radians(1) * EARTH_RADIUS  # pixel in degrees, spacing in metres
+            xs, ys, distance = densify_line([c[0] for c in coords], [c[1] for c in coords], step, geographic)
+            return xs, ys, distance
+        coords = parse_coordinates(self.points)
+        if not coords:
+            raise ValueError('No points given')
+        return np.array([c[0] for c in coords]), np.array([c[1] for c in coords]), None
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            if not self.rasters:
+                raise ValueError('No input raster given')
+            if (self.points is None) == (self.line is None):
+                raise ValueError('Give either points or a line to sample')
+
+            xs, ys, distance = self._coordinates()
+            samples = {}
+            blocks_read = 0
+            for path in self.rasters:
+                sampler = self.cache.get(path)
+                bands = self.bands or list(range(1, sampler.ds.count + 1))
+                values, n_blocks = sampler.sample(xs, ys, crs=self.crs, bands=bands)
+                blocks_read += n_blocks
+                name = os.path.splitext(os.path.basename(path))[0]
+                for band, row in zip(bands, values):
+                    label = name if len(bands) == 1 else f'{name}_b{band}'
+                    samples[label] = [None if np.isnan(v) else float(v) for v in row]
+
+            self.status = 'success'
+            where = 'along the transect' if distance is not None else 'point(s)'
+            self.messages = f'Sampled {xs.size} {where} over {len(self.rasters)} raster(s)'
+            extra = {
+                'blocks_read': blocks_read,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+            }
+            if distance is not None:
+                extra['distance'] = [round(float(d), 3) for d in distance]
+            self._print_result(np.column_stack([xs, ys]).tolist(), samples, extra)
+
+        except Exception as e:
+            self.status = 'failed'
+            self.messages = str(e)
+            self._print_result()
+
+    def _print_result(self, points=None, samples=None, extra=None):
+        result = {
+            'status': self.status,
+            'messages': self.messages,
+            'crs': LONLAT_CRS if str(self.crs).lower() == 'lonlat' else str(self.crs),
+            'points': points or [],
+            'samples': samples or {},
+        }
+        if extra:
+            result.update(extra)
+        if self.output and self.status == 'success':
+            with open(self.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            result['path'] = self.output
+        print(json.dumps(result), flush=True)
+
+
+def serve():
+    """Backend persisten: satu request JSON per baris di stdin, satu hasil JSON per baris di stdout
+
+    Request fields: input (path or list), points or line (see parse_coordinates), crs, bands, step.
+    Commands: {"cmd": "stats"}, {"cmd": "clear"}, {"cmd": "exit"}.
+    Datasets stay open between requests (reopened when the file changes on disk).
+    """
+    cache = SamplerCache()
+    sys.stdout.reconfigure(line_buffering=True)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            print(json.dumps({'status': 'failed', 'messages': f'Invalid request: {e}'}))
+            continue
+
+        cmd = request.get('cmd')
+        if cmd == 'exit':
+            break
+        if cmd == 'clear':
+            cache.clear()
+        if cmd in ('stats', 'clear'):
+            print(json.dumps({'status': 'success', 'cache': cache.stats()}))
+            continue
+
+        rasters = request.get('input')
+        Data(rasters=[rasters] if isinstance(rasters, str) else rasters, points=request.get('points'),
+             line=request.get('line'), crs=request.get('crs', 'lonlat'), bands=request.get('bands'),
+             step=request.get('step'), cache=cache).run()
+    cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sample raster values at points or along a transect')
+    parser.add_argument('-i', '--input', nargs='+', help='Raster(s) to sample, e.g. NDVI / NDBI outputs')
+    parser.add_argument('--points', nargs='+',
+                        help="Points as 'x,y x,y ...', a JSON list [[x, y], ...] or GeoJSON (file or string)")
+    parser.add_argument('--line', nargs='+',
+                        help='Transect polyline vertices (same formats as --points, or a GeoJSON LineString)')
+    parser.add_argument('--step', type=float,
+                        help='Spacing of transect samples: metres for lon/lat lines, CRS units otherwise '
+                             '(default: one pixel of the first raster)')
+    parser.add_argument('--crs', default='lonlat',
+                        help='CRS of the coordinates: lonlat (default), raster, or any CRS string like EPSG:32750')
+    parser.add_argument('--bands', type=int, nargs='+', help='Bands to sample (default: all)')
+    parser.add_argument('-o', '--output', help='Also write the result JSON to this file')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run as a persistent backend reading JSON requests from stdin (keeps rasters open)')
+    args = parser.parse_args()
+
+    if args.serve:
+        serve()
+        return
+    if not args.input:
+        parser.error('Argument -i/--input is required (or use --serve)')
+
+    data = Data(rasters=args.input, points=args.points, line=args.line, crs=args.crs, bands=args.bands,
+                step=args.step, output=args.output)
+    data.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from raster_batch import JOB_MEMORY_MB, backend_command, default_workers, parse_backend_result, parse_data_result
+
+# --------------------------------------------------
+# Local job service
+# --------------------------------------------------
+# One long-running process in front of the backends. The UI writes JSON
+# requests to stdin (one per line) instead of starting a backend per click:
+#
+#   {"cmd": "submit", "id": "t7", "backend": "transform", "panel": "transform",
+#    "priority": "interactive", "args": ["-n", "scene", "--algo", "NDVI", "--input", "..."]}
+#   {"cmd": "cancel", "id": "t7"}    {"cmd": "status"}    {"cmd": "exit"}
+#
+# Jobs wait in a priority queue (interactive previews before batch exports,
+# FIFO within a priority) and run on a small pool of backend processes.
+# A request identical to a queued/running job is attached to it instead of
+# running twice. A newer request from the same panel supersedes the older
+# work of that panel: queued jobs are dropped, running ones get a 'cancel'
+# line on stdin (they stop at the next window and remove partial files) and
+# are terminated if they have not stopped after CANCEL_GRACE seconds.
+# Every event is one JSON line on stdout with "event" and "job".
+
+BACKENDS = {
+    'transform': ('rasterTransform.py', 'rasterTransform.exe'),
+    'calculator': ('raster_calculator_standalone (1).py', None),
+    'composite': ('composite2_standalone.py', 'composite2_standalone.exe'),
+    'classify': ('raster_classify.py', None),
+    'temporal': ('raster_temporal.py', None),
+    'zonal': ('raster_zonal.py', None),
+    'sharpen': ('raster_sharpen.py', None),
+    'sample': ('raster_sample.py', None),
+}
+# Backends whose result is the data itself (per-zone statistics, samples), not an
+# output file: their final JSON line is forwarded as-is instead of the batch-job subset
+DATA_BACKENDS = ('zonal', 'sample')
+# Backends that stream --progress events and stop cleanly on a 'cancel' line
+PROGRESS_BACKENDS = ('transform', 'calculator', 'composite', 'classify', 'temporal', 'sharpen')
+# Backends that size windows/threads from --memory-mb (default: half the free RAM, too
+# much when several jobs run at once): each job gets the per-job budget the pool was sized for
+MEMORY_BACKENDS = ('transform', 'calculator', 'sharpen')
+
+PRIORITIES = {'interactive': 0, 'preview': 0, 'normal': 1, 'batch': 2, 'export': 2}
+CANCEL_GRACE = 5.0
+
+
+class Job:
+    """Satu permintaan backend (bisa dipakai bersama oleh beberapa id identik)"""
+
+    def __init__(self, request, seq):
+        self.backend = request.get('backend')
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{self.backend}' (use {', '.join(BACKENDS)})")
+        args = request.get('args')
+        if not isinstance(args, list) or not args:
+            raise ValueError('Field args must be a non-empty list of backend arguments')
+        priority = request.get('priority', 'normal')
+        if priority in PRIORITIES:
+            priority = PRIORITIES[priority]
+        elif not isinstance(priority, int):
+            raise ValueError(f"Unknown priority '{priority}' (use {', '.join(PRIORITIES)} or a number)")
+
+        self.ids = [str(request['id'])]
+        self.args = [str(a) for a in args]
+        self.cwd = os.path.abspath(request.get('cwd') or '.')
+        self.panel = request.get('panel')
+        self.priority = priority
+        self.seq = seq
+        # Identical backend + arguments + working folder = identical output
+        self.key = hashlib.sha1(json.dumps([self.backend, self.args, self.cwd]).encode('utf-8')).hexdigest()
+        self.state = 'queued'
+        self.proc = None
+        self.cancel_reason = None
+        self.submitted = time.perf_counter()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def command(self):
+        script, exe = BACKENDS[self.backend]
+        command = backend_command(script, exe) + self.args
+        if self.backend in PROGRESS_BACKENDS and '--progress' not in self.args:
+            command.append('--progress')
+        if self.backend in MEMORY_BACKENDS and '--memory-mb' not in self.args:
+            command += ['--memory-mb', str(JOB_MEMORY_MB)]
+        return command
+
+    def batch_job(self):
+        """Bentuk job raster_batch (untuk parse_backend_result)"""
+        output = None
+        if '--output' in self.args[:-1]:
+            output = self.args[self.args.index('--output') + 1]
+        return {'kind': 'composite' if self.backend == 'composite' else self.backend, 'output': output}
+
+
+class JobService:
+    def __init__(self, workers):
+        self.lock = threading.Condition()
+        self.out_lock = threading.Lock()
+        self.queue = []      # heap of Job; entries that are no longer queued are skipped
+        self.active = {}     # key -> queued/running Job
+        self.by_id = {}      # request id -> Job
+        self.counter = itertools.count()
+        self.closing = False
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def emit(self, record):
+        with self.out_lock:
+            print(json.dumps(record), flush=True)
+
+    # ---- requests (main thread) ----
+    def submit(self, request):
+        if not request.get('id'):
+            self.emit({'event': 'rejected', 'job': None, 'messages': 'Field id is required'})
+            return
+        try:
+            job = Job(request, next(self.counter))
+        except ValueError as e:
+            self.emit({'event': 'rejected', 'job': str(request['id']), 'messages': str(e)})
+            return
+
+        with self.lock:
+            job_id = job.ids[0]
+            if job_id in self.by_id:
+                self.emit({'event': 'rejected', 'job': job_id, 'messages': f'Job id {job_id} is already in use'})
+                return
+
+            # A newer request from the same panel makes its older work obsolete
+            if job.panel is not None:
+                for other in list(self.active.values()):
+                    if other.panel == job.panel and other.key != job.key:
+                        self._cancel(other, f'Superseded by {job_id}')
+
+            existing = self.active.get(job.key)
+            if existing is not None:
+                existing.ids.append(job_id)
+                self.by_id[job_id] = existing
+                if job.priority < existing.priority and existing.state == 'queued':
+                    existing.priority = job.priority
+                    heapq.heapify(self.queue)
+                self.emit({'event': 'deduplicated', 'job': job_id, 'same_as': existing.ids[0],
+                           'state': existing.state})
+                return
+
+            self.active[job.key] = job
+            self.by_id[job_id] = job
+            heapq.heappush(self.queue, job)
+            self.emit({'event': 'queued', 'job': job_id, 'backend': job.backend,
+                       'priority': job.priority, 'queued': self._queued_count()})
+            self.lock.notify()
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.by_id.get(job_id)
+            if job is None or job.state not in ('queued', 'running'):
+                self.emit({'event': 'rejected', 'job': job_id, 'messages': 'No queued or running job with this id'})
+                return
+            if len(job.ids) > 1:
+                # Other requests still wait for the same output: only detach this one
+                job.ids.remove(job_id)
+                self.by_id.pop(job_id, None)
+                self._emit_result([job_id], job, {'status': 'cancelled', 'messages': 'Cancelled by request'})
+                return
+            self._cancel(job, 'Cancelled by request')
+
+    def status(self):
+        with self.lock:
+            jobs = sorted(self.active.values())
+            self.emit({'event': 'status', 'job': None, 'workers': len(self.threads), 'jobs': [
+                {'job': j.ids[0], 'ids': list(j.ids), 'backend': j.backend, 'panel': j.panel,
+                 'priority': j.priority, 'state': j.state} for j in jobs
+            ]})
+
+    def close(self):
+        """Selesaikan antrean lalu berhenti"""
+        with self.lock:
+            self.closing = True
+            self.lock.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    # ---- internals (caller holds self.lock) ----
+    def _queued_count(self):
+        return sum(1 for j in self.queue if j.state == 'queued')
+
+    def _cancel(self, job, reason):
+        if job.state == 'queued':
+            job.state = 'cancelled'
+            self._forget(job)
+            self._emit_result(job.ids, job, {'status': 'cancelled', 'messages': reason})
+        elif job.state == 'running':
+            job.state = 'cancelling'
+            job.cancel_reason = reason
+            self.emit({'event': 'cancelling', 'job': job.ids[0], 'messages': reason})
+            if job.proc is None:
+                # Picked by a worker but not started yet: _run sees the state and never starts it
+                return
+            try:
+                job.proc.stdin.write('cancel\n')
+                job.proc.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            timer = threading.Timer(CANCEL_GRACE, self._terminate, [job])
+            timer.daemon = True
+            timer.start()
+
+    def _terminate(self, job):
+        if job.proc is not None and job.proc.poll() is None:
+            job.proc.terminate()
+
+    def _forget(self, job):
+        if self.active.get(job.key) is job:
+            del self.active[job.key]
+        for job_id in job.ids:
+            if self.by_id.get(job_id) is job:
+                del self.by_id[job_id]
+
+    def _emit_result(self, ids, job, result):
+        elapsed = round(time.perf_counter() - job.submitted, 2)
+        for job_id in ids:
+            self.emit({'event': 'result', 'job': job_id, 'backend': job.backend, **result, 'elapsed': elapsed})
+
+    def _next_job(self):
+        with self.lock:
+            while True:
+                while self.queue and self.queue[0].state != 'queued':
+                    heapq.heappop(self.queue)
+                if self.queue:
+                    job = heapq.heappop(self.queue)
+                    job.state = 'running'
+                    return job
+                if self.closing:
+                    return None
+                self.lock.wait()
+
+    # ---- workers ----
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            result = self._run(job)
+            with self.lock:
+                if job.state == 'cancelling' and result['status'] != 'success':
+                    result.update(status='cancelled', messages=job.cancel_reason)
+                job.state = 'done'
+                ids = list(job.ids)
+                self._forget(job)
+                self._emit_result(ids, job, result)
+
+    def _run(self, job):
+        info = job.batch_job()
+        try:
+            if info['output']:
+                # Composite backend writes to --output as given and does not create folders
+                os.makedirs(os.path.join(job.cwd, os.path.dirname(info['output'])), exist_ok=True)
+            with self.lock:
+                if job.state != 'running':
+                    return {'status': 'cancelled', 'messages': job.cancel_reason}
+                job.proc = subprocess.Popen(job.command(), cwd=job.cwd, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            text=True, bufsize=1)
+        except Exception as e:
+            return {'status': 'failed', 'messages': str(e), 'path': None, 'preview_png': None, 'bounds': {}}
+        self.emit({'event': 'started', 'job': job.ids[0], 'backend': job.backend, 'pid': job.proc.pid})
+
+        # stderr is drained on its own thread so a chatty backend cannot block on a full pipe
+        errors = []
+        drain = threading.Thread(target=lambda: errors.append(job.proc.stderr.read()), daemon=True)
+        drain.start()
+
+        lines = []
+        for line in job.proc.stdout:
+            line = line.rstrip('\r\n')
+            lines.append(line)
+            if line.startswith('{') and '"progress"' in line:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get('status') == 'progress':
+                    record.pop('status')
+                    self.emit(dict(record, event=f"progress.{record.get('event')}", job=job.ids[0]))
+        job.proc.wait()
+        drain.join()
+        if job.backend in DATA_BACKENDS:
+            return parse_data_result(job.proc.returncode, lines, ''.join(errors), job.cwd)
+        return parse_backend_result(info, job.proc.returncode, lines, ''.join(errors), job.cwd)
+
+
+def serve(workers):
+    service = JobService(workers)
+    service.emit({'event': 'ready', 'job': None, 'workers': len(service.threads),
+                  'backends': list(BACKENDS)})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            service.emit({'event': 'rejected', 'job': None, 'messages': f'Invalid JSON: {e}'})
+            continue
+
+        cmd = request.get('cmd', 'submit')
+        if cmd == 'exit':
+            break
+        if cmd == 'submit':
+            service.submit(request)
+        elif cmd == 'cancel':
+            service.cancel(str(request.get('id')))
+        elif cmd == 'status':
+            service.status()
+        else:
+            service.emit({'event': 'rejected', 'job': request.get('id'), 'messages': f"Unknown cmd '{cmd}'"})
+    # stdin closed or exit: finish what is queued, then stop
+    service.close()
+    service.emit({'event': 'closed', 'job': None})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local job service for the raster backends (JSON lines on stdin)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Backend processes running at once (default: from CPU cores and free memory, max 2)')
+    args = parser.parse_args()
+    # Interactive work wants a fast answer for the newest request, not wide parallelism
+    serve(args.workers or min(2, default_workers()))
+
+
+if __name__ == '__main__':
+    main()
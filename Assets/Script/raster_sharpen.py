@@ -0,0 +1,376 @@
+import argparse
+import json
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+import rasterio
+from rasterio.warp import transform_bounds
+
+from raster_common import (
+    open_band_set, resolve_region, add_aoi_arguments, aoi_options_from_args, expand_window,
+    TILED_PROFILE, RESAMPLING_CHOICES, BandStatistics, write_statistics, geotiff_profile,
+    Progress, Cancelled, PreviewCanvas, remove_outputs, add_progress_arguments,
+    plan_memory, source_layout, add_memory_arguments,
+    cv2,  # lazy: only imported by the wavelet method
+)
+from rasterTransform import render_preview_png, get_bounds
+
+# --------------------------------------------------
+# Pansharpening
+# --------------------------------------------------
+# Multispectral (MS) bands are fused with a panchromatic (PAN) band on the
+# PAN grid. MS bands are upsampled window by window through the band set's
+# WarpedVRT, so no upsampled copy is ever written. A first streaming pass
+# accumulates the Gram matrix of [1, MS..., PAN] over valid pixels; every
+# statistic the methods need (means, covariances, regression weights,
+# principal component) comes from that small matrix. The second pass fuses
+# and writes one window at a time:
+#   gramschmidt  adaptive Gram-Schmidt: synthetic PAN S = regression of PAN
+#                on MS, MS_k += cov(MS_k, S) / var(S) * (PAN' - S)
+#   pca          first principal component of MS replaced by the PAN
+#                matched to its variance
+#   wavelet      additive a trous (B3 spline) details of the PAN, scaled to
+#                each band; windows carry a halo for the kernel
+# PAN' is the PAN matched to the mean/variance of the component it replaces.
+
+SHARPEN_METHODS = ('gramschmidt', 'pca', 'wavelet')
+B3_SPLINE = np.array([1, 4, 6, 4, 1], dtype=np.float32) / 16
+
+
+class GramStatistics:
+    """Matriks Gram [1, MS..., PAN] yang diakumulasi per window -> mean dan kovarians"""
+
+    def __init__(self, n_bands):
+        self.gram = np.zeros((n_bands + 2, n_bands + 2))
+        self.shift = None  # first window means, keeps the float64 sums well conditioned
+
+    def update(self, ms, pan, valid):
+        if not valid.any():
+            return
+        values = np.vstack([ms[:, valid], pan[valid][np.newaxis]]).astype(np.float64)
+        if self.shift is None:
+            self.shift = values.mean(axis=1)
+        x = np.vstack([np.ones((1, values.shape[1])), values - self.shift[:, np.newaxis]])
+        self.gram += x @ x.T
+
+    @property
+    def count(self):
+        return int(self.gram[0, 0])
+
+    def moments(self):
+        n = self.gram[0, 0]
+        if n < 2:
+            raise ValueError('MS and PAN inputs share no valid pixels')
+        mean = self.gram[0, 1:] / n
+        cov = self.gram[1:, 1:] / n - np.outer(mean, mean)
+        return mean + self.shift, cov
+
+
+def atrous_approximation(data, levels):
+    """Aproksimasi a trous (B3 spline, kernel dilatasi 2^j) setelah `levels` level"""
+    approx = data
+    for level in range(levels):
+        step = 2 ** level
+        kernel = np.zeros(4 * step + 1, dtype=np.float32)
+        kernel[::step] = B3_SPLINE
+        approx = cv2.sepFilter2D(approx, -1, kernel, kernel, borderType=cv2.BORDER_REFLECT)
+    return approx
+
+
+def atrous_halo(levels):
+    return 2 * (2 ** levels - 1)
+
+
+class Fusion:
+    """Parameter fusi satu metode dari mean/kovarians [MS..., PAN]"""
+
+    def __init__(self, method, mean, cov, levels=1):
+        n = len(mean) - 1
+        ms_cov, ms_pan, pan_var = cov[:n, :n], cov[:n, n], cov[n, n]
+        if pan_var <= 0:
+            raise ValueError('PAN band has no variance over the valid pixels')
+        self.method = method
+        self.levels = levels
+        self.ms_mean = mean[:n].astype(np.float32)[:, np.newaxis, np.newaxis]
+        self.pan_mean = np.float32(mean[n])
+
+        if method == 'gramschmidt':
+            weights = np.linalg.lstsq(ms_cov, ms_pan, rcond=None)[0]
+            synth_var = float(weights @ ms_cov @ weights)
+            if synth_var <= 0:
+                raise ValueError('MS bands do not explain the PAN band (synthetic PAN is constant)')
+            gains = ms_cov @ weights / synth_var
+            pan_scale = math.sqrt(synth_var / pan_var)
+        elif method == 'pca':
+            values, vectors = np.linalg.eigh(ms_cov)
+            weights = vectors[:, -1]
+            if weights @ ms_pan < 0:
+                weights = -weights  # PC1 follows the PAN, not its negative
+            gains = weights
+            pan_scale = math.sqrt(max(values[-1], 0.0) / pan_var)
+        else:
+            weights = None
+            gains = np.sqrt(np.diag(ms_cov) / pan_var)
+            pan_scale = 1.0
+
+        self.weights = None if weights is None else weights.astype(np.float32)
+        self.gains = gains.astype(np.float32)
+        self.pan_scale = np.float32(pan_scale)
+
+    @property
+    def halo(self):
+        return atrous_halo(self.levels) if self.method == 'wavelet' else 0
+
+    def apply(self, ms, pan, valid):
+        """Fusi satu window: ms (bands, h, w), pan (h, w) -> (bands, h, w) float32"""
+        if self.method == 'wavelet':
+            # Invalid PAN pixels are filled with the mean so they do not ring into neighbours
+            filled = np.where(valid, pan, self.pan_mean).astype(np.float32)
+            detail = filled - atrous_approximation(filled, self.levels)
+        else:
+            # Centred component the PAN replaces: synthetic PAN (GS) or PC1 (PCA)
+            component = np.tensordot(self.weights, ms - self.ms_mean, axes=1)
+            detail = (pan - self.pan_mean) * self.pan_scale - component
+        return ms + self.gains[:, np.newaxis, np.newaxis] * detail
+
+    def to_dict(self):
+        result = {'gains': [round(float(g), 6) for g in self.gains]}
+        if self.weights is not None:
+            result['weights'] = [round(float(w), 6) for w in self.weights]
+        if self.method == 'wavelet':
+            result['levels'] = self.levels
+        return result
+
+
+def _ordered_keys(band_set, inputs):
+    """Band MS dalam urutan input (--rgb B4 B3 B2 tetap R, G, B), bukan urutan nomor band"""
+    def position(key):
+        path, bidx = band_set.sources[key]
+        return (inputs.index(path) if path in inputs else len(inputs), bidx)
+    return sorted(band_set.keys, key=position)
+
+
+def _resolution_ratio(ms, key, pan):
+    """Perbandingan ukuran piksel MS asli terhadap PAN (misal 30 m / 15 m = 2)"""
+    ds, _ = ms.dataset(key)
+    bounds = ds.bounds
+    if ds.crs and pan.crs and ds.crs != pan.crs:
+        bounds = transform_bounds(ds.crs, pan.crs, *bounds, densify_pts=21)
+    return ((bounds[2] - bounds[0]) / ds.width) / abs(pan.transform.a)
+
+
+class Data:
+    def __init__(self, name, method='gramschmidt', output_dir=None, resampling='bilinear', levels=None,
+                 aoi_options=None, progress=None, memory_mb=None):
+        self.prefix_name = name
+        self.method = method            # gramschmidt / pca / wavelet
+        self.resampling = resampling    # Kernel used to upsample MS to the PAN grid (per window)
+        self.levels = levels            # Wavelet levels (None = from the MS/PAN resolution ratio)
+        self.aoi_options = aoi_options or {}
+        self.progress = progress or Progress()  # JSON-lines events + cancel checks (--progress)
+        self.memory_mb = memory_mb      # Memory budget for the window/thread plan (None = from free RAM)
+        self.base_folder = 'SHARPEN'
+
+        # -o from the sharpening panel, otherwise SHARPEN/<name>
+        self.folder_output = output_dir or os.path.join(self.base_folder, self.prefix_name)
+        self.set_ymdhms()
+        if not os.path.exists(self.folder_output):
+            os.makedirs(self.folder_output, exist_ok=True)
+
+        # {name}_{method}_direct_{ymdhms}.tif is the name the sharpening panel looks for
+        self.filename = f'{self.prefix_name}_{self.method}_direct_{self.ymdhms}.tif'
+        self.output_final_path = os.path.join(self.folder_output, self.filename)
+
+        self.png_filename = f'{self.prefix_name}_{self.method}_direct_{self.ymdhms}_preview.png'
+        self.png_path = os.path.join(self.folder_output, self.png_filename)
+
+        self.status = 'running'
+        self.messages = 'Initializing...'
+
+    def set_ymdhms(self):
+        self.now = datetime.now()
+        self.ymdhms = datetime.now().strftime('%y%m%d%H%M%S')
+
+    def _read(self, ms, pan, keys, window):
+        """Band MS (di-upsample ke grid PAN) dan PAN untuk satu window, nodata -> NaN"""
+        pan_data = pan.read(pan.keys[0], window=window)
+        if pan.nodata is not None and not np.isnan(pan.nodata):
+            pan_data[pan_data == pan.nodata] = np.nan
+        ms_data = np.empty((len(keys),) + pan_data.shape, dtype=np.float32)
+        for index, key in enumerate(keys):
+            ms_data[index] = ms.read(key, window=window)
+            nodata = ms.dataset(key)[0].nodata
+            if nodata is not None and not np.isnan(nodata):
+                ms_data[index][ms_data[index] == nodata] = np.nan
+        valid = np.isfinite(pan_data) & np.isfinite(ms_data).all(axis=0)
+        return ms_data, pan_data, valid
+
+    def _levels(self, ms, keys, pan):
+        if self.levels:
+            return int(self.levels)
+        # One level per halving of the pixel size (15 m PAN / 30 m MS -> 1)
+        return max(1, round(math.log2(max(_resolution_ratio(ms, keys[0], pan), 1.0))))
+
+    def memory_plan(self, ms, pan, keys, region, levels):
+        source_bytes, blocks = source_layout(ms, keys)
+        pan_bytes, pan_blocks = source_layout(pan, pan.keys[:1])
+        return plan_memory(
+            region.width, region.height, bands_in=len(keys) + 1, bands_out=len(keys),
+            source_bytes=source_bytes + pan_bytes, source_blocks=list(blocks) + list(pan_blocks),
+            # stacked MS, fused result and a few window-sized PAN/detail arrays
+            temporaries=2 * len(keys) + 4,
+            halo=atrous_halo(levels) if self.method == 'wavelet' else 0,
+            passes=1, budget_mb=self.memory_mb,
+        )
+
+    def run(self, rgb_paths, pan_path, explain=False):
+        try:
+            missing = [p for p in list(rgb_paths) + [pan_path] if not os.path.exists(p)]
+            if missing:
+                raise FileNotFoundError(f'Input file not found: {missing[0]}')
+
+            # MS bands are read on the PAN grid: the WarpedVRT upsamples each window on the fly
+            with open_band_set(pan_path) as pan, \
+                    open_band_set(rgb_paths, resampling=self.resampling, grid=pan.grid) as ms:
+                keys = _ordered_keys(ms, list(rgb_paths))
+                descriptions = [ms.description(key) for key in keys]
+                region = resolve_region(pan, **self.aoi_options)
+                levels = self._levels(ms, keys, pan)
+                plan = self.memory_plan(ms, pan, keys, region, levels)
+                if explain:
+                    print(json.dumps({'status': 'success', 'mode': 'explain', 'algo': self.method,
+                                      'plan': plan.to_dict()}))
+                    return
+                windows = list(region.windows(plan.window))
+
+                # Pass 1: Gram matrix of [1, MS..., PAN] over valid pixels inside the AOI
+                self.progress.stage('statistics', total=len(windows))
+                gram = GramStatistics(len(keys))
+                for window, dst_window in windows:
+                    ms_data, pan_data, valid = self._read(ms, pan, keys, window)
+                    outside = region.outside_mask(dst_window)
+                    if outside is not None:
+                        valid &= ~outside
+                    gram.update(ms_data, pan_data, valid)
+                    self.progress.advance()
+                fusion = Fusion(self.method, *gram.moments(), levels=levels)
+
+                profile = region.update_profile(pan.profile.copy())
+                profile.update(
+                    dtype=rasterio.float32,
+                    count=len(keys),
+                    compress='lzw',
+                    nodata=np.nan,
+                    num_threads=plan.threads,
+                    **TILED_PROFILE
+                )
+
+                # Pass 2: fuse and write window by window (halo for the wavelet kernel)
+                self.progress.stage('write', total=len(windows))
+                canvas = PreviewCanvas(region.width, region.height, len(keys))
+                stats = [BandStatistics() for _ in keys]
+                with rasterio.Env(**plan.env()), \
+                        rasterio.open(self.output_final_path, 'w', **geotiff_profile(profile)) as dst:
+                    for index, key in enumerate(keys, start=1):
+                        dst.set_band_description(index, ms.description(key))
+                    dst.update_tags(method=self.method, pan=os.path.basename(pan_path))
+                    for window, dst_window in windows:
+                        read_window, crop = expand_window(window, fusion.halo, pan.width, pan.height)
+                        ms_data, pan_data, valid = self._read(ms, pan, keys, read_window)
+                        fused = fusion.apply(ms_data, pan_data, valid)[(slice(None),) + crop]
+                        invalid = ~valid[crop]
+                        outside = region.outside_mask(dst_window)
+                        if outside is not None:
+                            invalid |= outside
+                        fused[:, invalid] = np.nan
+                        fused = fused.astype(np.float32, copy=False)
+
+                        dst.write(fused, window=dst_window)
+                        for band_stats, band in zip(stats, fused):
+                            band_stats.update(band)
+                        canvas.paste(dst_window, fused)
+
+                        # Cancel check at the window boundary; refined previews at 25/50/75%
+                        self.progress.advance()
+                        if self.progress.preview_due():
+                            partial = [band_stats.to_dict(histogram=False) for band_stats in stats]
+                            if self._render_preview(canvas, partial):
+                                self.progress.preview(self.png_path, 'refined')
+
+            statistics = write_statistics(self.output_final_path, stats)
+
+            # Preview from the decimated canvas filled while writing (no re-read of the output)
+            self._render_preview(canvas, statistics)
+
+            self.status = 'success'
+            self.messages = f'Pansharpening ({self.method}) successful'
+            self.progress.preview(self.png_path, 'final')
+            self._print_result(get_bounds(self.output_final_path), extra={
+                'bands': descriptions,
+                'valid_pixels': gram.count,
+                'fusion': fusion.to_dict(),
+                'statistics': statistics,
+                'plan': {'window': plan.window, 'threads': plan.threads, 'peak_mb': plan.peak_mb},
+            })
+
+        except Cancelled as e:
+            # Stopped at a window boundary: nothing half-written is left behind
+            remove_outputs(self.output_final_path, self.png_path)
+            self.status = 'cancelled'
+            self.messages = str(e)
+            self._print_result()
+
+        except Exception as e:
+            self.status = 'failed'
+            self.messages = str(e)
+            self._print_result()
+
+    def _render_preview(self, canvas, statistics):
+        # Three or more bands render as RGB (first three, in --rgb order), fewer as a single band
+        return render_preview_png(canvas.data, self.png_path, 'TCI' if len(canvas.data) >= 3 else self.method,
+                                  statistics=statistics)
+
+    def _print_result(self, bounds=None, extra=None):
+        result = {
+            'status': self.status,
+            'messages': self.messages,
+            'filename': self.filename if self.status == 'success' else None,
+            'path': self.output_final_path if self.status == 'success' else None,
+            'preview_png': self.png_filename if self.status == 'success' else None,
+            'bounds': bounds if bounds else {},
+            'algo': self.method,
+        }
+        if self.status == 'success' and extra:
+            result.update(extra)
+        print(json.dumps(result), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pansharpening (Gram-Schmidt, PCA, wavelet) of MS bands with a PAN band')
+    parser.add_argument('-n', required=True, help='Output Prefix Name')
+    parser.add_argument('--rgb', required=True, nargs='+',
+                        help='Multispectral input: one multiband file or per-band files (output keeps this order)')
+    parser.add_argument('--pan', required=True, help='Panchromatic band (defines the output grid)')
+    parser.add_argument('--algo', default='gramschmidt', type=str.lower, choices=SHARPEN_METHODS,
+                        help='Fusion method')
+    parser.add_argument('-o', '--output', help='Output folder (default SHARPEN/<name>)')
+    parser.add_argument('-v', help='Unused; accepted for compatibility with the old sharpening executables')
+    parser.add_argument('--resampling', default='bilinear', choices=RESAMPLING_CHOICES,
+                        help='Kernel used to upsample the MS bands to the PAN grid')
+    parser.add_argument('--levels', type=int,
+                        help='Wavelet decomposition levels (default: from the MS/PAN resolution ratio)')
+    add_aoi_arguments(parser)
+    add_progress_arguments(parser)
+    add_memory_arguments(parser)
+    args = parser.parse_args()
+
+    data = Data(args.n, method=args.algo, output_dir=args.output, resampling=args.resampling, levels=args.levels,
+                aoi_options=aoi_options_from_args(args), progress=Progress(enabled=args.progress).listen(),
+                memory_mb=args.memory_mb)
+    data.run(args.rgb, args.pan, explain=args.explain)
+
+
+if __name__ == '__main__':
+    main()
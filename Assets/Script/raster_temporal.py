@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import re
+import warnings
+from datetime import datetime
+
+import numpy as np
+import rasterio
+
+from raster_common import (
+    open_band_set, resolve_region, add_aoi_arguments, aoi_options_from_args, expand_window,
+    TILED_PROFILE, RESAMPLING_CHOICES, geotiff_profile, scratch_profile, add_scratch_arguments,
+    Progress, Cancelled, remove_outputs, add_progress_arguments,
+    QualityMask, add_quality_arguments, qa_flags_from_args,
+)
+from raster_expression import FormulaEvaluator, resolve_reductions
+from raster_batch import collect_scenes
+from rasterTransform import create_preview_png, get_bounds
+
+# --------------------------------------------------
+# Temporal stack
+# --------------------------------------------------
+# An ordered list of dated scenes is reduced per pixel (mean, max, trend, ...).
+# Every scene is aligned on the fly to the grid of the first one, and the
+# stack is streamed window by window, so memory is window x number of dates
+# no matter how long the season is. Each statistic becomes one output band.
+
+TEMPORAL_STATS = ('mean', 'median', 'min', 'max', 'std', 'count', 'slope', 'date_of_max', 'date_of_min')
+DATE_PATTERN = re.compile(r'(?<!\d)((?:19|20)\d{2})-?(\d{2})-?(\d{2})(?!\d)')
+
+
+def parse_date(text):
+    """Tanggal akuisisi dari nama file, misal 'LC08_..._20231115_...' -> datetime(2023, 11, 15)"""
+    for match in DATE_PATTERN.finditer(os.path.basename(text.rstrip('/\\'))):
+        try:
+            return datetime(*(int(g) for g in match.groups()))
+        except ValueError:
+            continue
+    return None
+
+
+def _scene_date(scene):
+    if scene.get('date'):
+        return scene['date']
+    for text in [scene['name']] + list(scene['input']):
+        date = parse_date(text)
+        if date:
+            return date
+    return None
+
+
+def temporal_statistics(stack, stats, days):
+    """Reduksi per piksel dari stack (dates, h, w); NaN = tidak valid"""
+    valid = np.isfinite(stack)
+    count = valid.sum(axis=0)
+    empty = count == 0
+    filled = np.where(valid, stack, 0.0)
+    mean = filled.sum(axis=0) / np.maximum(count, 1)
+
+    out = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for stat in stats:
+            if stat == 'mean':
+                value = mean
+            elif stat == 'median':
+                value = np.nanmedian(stack, axis=0)
+            elif stat == 'min':
+                value = np.fmin.reduce(stack, axis=0)
+            elif stat == 'max':
+                value = np.fmax.reduce(stack, axis=0)
+            elif stat == 'std':
+                value = np.sqrt(np.where(valid, (stack - mean) ** 2, 0.0).sum(axis=0) / np.maximum(count, 1))
+            elif stat == 'count':
+                out[stat] = count.astype(np.float32)
+                continue
+            elif stat == 'slope':
+                # Least squares over the valid dates only, in value per year
+                x = (days / 365.25)[:, None, None]
+                sx = np.where(valid, x, 0.0).sum(axis=0)
+                sxx = np.where(valid, x * x, 0.0).sum(axis=0)
+                sxy = (filled * x).sum(axis=0)
+                denom = count * sxx - sx * sx
+                slope = (count * sxy - sx * filled.sum(axis=0)) / np.where(denom > 0, denom, 1)
+                value = np.where(denom > 0, slope, np.nan)
+            else:
+                # date_of_max / date_of_min: days since the first date
+                pick = np.where(valid, stack, -np.inf if stat == 'date_of_max' else np.inf)
+                index = pick.argmax(axis=0) if stat == 'date_of_max' else pick.argmin(axis=0)
+                value = days[index]
+            out[stat] = np.where(empty, np.nan, value).astype(np.float32)
+    return out
+
+
+class Data:
+    def __init__(self, name, stats, formula=None, resampling='nearest', nodata=None, aoi_options=None,
+                 progress=None, scratch=False, qa_flags=None):
+        self.prefix_name = name
+        self.stats = stats
+        self.formula = formula          # Nilai per scene, misal NDVI; None = band 1
+        self.resampling = resampling    # Kernel for scenes on another grid than the first date
+        self.nodata = nodata            # Extra input value treated as missing (e.g. 0)
+        self.aoi_options = aoi_options or {}
+        self.progress = progress or Progress()  # JSON-lines events + cancel checks (--progress)
+        self.scratch = scratch          # Uncompressed output (re-read through memory mapping)
+        self.qa_flags = qa_flags        # QA flags read as missing in every scene (None = no QA masking)
+        self.quality = {}               # band set -> QualityMask of that scene
+        self.base_folder = 'TEMPORAL'
+
+        self.output_folder_name = os.path.join(self.base_folder, self.prefix_name)
+        self.set_ymdhms()
+
+        self.folder_output = f'{self.output_folder_name}'
+        if not os.path.exists(self.folder_output):
+            os.makedirs(self.folder_output, exist_ok=True)
+
+        self.filename = f'{self.prefix_name}_temporal_{self.ymdhms}.tif'
+        self.output_final_path = os.path.join(self.folder_output, self.filename)
+
+        self.png_filename = f'{self.prefix_name}_temporal_{self.ymdhms}_preview.png'
+        self.png_path = os.path.join(self.folder_output, self.png_filename)
+
+        self.dates = []
+        self.status = 'running'
+        self.messages = 'Initializing...'
+
+    def set_ymdhms(self):
+        self.now = datetime.now()
+        self.ymdhms = datetime.now().strftime('%y%m%d%H%M%S')
+
+    def _band_reader(self, src, window):
+        def read_band(name):
+            key = name[1:]
+            data = src.read(key, window=window)
+            nodata = src.dataset(key)[0].nodata
+            if nodata is not None and not np.isnan(nodata):
+                data[data == nodata] = np.nan
+            if self.nodata is not None:
+                data[data == self.nodata] = np.nan
+            quality = self.quality.get(src)
+            if quality is not None:
+                data[quality.read(window)] = np.nan
+            return data
+        return read_band
+
+    def _evaluate(self, evaluator, src, window, node=None):
+        """Nilai satu scene untuk satu window (dengan halo untuk fungsi focal)"""
+        node = evaluator.tree.body if node is None else node
+        read_window, crop = expand_window(window, evaluator.halo(node), src.width, src.height)
+        shape = (int(read_window.height), int(read_window.width))
+        values = evaluator.evaluate_node(node, self._band_reader(src, read_window), scope=None)
+        return np.broadcast_to(np.asarray(values, dtype=np.float32), shape)[crop]
+
+    def _open_scenes(self, scenes, reference):
+        """Buka semua scene pada grid scene pertama, dengan evaluator formula masing-masing"""
+        opened = []
+        for scene in scenes:
+            src = open_band_set(scene['input'], resampling=self.resampling, grid=reference)
+            evaluator = FormulaEvaluator(self.formula or 'b1')
+            missing = [n for n in evaluator.band_names() if not (n.startswith('b') and src.has(n[1:]))]
+            if missing:
+                src.close()
+                raise ValueError(f"Scene {scene['name']}: name '{missing[0]}' is not defined")
+            if self.qa_flags:
+                # Clouds of each date are dropped before the per-pixel statistics
+                try:
+                    self.quality[src] = QualityMask(src, self.qa_flags)
+                except ValueError as e:
+                    src.close()
+                    raise ValueError(f"Scene {scene['name']}: {e}")
+            opened.append((src, evaluator))
+        return opened
+
+    def run(self, scenes):
+        opened = []
+        try:
+            if len(scenes) < 2:
+                raise ValueError('Temporal mode needs at least two scenes')
+
+            # Order by acquisition date when every scene has one
+            self.dates = [_scene_date(s) for s in scenes]
+            if all(self.dates):
+                order = sorted(range(len(scenes)), key=lambda i: self.dates[i])
+                scenes = [scenes[i] for i in order]
+                self.dates = [self.dates[i] for i in order]
+                days = np.array([(d - self.dates[0]).days for d in self.dates], dtype=np.float64)
+            else:
+                # No dates: scenes are evenly spaced in the given order
+                days = np.arange(len(scenes), dtype=np.float64)
+
+            with open_band_set(scenes[0]['input'], resampling=self.resampling) as first:
+                reference = first.grid
+            opened = self._open_scenes(scenes, reference)
+            src0 = opened[0][0]
+
+            region = resolve_region(src0, **self.aoi_options)
+            windows = list(region.windows())
+
+            # Scene-wide reductions in the formula (np.max(b5), ...) are resolved per scene
+            self.progress.stage('statistics', total=len(scenes))
+            for (src, evaluator), scene in zip(opened, scenes):
+                resolve_reductions(
+                    evaluator, [w for w, _ in windows],
+                    lambda node, w, src=src, evaluator=evaluator: self._evaluate(evaluator, src, w, node=node),
+                    tag=scene['name'],
+                )
+                self.progress.advance()
+
+            profile = region.update_profile(src0.profile.copy())
+            profile.update(
+                dtype=rasterio.float32,
+                count=len(self.stats),
+                compress='lzw',
+                nodata=np.nan,
+                **TILED_PROFILE
+            )
+            if self.scratch:
+                profile = scratch_profile(profile)
+
+            with rasterio.open(self.output_final_path, 'w', **geotiff_profile(profile)) as dst:
+                for index, stat in enumerate(self.stats, start=1):
+                    dst.set_band_description(index, stat)
+                dst.update_tags(
+                    dates=','.join(d.strftime('%Y-%m-%d') for d in self.dates) if all(self.dates) else '',
+                    scenes=','.join(s['name'] for s in scenes),
+                    formula=self.formula or 'b1',
+                    date_units='days since first date' if all(self.dates) else 'scene index',
+                    slope_units='per year' if all(self.dates) else 'per scene',
+                )
+
+                # Stack window x dates, reduce, write; one window in memory at a time
+                self.progress.stage('stack', total=len(windows))
+                for window, dst_window in windows:
+                    stack = np.stack([self._evaluate(ev, src, window) for src, ev in opened])
+                    stack[~np.isfinite(stack)] = np.nan
+                    outside = region.outside_mask(dst_window)
+                    if outside is not None:
+                        stack[:, outside] = np.nan
+
+                    results = temporal_statistics(stack, self.stats, days)
+                    dst.write(np.stack([results[s] for s in self.stats]), window=dst_window)
+                    self.progress.advance()
+
+            self.status = 'success'
+            self.messages = f"Temporal statistics over {len(scenes)} scenes: {', '.join(self.stats)}"
+
+            create_preview_png(self.output_final_path, self.png_path, 'TEMPORAL')
+            self._print_result(get_bounds(self.output_final_path), scenes)
+
+        except Cancelled as e:
+            # Stopped at a window boundary: nothing half-written is left behind
+            remove_outputs(self.output_final_path, self.png_path)
+            self.status = 'cancelled'
+            self.messages = str(e)
+            self._print_result()
+
+        except Exception as e:
+            self.status = 'failed'
+            self.messages = str(e)
+            self._print_result()
+        finally:
+            for src, _ in opened:
+                src.close()
+
+    def _print_result(self, bounds=None, scenes=None):
+        result = {
+            'status': self.status,
+            'messages': self.messages,
+            'filename': self.filename if self.status == 'success' else None,
+            'path': self.output_final_path if self.status == 'success' else None,
+            'preview_png': self.png_filename if self.status == 'success' else None,
+            'bounds': bounds if bounds else {},
+            'stats': self.stats,
+        }
+        if scenes:
+            result['scenes'] = [s['name'] for s in scenes]
+            result['dates'] = [d.strftime('%Y-%m-%d') if d else None for d in self.dates]
+        print(json.dumps(result), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-pixel statistics over a time series of scenes')
+    parser.add_argument('-i', '--input', nargs='*', default=[],
+                        help='Scenes (files or per-band folders), or a folder containing the scenes')
+    parser.add_argument('--manifest', help='JSON list of scenes ({"name", "input"}) or text file, one input per line')
+    parser.add_argument('-n', required=True, help='Output Prefix Name')
+    parser.add_argument('-f', '--formula', help='Value per scene, e.g. "(b5-b4)/(b5+b4)" (default: band 1)')
+    parser.add_argument('--stats', nargs='+', default=['mean', 'max', 'count'], choices=TEMPORAL_STATS,
+                        help='Per-pixel statistics, one output band each')
+    parser.add_argument('--dates', nargs='+',
+                        help='Acquisition dates (YYYY-MM-DD) in scene order, when not in the filenames')
+    parser.add_argument('--resampling', default='nearest', choices=RESAMPLING_CHOICES,
+                        help='Kernel used to align scenes to the grid of the first date')
+    parser.add_argument('--nodata', type=float, help='Input value treated as missing (e.g. 0)')
+    add_aoi_arguments(parser)
+    add_progress_arguments(parser)
+    add_scratch_arguments(parser)
+    add_quality_arguments(parser)
+    args = parser.parse_args()
+
+    data = Data(name=args.n, stats=args.stats, formula=args.formula, resampling=args.resampling,
+                nodata=args.nodata, aoi_options=aoi_options_from_args(args),
+                progress=Progress(enabled=args.progress).listen(), scratch=args.scratch,
+                qa_flags=qa_flags_from_args(args))
+    try:
+        scenes = collect_scenes(args.input, args.manifest)
+        if args.dates:
+            if len(args.dates) != len(scenes):
+                raise ValueError(f'{len(args.dates)} dates given for {len(scenes)} scenes')
+            for scene, text in zip(scenes, args.dates):
+                date = parse_date(text)
+                if date is None:
+                    raise ValueError(f"Invalid date '{text}' (use YYYY-MM-DD)")
+                scene['date'] = date
+    except Exception as e:
+        data.status = 'failed'
+        data.messages = str(e)
+        data._print_result()
+        return
+    data.run(scenes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import json
+import math
+import os
+import time
+
+import numpy as np
+import rasterio
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rasterio.windows import Window, from_bounds
+from rasterio.windows import transform as window_transform
+
+from raster_common import load_features, resolve_crs, geometry_bounds, iter_windows
+
+# --------------------------------------------------
+# Zonal statistics
+# --------------------------------------------------
+# Polygons are burned into a label grid (1..N) once per window, then every
+# statistic of every zone is accumulated in one vectorised pass: bincount for
+# count/sum/sum of squares and a sort + reduceat for min/max. Only windows
+# touched by a zone are read, and only the zones overlapping a window are
+# rasterized into it, so thousands of small fields cost about one read of
+# the covered area. Overlapping polygons: the later feature wins the pixel.
+
+ZONAL_STATS = ('count', 'mean', 'min', 'max', 'std', 'sum')
+
+
+def _zone_id(feature, index):
+    props = feature.get('properties') or {}
+    for key in ('id', 'name', 'Name', 'NAME'):
+        if props.get(key) not in (None, ''):
+            return props[key]
+    return feature.get('id', index)
+
+
+class ZoneAccumulator:
+    """Statistik berjalan per zona (label 1..N) untuk satu band"""
+
+    def __init__(self, n_zones):
+        size = n_zones + 1  # label 0 = outside every zone
+        self.count = np.zeros(size, dtype=np.int64)
+        self.sum = np.zeros(size, dtype=np.float64)
+        self.sumsq = np.zeros(size, dtype=np.float64)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+
+    def update(self, labels, values):
+        size = len(self.count)
+        self.count += np.bincount(labels, minlength=size)
+        self.sum += np.bincount(labels, weights=values, minlength=size)
+        self.sumsq += np.bincount(labels, weights=values * values, minlength=size)
+
+        # Min/max per label: sort by label and reduce each run
+        order = np.argsort(labels, kind='stable')
+        sorted_labels = labels[order]
+        sorted_values = values[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_labels)) + 1))
+        present = sorted_labels[starts]
+        self.min[present] = np.minimum(self.min[present], np.minimum.reduceat(sorted_values, starts))
+        self.max[present] = np.maximum(self.max[present], np.maximum.reduceat(sorted_values, starts))
+
+    def result(self, label, stats):
+        n = int(self.count[label])
+        if n == 0:
+            return {'count': 0}
+        mean = self.sum[label] / n
+        values = {
+            'count': n,
+            'mean': mean,
+            'min': self.min[label],
+            'max': self.max[label],
+            'std': math.sqrt(max(self.sumsq[label] / n - mean * mean, 0.0)),
+            'sum': self.sum[label],
+        }
+        return {k: (values[k] if k == 'count' else float(values[k])) for k in stats}
+
+
+def zonal_statistics(raster_path, features, zones_crs='lonlat', bands=None, stats=ZONAL_STATS,
+                     all_touched=False):
+    """Statistik semua zona untuk satu raster -> {band_label: ZoneAccumulator}, jumlah window dibaca"""
+    with rasterio.open(raster_path) as src:
+        bands = bands or list(range(1, src.count + 1))
+        for b in bands:
+            if not 1 <= b <= src.count:
+                raise ValueError(f'Band {b} is invalid for {os.path.basename(raster_path)} ({src.count} bands)')
+
+        # Zones in raster CRS and their pixel extent (for the per-window filter)
+        src_crs = resolve_crs(zones_crs, src.crs)
+        geoms, boxes = [], []
+        for feature in features:
+            geom = feature['geometry']
+            if src.crs and src_crs != src.crs:
+                geom = transform_geom(src_crs, src.crs, geom)
+            win = from_bounds(*geometry_bounds([geom]), transform=src.transform)
+            geoms.append(geom)
+            boxes.append((win.col_off, win.row_off, win.col_off + win.width, win.row_off + win.height))
+        boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        # Negative heights (south-up grids) are normalised so x0 < x1 and y0 < y1
+        boxes = np.column_stack([np.minimum(boxes[:, 0], boxes[:, 2]), np.minimum(boxes[:, 1], boxes[:, 3]),
+                                 np.maximum(boxes[:, 0], boxes[:, 2]), np.maximum(boxes[:, 1], boxes[:, 3])])
+
+        accumulators = {b: ZoneAccumulator(len(geoms)) for b in bands}
+        nodata = src.nodata
+        windows_read = 0
+
+        if len(geoms):
+            # Only the part of the raster covered by zones is visited
+            col0 = max(0, int(math.floor(boxes[:, 0].min())))
+            row0 = max(0, int(math.floor(boxes[:, 1].min())))
+            col1 = min(src.width, int(math.ceil(boxes[:, 2].max())))
+            row1 = min(src.height, int(math.ceil(boxes[:, 3].max())))
+
+            for tile in iter_windows(max(0, col1 - col0), max(0, row1 - row0)):
+                window = Window(tile.col_off + col0, tile.row_off + row0, tile.width, tile.height)
+                x0, y0 = window.col_off, window.row_off
+                x1, y1 = x0 + window.width, y0 + window.height
+                hits = np.flatnonzero((boxes[:, 0] <= x1) & (boxes[:, 2] >= x0) &
+                                      (boxes[:, 1] <= y1) & (boxes[:, 3] >= y0))
+                if hits.size == 0:
+                    continue
+
+                labels = rasterize(
+                    ((geoms[i], int(i) + 1) for i in hits),
+                    out_shape=(int(window.height), int(window.width)),
+                    transform=window_transform(window, src.transform),
+                    fill=0, all_touched=all_touched, dtype='int32',
+                )
+                inside = labels > 0
+                if not inside.any():
+                    continue
+
+                windows_read += 1
+                data = src.read(bands, window=window).astype(np.float64)
+                for b, band in zip(bands, data):
+                    valid = inside & np.isfinite(band)
+                    if nodata is not None and not np.isnan(nodata):
+                        valid &= band != nodata
+                    accumulators[b].update(labels[valid], band[valid])
+
+        return accumulators, windows_read
+
+
+class Data:
+    def __init__(self, zones, rasters, zones_crs='lonlat', bands=None, stats=ZONAL_STATS,
+                 all_touched=False, output=None):
+        self.zones = zones
+        self.rasters = rasters
+        self.zones_crs = zones_crs
+        self.bands = bands
+        self.stats = stats
+        self.all_touched = all_touched
+        self.output = output  # Optional JSON file with the same result
+
+        self.status = 'running'
+        self.messages = 'Initializing...'
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            missing = [p for p in self.rasters if not os.path.exists(p)]
+            if missing:
+                raise FileNotFoundError(f'Input file not found: {missing[0]}')
+
+            features = load_features(self.zones)
+            if not features:
+                raise ValueError('Zones contain no geometry')
+            zones = [{
+                'id': _zone_id(feature, index),
+                'properties': feature.get('properties') or {},
+                'stats': {},
+            } for index, feature in enumerate(features)]
+
+            windows_read = 0
+            for path in self.rasters:
+                name = os.path.splitext(os.path.basename(path))[0]
+                accumulators, n_windows = zonal_statistics(
+                    path, features, zones_crs=self.zones_crs, bands=self.bands,
+                    stats=self.stats, all_touched=self.all_touched,
+                )
+                windows_read += n_windows
+                for band, acc in accumulators.items():
+                    label = name if len(accumulators) == 1 else f'{name}_b{band}'
+                    for index, zone in enumerate(zones):
+                        zone['stats'][label] = acc.result(index + 1, self.stats)
+
+            self.status = 'success'
+            self.messages = f'Zonal statistics for {len(zones)} zones over {len(self.rasters)} raster(s)'
+            self._print_result(zones, extra={
+                'windows_read': windows_read,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            })
+
+        except Exception as e:
+            self.status = 'failed'
+            self.messages = str(e)
+            self._print_result()
+
+    def _print_result(self, zones=None, extra=None):
+        result = {
+            'status': self.status,
+            'messages': self.messages,
+            'stats': list(self.stats),
+            'zones': zones or [],
+        }
+        if extra:
+            result.update(extra)
+        if self.output and self.status == 'success':
+            with open(self.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            result['path'] = self.output
+        print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Zonal statistics of rasters per polygon')
+    parser.add_argument('--zones', required=True, help='Polygons: GeoJSON file or GeoJSON string')
+    parser.add_argument('--zones-crs', default='lonlat',
+                        help='CRS of --zones: lonlat (default), raster, or any CRS string like EPSG:32750')
+    parser.add_argument('-i', '--input', required=True, nargs='+', help='Raster(s), e.g. NDVI / NDBI outputs')
+    parser.add_argument('--bands', type=int, nargs='+', help='Bands to summarise (default: all)')
+    parser.add_argument('--stats', nargs='+', default=list(ZONAL_STATS), choices=ZONAL_STATS,
+                        help='Statistics per zone')
+    parser.add_argument('--all-touched', action='store_true',
+                        help='Count every pixel touched by a polygon (useful for very small fields)')
+    parser.add_argument('-o', '--output', help='Also write the result JSON to this file')
+    args = parser.parse_args()
+
+    data = Data(zones=args.zones, rasters=args.input, zones_crs=args.zones_crs, bands=args.bands,
+                stats=args.stats, all_touched=args.all_touched, output=args.output)
+    data.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,32 @@
 import argparse
+import json
 import rasterio
 import numpy as np
 import os
 import sys
+from contextlib import ExitStack
 from PIL import Image
 
+# Shared raster helpers live in Assets/Script. A player build gets a copy of
+# raster_common.py next to this file (Assets/Editor/BackendBuildPostprocessor.cs)
+# and a PyInstaller build bundles it through the spec's pathex; in the editor it
+# is imported from Assets/Script
+_SHARED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Script')
+if os.path.isdir(_SHARED_DIR) and _SHARED_DIR not in sys.path:
+    sys.path.append(_SHARED_DIR)
+
+from raster_common import (
+    open_band_set, resolve_region, add_aoi_arguments, aoi_options_from_args,
+    BandStatistics, write_statistics, geotiff_profile, normalize_key,
+    QualityMask, add_quality_arguments, qa_flags_from_args,
+    BLOCK_SIZE, TILED_PROFILE, PreviewCanvas, remove_outputs,
+    Progress, Cancelled, add_progress_arguments,
+)
+
 # --------------------------------------------------
 # Save preview as PNG
 # --------------------------------------------------
-def save_preview_png(rgb_array, output_tif_path):
+def save_preview_png(rgb_array, output_tif_path, statistics=None):
     try:
         # Normalize logic:
         # rgb_array shape is (3, H, W)
@@ -31,7 +49,11 @@ def save_preview_png(rgb_array, output_tif_path):
                 rgb_norm[:, :, i] = 0
                 continue
                 
-            p2, p98 = np.percentile(band, (2, 98))
+            # Percentiles accumulated while writing are reused when available
+            if statistics and statistics[i].get('count'):
+                p2, p98 = statistics[i]['p2'], statistics[i]['p98']
+            else:
+                p2, p98 = np.percentile(band, (2, 98))
             
             if p98 - p2 > 1e-6:
                 band_norm = (band - p2) / (p98 - p2)
@@ -79,12 +101,13 @@ def save_preview_png(rgb_array, output_tif_path):
 def get_band_info(input_tif):
     bands = []
 
-    with rasterio.open(input_tif) as src:
-        for i in range(1, src.count + 1):
-            desc = src.descriptions[i - 1]
-            if not desc or desc.strip() == "":
-                desc = f"Band {i}"
-            bands.append((i, desc))
+    with open_band_set(input_tif) as src:
+        for key in src.keys:
+            ds, bidx = src.dataset(key)
+            desc = ds.descriptions[bidx - 1]
+            if not desc or desc.strip() == "" or not src.is_single_file:
+                desc = f"Band {key}" if src.is_single_file else os.path.basename(ds.name)
+            bands.append((key, desc))
 
     return bands
 
@@ -92,17 +115,184 @@ def get_band_info(input_tif):
 # --------------------------------------------------
 # Optional stretch for visualization
 # --------------------------------------------------
-def stretch_band(band, p_low=2, p_high=98):
-    band = band.astype("float32")
-    low, high = np.percentile(band, (p_low, p_high))
+def stretch_band(band, p_low=2, p_high=98, mask=None):
+    return apply_stretch(band, stretch_limits(band, mask=mask, p_low=p_low, p_high=p_high))
+
+
+# --------------------------------------------------
+# Composite specs (several products in one run)
+# --------------------------------------------------
+def parse_composite_spec(spec):
+    """NAME=R,G,B -> (name, (r, g, b))"""
+    name, sep, bands = spec.partition('=')
+    bands = tuple(b.strip() for b in bands.split(',') if b.strip())
+    if not sep or not name.strip() or len(bands) != 3:
+        raise ValueError(f"Invalid --composite '{spec}' (use NAME=R,G,B, e.g. falsecolor=5,4,3)")
+    return name.strip(), bands
+
 
+def composite_output_path(output, name):
+    """Output satu composite: <folder>/<name>.tif jika --output folder, selain itu <base>_<name><ext>"""
+    if output.endswith(('/', '\\')) or os.path.isdir(output):
+        return os.path.join(output, f"{name}.tif")
+    base, ext = os.path.splitext(output)
+    return f"{base}_{name}{ext or '.tif'}"
+
+
+def stretch_limits(band, mask=None, p_low=2, p_high=98):
+    """Batas percentile stretch satu band (None jika rentangnya nol)"""
+    band = band.astype("float32")
+    values = band if mask is None else band[mask]
+    low, high = np.percentile(values, (p_low, p_high))
     if high - low == 0:
-        return band
+        return None
+    return low, high
+
 
+def apply_stretch(band, limits):
+    """Stretch dengan batas yang sudah dihitung (sama dengan stretch_band)"""
+    band = band.astype("float32")
+    if limits is None:
+        return band
+    low, high = limits
     band = (band - low) / (high - low)
     return np.clip(band, 0, 1)
 
 
+# --------------------------------------------------
+# Streaming stretch statistics
+# --------------------------------------------------
+# np.percentile ('linear') only needs the two order statistics around each
+# percentile rank, so the stretch limits are found from exact histograms
+# accumulated window by window instead of one full-band array:
+# 8/16-bit integer bands in one pass (one bin per value), other bands through
+# the order-preserving bits of their float32 values (high 16 bits in the first
+# pass, low 16 bits of the few selected bins in a second pass).
+def _ordered_keys(values):
+    """float32 -> uint32 dengan urutan yang sama (NaN/Inf dibuang)"""
+    values = np.asarray(values, dtype=np.float32).ravel()
+    bits = values[np.isfinite(values)].view(np.uint32)
+    return np.where(bits & 0x80000000, ~bits, bits | 0x80000000)
+
+
+def _key_value(key):
+    key = np.uint32(key)
+    bits = key ^ np.uint32(0x80000000) if key & 0x80000000 else ~key
+    return np.array(bits, dtype=np.uint32).view(np.float32)[()]
+
+
+class StretchStatistics:
+    """Batas percentile stretch satu band, identik dengan np.percentile atas nilai float32"""
+
+    def __init__(self, dtype, percentiles=(2, 98)):
+        dtype = np.dtype(dtype)
+        self.percentiles = percentiles
+        self.direct = dtype.kind in 'ui' and dtype.itemsize <= 2
+        self.offset = -int(np.iinfo(dtype).min) if self.direct else 0
+        self.counts = np.zeros(1 << (8 * dtype.itemsize) if self.direct else 1 << 16, dtype=np.int64)
+        self.n = 0
+        self.low_counts = {}    # high 16-bit bin -> histogram of the low 16 bits
+
+    def update(self, band, inside=None):
+        """Pass pertama: histogram (nilai langsung atau 16 bit atas)"""
+        values = band if inside is None else band[inside]
+        if self.direct:
+            index = values.ravel().astype(np.int64) + self.offset
+            self.n += index.size
+        else:
+            index = (_ordered_keys(values) >> 16).astype(np.int64)
+            self.n += index.size
+        self.counts += np.bincount(index, minlength=self.counts.size)
+
+    def _ranks(self):
+        # Virtual index of numpy's default 'linear' method
+        q = np.true_divide(np.asarray(self.percentiles, dtype=np.float64), 100)
+        virtual = (self.n - 1) * q
+        ranks = []
+        for v in virtual:
+            if v >= self.n - 1:
+                ranks.append((self.n - 1, self.n - 1, v))
+            elif v < 0:
+                ranks.append((0, 0, v))
+            else:
+                ranks.append((int(np.floor(v)), int(np.floor(v)) + 1, v - np.floor(v)))
+        return ranks
+
+    def _bin_of(self, rank):
+        cumulative = np.cumsum(self.counts)
+        b = int(np.searchsorted(cumulative, rank, side='right'))
+        return b, rank - (int(cumulative[b - 1]) if b else 0)
+
+    def pending(self):
+        """True bila nilai persis masih butuh pass kedua (band non-integer)"""
+        if self.direct or self.n == 0:
+            return False
+        if not self.low_counts:
+            for prev, nxt, _ in self._ranks():
+                for rank in (prev, nxt):
+                    self.low_counts.setdefault(self._bin_of(rank)[0], np.zeros(1 << 16, dtype=np.int64))
+            return True
+        return False
+
+    def refine(self, band, inside=None):
+        """Pass kedua: histogram 16 bit bawah, hanya untuk bin yang memuat rank percentile"""
+        keys = _ordered_keys(band if inside is None else band[inside])
+        high = keys >> 16
+        for b, counts in self.low_counts.items():
+            counts += np.bincount((keys[high == b] & 0xFFFF).astype(np.int64), minlength=1 << 16)
+
+    def _value(self, rank):
+        b, within = self._bin_of(rank)
+        if self.direct:
+            return np.float32(b - self.offset)
+        low = int(np.searchsorted(np.cumsum(self.low_counts[b]), within, side='right'))
+        return _key_value((b << 16) | low)
+
+    def limits(self):
+        """(low, high) seperti stretch_band, atau None bila rentangnya nol"""
+        if self.n == 0:
+            raise ValueError("No valid pixels to compute the stretch")
+        ranks = self._ranks()
+        a = np.array([self._value(prev) for prev, _, _ in ranks], dtype=np.float32)
+        b = np.array([self._value(nxt) for _, nxt, _ in ranks], dtype=np.float32)
+        gamma = np.array([g for _, _, g in ranks], dtype=np.float64)
+        # Same lerp as numpy (array arithmetic: float32 neighbours, float64 weight)
+        diff = b - a
+        result = np.add(a, diff * gamma)
+        np.subtract(b, diff * (1 - gamma), out=result, where=gamma >= 0.5, casting='unsafe', dtype=np.float64)
+        low, high = result[0], result[-1]
+        if high - low == 0:
+            return None
+        return low, high
+
+
+# --------------------------------------------------
+# Display products (compact 8/16-bit RGB + alpha)
+# --------------------------------------------------
+DISPLAY_SCALES = {"uint8": 255, "uint16": 65535}
+
+
+def to_display(band, display):
+    """Band ter-stretch (0-1) -> bilangan bulat display, sama dengan konversi PNG (band * 255)"""
+    return (np.clip(band, 0, 1) * DISPLAY_SCALES[display]).astype(display)
+
+
+def save_display_preview(rgba_array, output_tif_path, scale=255):
+    """Preview RGBA dari produk display (sudah ter-stretch, tanpa stretch ulang)"""
+    try:
+        data = np.nan_to_num(rgba_array, nan=0.0) * (255.0 / scale)
+        img = Image.fromarray(np.moveaxis(data.astype(np.uint8), 0, -1), mode="RGBA")
+        base, _ = os.path.splitext(output_tif_path)
+        preview_path = f"{base}_preview.png"
+        img.thumbnail((1024, 1024))
+        img.save(preview_path)
+        print(f"Preview generated at: {preview_path}")
+        return preview_path
+    except Exception as e:
+        print(f"Warning: Failed to create preview PNG: {e}")
+        return None
+
+
 # --------------------------------------------------
 # Core composite logic
 # --------------------------------------------------
@@ -112,60 +302,205 @@ def composite_rgb_from_single_tif(
     g_band,
     b_band,
     output_tif,
-    stretch=False
+    stretch=False,
+    aoi_options=None,
+    qa_flags=None,
+    display=None
 ):
-    if not os.path.exists(input_tif):
-        raise FileNotFoundError("Input TIFF not found")
+    results = composite_many(
+        input_tif, [("rgb", (r_band, g_band, b_band), output_tif)],
+        stretch=stretch, aoi_options=aoi_options, qa_flags=qa_flags, display=display
+    )
+    return results[0]["statistics"]
 
-    if len({r_band, g_band, b_band}) < 3:
-        raise ValueError("R, G, and B must be different bands")
 
-    with rasterio.open(input_tif) as src:
-        band_count = src.count
+def _outside_mask(region, quality, src_window, dst_window):
+    """True = di luar poligon AOI atau ber-flag QA (None bila tidak ada mask)"""
+    outside = region.outside_mask(dst_window)
+    if quality is not None:
+        flagged = quality.read(src_window)
+        outside = flagged if outside is None else outside | flagged
+    return outside
 
-        for b in (r_band, g_band, b_band):
-            if b < 1 or b > band_count:
-                raise ValueError(
-                    f"Band {b} is invalid (file has {band_count} bands)"
-                )
 
-        r = src.read(r_band)
-        g = src.read(g_band)
-        b = src.read(b_band)
+def composite_many(input_tif, composites, stretch=False, aoi_options=None, qa_flags=None,
+                   display=None, block_size=BLOCK_SIZE, progress=None):
+    """Tulis beberapa composite (name, (r, g, b), output) dari satu input dalam satu pass per window"""
+    # progress: JSON-lines events + cancel checks at window boundaries (--progress)
+    progress = progress or Progress()
+    input_paths = [input_tif] if isinstance(input_tif, str) else list(input_tif)
+    if not all(os.path.exists(p) for p in input_paths):
+        raise FileNotFoundError("Input TIFF not found")
+    if not composites:
+        raise ValueError("No composite given (use --r/--g/--b or --composite NAME=R,G,B)")
+    if display is not None:
+        if display not in DISPLAY_SCALES:
+            raise ValueError(f"Unknown display type '{display}' (use {', '.join(DISPLAY_SCALES)})")
+        # A display product is always stretched
+        stretch = True
+
+    # Input can be one multiband file or separate per-band files;
+    # each band is read straight from its own file (no stacking step)
+    with open_band_set(input_paths) as src:
+        band_count = src.count
 
+        # Every distinct band is read (and stretched) once per window, whatever
+        # the number of composites that use it
+        distinct = []
+        for name, bands, _ in composites:
+            if any(b is None for b in bands):
+                raise ValueError(f"Composite {name} needs three bands (R, G, B)")
+            if len({normalize_key(b) for b in bands}) < 3:
+                raise ValueError("R, G, and B must be different bands")
+            for b in bands:
+                if not src.has(b):
+                    raise ValueError(
+                        f"Band {b} is invalid (input has {band_count} bands: {', '.join(src.keys)})"
+                    )
+                if normalize_key(b) not in distinct:
+                    distinct.append(normalize_key(b))
+
+        # Only the AOI window is read (whole raster without --bbox/--aoi)
+        region = resolve_region(src, **(aoi_options or {}))
+
+        # Pixels flagged in the QA band (clouds, shadow, ...) are treated like outside the AOI
+        quality = QualityMask(src, qa_flags) if qa_flags else None
+        masked = region.is_masked or quality is not None
+
+        # Each band is read in its own dtype (per-band inputs may mix uint16 and float32);
+        # an unstretched composite is written in the common (promoted) dtype
+        band_dtypes = {}
+        for key in distinct:
+            ds, bidx = src.dataset(key)
+            band_dtypes[key] = np.dtype(ds.dtypes[bidx - 1])
+        source_dtype = np.result_type(*band_dtypes.values())
+        windows = list(region.windows(block_size))
+        limits = {}
         if stretch:
-            r = stretch_band(r)
-            g = stretch_band(g)
-            b = stretch_band(b)
-
-        # ---- COMPOSITE LINE ----
-        rgb = np.stack([r, g, b])
-
-        profile = src.profile
-        profile.update(
-            count=3,
-            dtype=rgb.dtype
-        )
-
-        # Handle PNG output
-        if output_tif.lower().endswith(".png"):
-            profile.update(driver="PNG")
-            # PNG typically requires uint8 or uint16. 
-            # If we stretched (float32 0-1), we should convert to uint8.
-            if rgb.dtype == 'float32' or rgb.dtype == 'float64':
-                rgb = (rgb * 255).astype('uint8')
-                profile.update(dtype='uint8')
-            # If original was not stretched (e.g. uint16), PNG supports uint16, 
-            # but for visualization uint8 is often preferred. 
-            # We'll leave it unless it's float.
-
-    with rasterio.open(output_tif, "w", **profile) as dst:
-        dst.write(rgb)
-        
-    # Generate Preview
-    preview_file = save_preview_png(rgb, output_tif)
-    if preview_file:
-        print(f"Preview: {preview_file}")
+            # Stretch limits come from pixels inside the AOI only, once per band,
+            # accumulated window by window (exactly the percentiles of stretch_band)
+            stretch_stats = {key: StretchStatistics(band_dtypes[key]) for key in distinct}
+            progress.stage('statistics', total=len(windows))
+            for src_window, dst_window in windows:
+                outside = _outside_mask(region, quality, src_window, dst_window)
+                inside = None if outside is None else ~outside
+                for key in distinct:
+                    stretch_stats[key].update(src.read(key, window=src_window, dtype=band_dtypes[key]), inside)
+                progress.advance()
+            pending = [key for key in distinct if stretch_stats[key].pending()]
+            if pending:
+                # Non 8/16-bit integer bands: second pass for the exact values
+                progress.stage('statistics_refine', total=len(windows))
+                for src_window, dst_window in windows:
+                    outside = _outside_mask(region, quality, src_window, dst_window)
+                    inside = None if outside is None else ~outside
+                    for key in pending:
+                        stretch_stats[key].refine(src.read(key, window=src_window, dtype=band_dtypes[key]), inside)
+                    progress.advance()
+            limits = {key: stretch_stats[key].limits() for key in distinct}
+
+        profile = region.update_profile(src.profile.copy())
+        tif_options = dict(TILED_PROFILE)
+        if display is not None:
+            # Display product: 8/16-bit RGB + alpha (transparent outside the AOI / QA mask)
+            dtype = np.dtype(display)
+            profile.update(count=4, dtype=dtype, nodata=None)
+            tif_options.update(photometric='RGB', alpha='YES', compress='deflate', predictor=2)
+        else:
+            dtype = np.dtype("float32") if stretch else np.dtype(source_dtype)
+            profile.update(count=3, dtype=dtype)
+            if masked:
+                profile.update(nodata=0)
+        # PNG keeps 8 bit for stretched (0-1) composites
+        png_dtype = np.dtype('uint8') if dtype.kind == 'f' else dtype
+
+        outputs = []
+        for name, bands, output in composites:
+            out = {"name": name, "keys": [normalize_key(b) for b in bands], "path": output,
+                   "png": output.lower().endswith(".png")}
+            if out["png"]:
+                # The PNG driver cannot be written window by window: kept in memory
+                out["data"] = np.zeros((profile['count'], region.height, region.width), dtype=png_dtype)
+            out["preview"] = PreviewCanvas(region.width, region.height, count=profile['count'])
+            outputs.append(out)
+        statistics = {key: BandStatistics(nodata=profile.get('nodata')) for key in distinct}
+
+        # Switches to BigTIFF when the composite would pass the 4 GB TIFF limit
+        tif_profile = geotiff_profile(dict(profile, **tif_options))
+        try:
+            with ExitStack() as stack:
+                for out in outputs:
+                    if not out["png"]:
+                        out["dst"] = stack.enter_context(rasterio.open(out["path"], "w", **tif_profile))
+
+                progress.stage('write', total=len(windows))
+                for src_window, dst_window in windows:
+                    outside = _outside_mask(region, quality, src_window, dst_window)
+
+                    window_bands = {}
+                    for key in distinct:
+                        band = src.read(key, window=src_window, dtype=band_dtypes[key])
+                        if stretch:
+                            band = apply_stretch(band, limits[key])
+                        else:
+                            band = band.astype(source_dtype, copy=False)
+                        if display is not None:
+                            band = to_display(band, display)
+                        # Pixels outside the AOI polygon (or QA-flagged) become nodata (0)
+                        if outside is not None:
+                            band[outside] = 0
+                        # Display bands carry no nodata value: only visible pixels are counted
+                        statistics[key].update(band if display is None or outside is None else band[~outside])
+                        window_bands[key] = band
+
+                    layers = []
+                    if display is not None:
+                        alpha = np.full(band.shape, DISPLAY_SCALES[display], dtype=dtype)
+                        if outside is not None:
+                            alpha[outside] = 0
+                        layers.append(alpha)
+
+                    for out in outputs:
+                        # ---- COMPOSITE LINE ----
+                        rgb = np.stack([window_bands[k] for k in out["keys"]] + layers)
+                        if out["png"]:
+                            r0, c0 = int(dst_window.row_off), int(dst_window.col_off)
+                            # If we stretched (float 0-1), PNG gets 8 bit
+                            block = (rgb * 255).astype('uint8') if rgb.dtype.kind == 'f' else rgb
+                            out["data"][:, r0:r0 + rgb.shape[1], c0:c0 + rgb.shape[2]] = block
+                        else:
+                            out["dst"].write(rgb, window=dst_window)
+                        out["preview"].paste(dst_window, rgb)
+
+                    # Cancel check at the window boundary
+                    progress.advance()
+
+            for out in outputs:
+                if out["png"]:
+                    png_profile = dict(profile, driver="PNG", dtype=png_dtype)
+                    with rasterio.open(out["path"], "w", **png_profile) as dst:
+                        dst.write(out.pop("data"))
+        except Exception:
+            # Failed or cancelled: nothing half-written is left behind
+            remove_outputs(*[out["path"] for out in outputs])
+            raise
+
+    results = []
+    for out in outputs:
+        # Per-band statistics/histogram sidecar (.aux.xml); bands shared by several
+        # composites reuse the same accumulated statistics
+        band_statistics = write_statistics(out["path"], [statistics[k] for k in out["keys"]])
+
+        # Generate Preview
+        if display is not None:
+            preview_file = save_display_preview(out["preview"].data, out["path"], DISPLAY_SCALES[display])
+        else:
+            preview_file = save_preview_png(out["preview"].data, out["path"], statistics=band_statistics)
+        if preview_file:
+            print(f"Preview: {preview_file}")
+        results.append({"name": out["name"], "path": out["path"], "preview_png": preview_file,
+                        "statistics": band_statistics})
+    return results
 
 
 # --------------------------------------------------
@@ -179,34 +514,42 @@ def parse_args():
     parser.add_argument(
         "--input",
         required=True,
-        help="Input multiband GeoTIFF"
+        nargs="+",
+        help="Input multiband GeoTIFF/VRT, a folder of per-band files, or a list of per-band files"
     )
 
     parser.add_argument(
         "--r",
-        type=int,
+        type=str,
         required=False,
-        help="Band number for RED (1-based)"
+        help="Band number for RED (1-based, or band key such as 8A for per-band inputs)"
     )
 
     parser.add_argument(
         "--g",
-        type=int,
+        type=str,
         required=False,
-        help="Band number for GREEN (1-based)"
+        help="Band number for GREEN (1-based, or band key such as 8A for per-band inputs)"
     )
 
     parser.add_argument(
         "--b",
-        type=int,
+        type=str,
         required=False,
-        help="Band number for BLUE (1-based)"
+        help="Band number for BLUE (1-based, or band key such as 8A for per-band inputs)"
+    )
+
+    parser.add_argument(
+        "--composite",
+        action="append",
+        help="Named composite NAME=R,G,B (repeatable, e.g. truecolor=4,3,2 falsecolor=5,4,3); "
+             "all composites are written in one pass over the input"
     )
 
     parser.add_argument(
         "--output",
         required=False,
-        help="Output RGB GeoTIFF"
+        help="Output RGB GeoTIFF (with --composite: a folder, or a base path that gets _NAME appended)"
     )
 
     parser.add_argument(
@@ -215,12 +558,23 @@ def parse_args():
         help="Apply percentile stretch (recommended for display)"
     )
 
+    parser.add_argument(
+        "--display",
+        choices=tuple(DISPLAY_SCALES),
+        help="Write a compact display product: stretched (implies --stretch) 8- or 16-bit RGB "
+             "with an alpha band, tiled and compressed"
+    )
+
     parser.add_argument(
         "--list-bands",
         action="store_true",
         help="List available bands and exit"
     )
 
+    add_aoi_arguments(parser)
+    add_quality_arguments(parser)
+    add_progress_arguments(parser)
+
     return parser.parse_args()
 
 
@@ -230,8 +584,9 @@ def parse_args():
 def main():
     args = parse_args()
 
-    if not os.path.exists(args.input):
-        print(f"ERROR: Input file not found: {args.input}")
+    missing = [p for p in args.input if not os.path.exists(p)]
+    if missing:
+        print(f"ERROR: Input file not found: {missing[0]}")
         sys.exit(1)
 
     # Optional band listing
@@ -243,20 +598,52 @@ def main():
         sys.exit(0)
 
     try:
-        composite_rgb_from_single_tif(
-            input_tif=args.input,
-            r_band=args.r,
-            g_band=args.g,
-            b_band=args.b,
-            output_tif=args.output,
-            stretch=args.stretch
+        if not args.output:
+            raise ValueError("--output is required")
+        if args.composite:
+            if args.r or args.g or args.b:
+                raise ValueError("Use either --r/--g/--b or --composite, not both")
+            if args.output.endswith(('/', '\\')):
+                os.makedirs(args.output, exist_ok=True)
+            composites = []
+            for spec in args.composite:
+                name, bands = parse_composite_spec(spec)
+                if any(name == c[0] for c in composites):
+                    raise ValueError(f"Duplicate composite name '{name}'")
+                composites.append((name, bands, composite_output_path(args.output, name)))
+        else:
+            composites = [("rgb", (args.r, args.g, args.b), args.output)]
+
+        results = composite_many(
+            args.input,
+            composites,
+            stretch=args.stretch,
+            aoi_options=aoi_options_from_args(args),
+            qa_flags=qa_flags_from_args(args),
+            display=args.display,
+            progress=Progress(enabled=args.progress).listen()
         )
+    except Cancelled as e:
+        print(f"CANCELLED: {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"ERROR: {e}")
         sys.exit(1)
 
     print("RGB composite created successfully")
-    print(f"Output: {args.output}")
+    for result in results:
+        print(f"Output: {result['path']}")
+
+    # Structured result (last line) with the per-band statistics, like the other backends
+    print(json.dumps({
+        "status": "success",
+        "messages": "RGB composite created successfully",
+        "path": results[0]["path"],
+        "preview_png": os.path.basename(results[0]["preview_png"]) if results[0]["preview_png"] else None,
+        "statistics": results[0]["statistics"],
+        "composites": [dict(r, preview_png=os.path.basename(r["preview_png"]) if r["preview_png"] else None)
+                       for r in results],
+    }))
 
 
 if __name__ == "__main__":
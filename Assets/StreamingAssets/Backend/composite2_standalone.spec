@@ -1,6 +1,10 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 from PyInstaller.utils.hooks import collect_all
 
+# Paths relative to this spec, so the build works from any checkout
+SCRIPT_DIR = os.path.abspath(os.path.join(SPECPATH, '..', '..', 'Script'))
+
 datas = []
 binaries = []
 hiddenimports = ['rasterio.sample', 'rasterio._features', 'rasterio._shim']
@@ -9,8 +13,8 @@ datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 
 
 a = Analysis(
-    ['E:\\Collab Projek\\IT-Sensing-Prototype\\Assets\\StreamingAssets\\Backend\\composite2_standalone.py'],
-    pathex=[],
+    [os.path.join(SPECPATH, 'composite2_standalone.py')],
+    pathex=[SCRIPT_DIR],
     binaries=binaries,
     datas=datas,
     hiddenimports=hiddenimports,
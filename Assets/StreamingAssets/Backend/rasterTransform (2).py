@@ -3,6 +3,9 @@ import json
 import os
 from datetime import datetime
 import rasterio
+from rasterio.coords import BoundingBox
+from rasterio.crs import CRS
+from rasterio.warp import transform_bounds
 import numpy as np
 from PIL import Image
 import cv2
@@ -320,10 +323,12 @@ def create_preview_png(tif_path, png_path, algo, max_size=1024):
         return False
 
 def get_bounds(tif_path):
-    """Dapatkan bounds dari file TIF"""
+    """Dapatkan bounds dari file TIF (derajat lon/lat, bukan CRS asli raster)"""
     try:
         with rasterio.open(tif_path) as src:
             bounds = src.bounds
+            if src.crs and src.crs != CRS.from_epsg(4326):
+                bounds = BoundingBox(*transform_bounds(src.crs, 'EPSG:4326', *bounds, densify_pts=21))
             return {
                 "north": float(bounds.top),
                 "south": float(bounds.bottom),
@@ -0,0 +1,72 @@
+# -*- mode: python ; coding: utf-8 -*-
+# One-dir build of every Python backend behind Assets/Script/raster_backend.py
+# (raster_backend <command> [args...], see the header of that file).
+#
+#   cd Assets/StreamingAssets/Backend
+#   pyinstaller raster_backend.spec
+#
+# then copy dist/raster_backend/ (raster_backend.exe + _internal/) to
+# Assets/StreamingAssets/Backend/raster_backend/. numpy/GDAL/cv2 are shipped
+# once for all commands and loaded in place: nothing is unpacked per launch.
+import os
+from PyInstaller.utils.hooks import collect_all
+
+SCRIPT_DIR = os.path.abspath(os.path.join(SPECPATH, '..', '..', 'Script'))
+BACKEND_DIR = os.path.abspath(SPECPATH)
+
+# Backends are imported lazily by name, so the analysis cannot see them
+hiddenimports = [
+    'rasterTransform', 'composite2_standalone', 'raster_sharpen', 'raster_classify',
+    'raster_temporal', 'raster_zonal', 'raster_sample', 'raster_batch', 'raster_service',
+    'raster_common', 'raster_expression',
+    'rasterio.sample', 'rasterio.vrt', 'rasterio._features', 'rasterio._shim', 'cv2', 'PIL.Image',
+]
+# The calculator's file name is not importable: it is bundled as a source file
+datas = [(os.path.join(SCRIPT_DIR, 'raster_calculator_standalone (1).py'), 'Script')]
+binaries = []
+tmp_ret = collect_all('rasterio')
+datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
+
+
+a = Analysis(
+    [os.path.join(SCRIPT_DIR, 'raster_backend.py')],
+    pathex=[SCRIPT_DIR, BACKEND_DIR],
+    binaries=binaries,
+    datas=datas,
+    hiddenimports=hiddenimports,
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=['tkinter', 'matplotlib', 'IPython'],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='raster_backend',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    # UPX-packed DLLs would be decompressed on every launch again
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='raster_backend',
+)
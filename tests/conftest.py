@@ -0,0 +1,24 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+# The backends are flat scripts in Assets/Script (Unity asset folder)
+SCRIPT_DIR = os.path.join(os.path.dirname(__file__), '..', 'Assets', 'Script')
+sys.path.insert(0, os.path.abspath(SCRIPT_DIR))
+
+
+@pytest.fixture
+def small_raster(tmp_path):
+    """GeoTIFF 3 band 64x64 (UTM 50S, piksel 30 m) dengan nilai = band * 1000 + row"""
+    path = tmp_path / 'scene.tif'
+    rows = np.arange(64, dtype=np.uint16)[:, None].repeat(64, axis=1)
+    profile = {'driver': 'GTiff', 'width': 64, 'height': 64, 'count': 3, 'dtype': 'uint16',
+               'crs': 'EPSG:32750', 'transform': from_origin(500000, 9900000, 30, 30)}
+    with rasterio.open(path, 'w', **profile) as dst:
+        for band in range(1, 4):
+            dst.write(rows + band * 1000, band)
+    return str(path)
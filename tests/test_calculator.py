@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from test_scaling import CALCULATOR, last_json
+
+
+def write_band(path, x0, y0, size, value):
+    profile = {'driver': 'GTiff', 'width': size, 'height': size, 'count': 1, 'dtype': 'uint16',
+               'crs': 'EPSG:32750', 'transform': from_origin(x0, y0, 30, 30)}
+    with rasterio.open(path, 'w', **profile) as dst:
+        dst.write(np.full((size, size), value, dtype=np.uint16), 1)
+
+
+def test_mixed_grid_pixels_outside_footprint_stay_nodata(tmp_path):
+    scene = tmp_path / 'scene'
+    scene.mkdir()
+    # B4 covers 100x100 px; B5 only 60x60 px, 20 px in from the top-left corner
+    write_band(scene / 'LC08_X_SR_B4.TIF', 500000, 9900000, 100, 1000)
+    write_band(scene / 'LC08_X_SR_B5.TIF', 500000 + 20 * 30, 9900000 - 20 * 30, 60, 3000)
+
+    proc = subprocess.run([sys.executable, CALCULATOR, '-n', 'mixed', '-f', 'b5 - b4', '-i', str(scene)],
+                          cwd=str(tmp_path), capture_output=True, text=True)
+    result = last_json(proc.stdout.splitlines())
+    assert result['status'] == 'success', result
+    with rasterio.open(tmp_path / result['path']) as out:
+        data = out.read(1)
+        assert np.isnan(out.nodata)
+
+    assert data.shape == (100, 100)
+    assert np.isnan(data).sum() == 100 * 100 - 60 * 60
+    np.testing.assert_array_equal(data[20:80, 20:80], 2000)
@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from test_scaling import COMPOSITE
+
+
+def write_scene(folder, size, bands=(2, 3, 4), dtypes=None):
+    """Band per-file acak (LC08 SR_Bn) di folder"""
+    folder.mkdir()
+    rng = np.random.default_rng(41)
+    for band in bands:
+        dtype = (dtypes or {}).get(band, 'uint16')
+        profile = {'driver': 'GTiff', 'width': size, 'height': size, 'count': 1, 'dtype': dtype,
+                   'crs': 'EPSG:32750', 'transform': from_origin(500000, 9900000, 30, 30),
+                   'tiled': True, 'blockxsize': 512, 'blockysize': 512}
+        with rasterio.open(folder / f'LC08_L2SP_116060_20231115_SR_B{band}.TIF', 'w', **profile) as dst:
+            dst.write(rng.integers(1, 10000, (size, size)).astype(dtype), 1)
+    return str(folder)
+
+
+def test_cancel_during_write_removes_partial_outputs(tmp_path):
+    scene = write_scene(tmp_path / 'scene', 4096)
+    output = tmp_path / 'rgb.tif'
+    proc = subprocess.Popen([sys.executable, COMPOSITE, '--input', scene, '--r', '4', '--g', '3', '--b', '2',
+                             '--output', str(output), '--stretch', '--progress'],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    lines = []
+    for line in proc.stdout:
+        lines.append(line)
+        if line.startswith('{') and json.loads(line).get('stage') == 'write':
+            proc.stdin.write('cancel\n')
+            proc.stdin.flush()
+            break
+    lines += proc.stdout.readlines()
+    assert proc.wait() == 1
+
+    assert any(line.startswith('CANCELLED:') for line in lines), lines
+    assert not os.path.exists(output)
+    assert not os.path.exists(f'{output}.aux.xml')
+
+
+def test_mixed_band_dtypes_are_not_cast_lossily(tmp_path):
+    scene = tmp_path / 'scene'
+    scene.mkdir()
+    rng = np.random.default_rng(48)
+    bands = {2: rng.integers(1, 10000, (300, 300)).astype('uint16'),
+             3: (rng.random((300, 300)) * 0.8 - 0.2).astype('float32'),   # e.g. reflectance
+             4: rng.integers(1, 10000, (300, 300)).astype('uint16')}
+    for band, data in bands.items():
+        profile = {'driver': 'GTiff', 'width': 300, 'height': 300, 'count': 1, 'dtype': data.dtype.name,
+                   'crs': 'EPSG:32750', 'transform': from_origin(500000, 9900000, 30, 30)}
+        with rasterio.open(scene / f'LC08_L2SP_116060_20231115_SR_B{band}.TIF', 'w', **profile) as dst:
+            dst.write(data, 1)
+
+    output = tmp_path / 'rgb.tif'
+    subprocess.run([sys.executable, COMPOSITE, '--input', str(scene), '--r', '4', '--g', '3', '--b', '2',
+                    '--output', str(output)], check=True, capture_output=True)
+    with rasterio.open(output) as out:
+        assert out.dtypes[0] == 'float32'
+        np.testing.assert_array_equal(out.read(2), bands[3])
+        np.testing.assert_array_equal(out.read(1), bands[4])
+
+    stretched = tmp_path / 'rgb_stretch.tif'
+    subprocess.run([sys.executable, COMPOSITE, '--input', str(scene), '--r', '4', '--g', '3', '--b', '2',
+                    '--output', str(stretched), '--stretch'], check=True, capture_output=True)
+    low, high = np.percentile(bands[3], (2, 98))
+    expected = np.clip((bands[3] - low) / (high - low), 0, 1)
+    with rasterio.open(stretched) as out:
+        np.testing.assert_allclose(out.read(2), expected, atol=1e-6)
@@ -0,0 +1,89 @@
+from raster_service import JobService
+
+
+class RecordingService(JobService):
+    """JobService yang menyimpan event alih-alih mencetaknya"""
+
+    def __init__(self, workers):
+        self.events = []
+        super().__init__(workers)
+
+    def emit(self, record):
+        with self.out_lock:
+            self.events.append(record)
+
+
+def run_jobs(requests):
+    service = RecordingService(1)
+    for request in requests:
+        service.submit(request)
+    service.close()
+    return service.events
+
+
+def test_sample_job_result_contains_samples(small_raster, tmp_path):
+    # Pixel centre of row 10, column 5
+    x, y = 500000 + 5 * 30 + 15, 9900000 - 10 * 30 - 15
+    events = run_jobs([{'id': 's1', 'backend': 'sample', 'cwd': str(tmp_path),
+                        'args': ['-i', small_raster, '--crs', 'raster', '--points', f'{x},{y}']}])
+
+    result = next(e for e in events if e['event'] == 'result')
+    assert result['status'] == 'success', result
+    assert result['samples'] == {'scene_b1': [1010.0], 'scene_b2': [2010.0], 'scene_b3': [3010.0]}
+    assert result['points'] == [[x, y]]
+    assert result['crs'] == 'raster'
+
+
+
+def test_zonal_job_result_contains_zones(small_raster, tmp_path):
+    ring = [[500000, 9900000], [500000 + 64 * 30, 9900000], [500000 + 64 * 30, 9900000 - 32 * 30],
+            [500000, 9900000 - 32 * 30], [500000, 9900000]]
+    zones = '{"type": "Polygon", "coordinates": [%s]}' % ring
+    events = run_jobs([{'id': 'z1', 'backend': 'zonal', 'cwd': str(tmp_path),
+                        'args': ['--zones', zones, '--zones-crs', 'raster', '-i', small_raster,
+                                 '--bands', '1', '--stats', 'count', 'mean']}])
+
+    result = next(e for e in events if e['event'] == 'result')
+    assert result['status'] == 'success', result
+    assert len(result['zones']) == 1
+    assert result['zones'][0]['stats']
+
+
+class StartGapService(RecordingService):
+    """Superseding request tiba setelah job diambil worker, sebelum prosesnya dibuat"""
+
+    def __init__(self, workers, request):
+        self.request = request
+        super().__init__(workers)
+
+    def _run(self, job):
+        if job.ids[0] == 'first':
+            self.submit(self.request)
+        return super()._run(job)
+
+
+def test_supersede_before_start_cancels_without_starting(small_raster, tmp_path):
+    def request(job_id, x):
+        return {'id': job_id, 'backend': 'sample', 'panel': 'probe', 'cwd': str(tmp_path),
+                'args': ['-i', small_raster, '--crs', 'raster', '--points', f'{x},9899985']}
+
+    service = StartGapService(1, request('second', 500045))
+    service.submit(request('first', 500015))
+    service.close()
+
+    results = {e['job']: e for e in service.events if e['event'] == 'result'}
+    assert results['first']['status'] == 'cancelled'
+    assert results['first']['messages'] == 'Superseded by second'
+    assert not any(e['event'] == 'started' and e['job'] == 'first' for e in service.events)
+    assert results['second']['status'] == 'success'
+
+
+def test_composite_job_result_contains_statistics(small_raster, tmp_path):
+    events = run_jobs([{'id': 'c1', 'backend': 'composite', 'cwd': str(tmp_path),
+                        'args': ['--input', small_raster, '--r', '3', '--g', '2', '--b', '1',
+                                 '--output', 'Composite/rgb.tif']}])
+
+    result = next(e for e in events if e['event'] == 'result')
+    assert result['status'] == 'success', result
+    assert result['preview_png'] == 'rgb_preview.png'
+    assert [s['min'] for s in result['statistics']] == [3000.0, 2000.0, 1000.0]
@@ -0,0 +1,158 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+import raster_common
+from conftest import SCRIPT_DIR
+
+resource = pytest.importorskip('resource')  # peak RSS of child processes (POSIX)
+
+BACKEND_DIR = os.path.join(SCRIPT_DIR, '..', 'StreamingAssets', 'Backend')
+TRANSFORM = os.path.join(SCRIPT_DIR, 'rasterTransform.py')
+CALCULATOR = os.path.join(SCRIPT_DIR, 'raster_calculator_standalone (1).py')
+COMPOSITE = os.path.join(BACKEND_DIR, 'composite2_standalone.py')
+
+# Large enough that a whole-array run needs several GB, small enough to stay quick:
+# the scene is sparse (a few written tiles), so it costs a few MB on disk
+LARGE_SIZE = int(os.environ.get('RASTER_SCALING_SIZE', 12288))
+BUDGET_MB = 300
+MAX_SECONDS = 120
+
+
+def write_band(path, width, height, fill):
+    """Band uint16 per-file (tiled); fill(window) -> data, None = tile sparse"""
+    profile = {'driver': 'GTiff', 'width': width, 'height': height, 'count': 1, 'dtype': 'uint16',
+               'crs': 'EPSG:32750', 'transform': from_origin(500000, 9900000, 30, 30),
+               'tiled': True, 'blockxsize': 512, 'blockysize': 512, 'compress': 'lzw', 'SPARSE_OK': True}
+    with rasterio.open(path, 'w', **profile) as dst:
+        for row in range(0, height, 512):
+            for col in range(0, width, 512):
+                window = Window(col, row, min(512, width - col), min(512, height - row))
+                data = fill(window)
+                if data is not None:
+                    dst.write(data, 1, window=window)
+
+
+@pytest.fixture(scope='module')
+def large_scene(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('large') / 'scene'
+    folder.mkdir()
+    rng = np.random.default_rng(40)
+    for band in (2, 3, 4, 5):
+        def fill(window):
+            # Data on the diagonal only, everything else is a sparse (unwritten) tile
+            if window.col_off != window.row_off or window.col_off % 4096:
+                return None
+            return rng.integers(1, 10000, (window.height, window.width), dtype=np.uint16)
+        write_band(str(folder / f'LC08_L2SP_116060_20231115_SR_B{band}.TIF'), LARGE_SIZE, LARGE_SIZE, fill)
+    return str(folder)
+
+
+def run_measured(command, cwd):
+    """Jalankan backend; (stdout, puncak RSS MB, detik) diukur dari proses pembungkus sendiri"""
+    wrapper = ('import resource, subprocess, sys, time\n'
+               'start = time.perf_counter()\n'
+               'proc = subprocess.run(sys.argv[1:], capture_output=True, text=True)\n'
+               'sys.stdout.write(proc.stdout)\n'
+               'print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss, time.perf_counter() - start)\n')
+    proc = subprocess.run([sys.executable, '-c', wrapper, *command], cwd=cwd, capture_output=True, text=True)
+    lines = proc.stdout.splitlines()
+    rss_kb, seconds = lines[-1].split()
+    return lines[:-1], int(rss_kb) / 1024, float(seconds)
+
+
+def last_json(lines):
+    return json.loads(next(line for line in reversed(lines) if line.startswith('{')))
+
+
+def explain(command, cwd):
+    proc = subprocess.run(command + ['--explain'], cwd=cwd, capture_output=True, text=True)
+    return last_json(proc.stdout.splitlines())['plan']
+
+
+@pytest.mark.parametrize('command', [
+    [TRANSFORM, '-n', 'large', '--algo', 'NDVI', '--input'],
+    [CALCULATOR, '-n', 'large', '-f', '(b5 - b4) / (b5 + b4 + 1)', '-i'],
+], ids=['transform', 'calculator'])
+def test_large_raster_stays_within_memory_plan(large_scene, tmp_path, command):
+    command = [sys.executable, *command, large_scene, '--memory-mb', str(BUDGET_MB)]
+    plan = explain(command, str(tmp_path))
+    assert plan['whole_array_mb'] > 10 * BUDGET_MB
+    assert plan['windows'] > 1
+
+    lines, peak_mb, seconds = run_measured(command, str(tmp_path))
+    result = last_json(lines)
+    assert result['status'] == 'success', result
+    assert peak_mb <= plan['budget_mb'], f'peak RSS {peak_mb:.0f} MB over the {BUDGET_MB} MB plan'
+    assert seconds < MAX_SECONDS
+    with rasterio.open(os.path.join(str(tmp_path), result['path'])) as out:
+        assert (out.width, out.height) == (LARGE_SIZE, LARGE_SIZE)
+
+
+def test_large_composite_streams(large_scene, tmp_path):
+    command = [sys.executable, COMPOSITE, '--input', large_scene, '--r', '4', '--g', '3', '--b', '2',
+               '--output', 'large_rgb.tif', '--stretch']
+    lines, peak_mb, seconds = run_measured(command, str(tmp_path))
+    assert any(line.startswith('Output:') for line in lines), lines
+    # The whole float32 RGB stack would be LARGE_SIZE^2 x 12 bytes (1.8 GB at 12288)
+    assert peak_mb <= BUDGET_MB
+    assert seconds < MAX_SECONDS
+
+
+# --------------------------------------------------
+# Windowed output == whole-array result
+# --------------------------------------------------
+@pytest.fixture(scope='module')
+def odd_scene(tmp_path_factory):
+    """Scene kecil acak dengan ukuran bukan kelipatan window (1500 x 1300)"""
+    folder = tmp_path_factory.mktemp('odd') / 'scene'
+    folder.mkdir()
+    rng = np.random.default_rng(7)
+    bands = {}
+    for band in (4, 5):
+        bands[band] = rng.integers(1, 10000, (1300, 1500), dtype=np.uint16)
+        write_band(str(folder / f'LC08_L2SP_116060_20231115_SR_B{band}.TIF'), 1500, 1300,
+                   lambda w, data=bands[band]: data[w.toslices()])
+    return str(folder), bands
+
+
+def read_output(cwd, lines):
+    result = last_json(lines)
+    assert result['status'] == 'success', result
+    with rasterio.open(os.path.join(cwd, result['path'])) as out:
+        return out.read(1)
+
+
+def test_windowed_transform_matches_whole_array(odd_scene, tmp_path):
+    folder, bands = odd_scene
+    # Smallest budget -> smallest window (aligned to the 512 px tiles), halos across the seams
+    command = [sys.executable, TRANSFORM, '-n', 'odd', '--algo', 'NDVI', '--input', folder,
+               '--post', 'focal_mean:5', '--post', 'focal_median:3', '--memory-mb', '1']
+    assert explain(command, str(tmp_path))['windows'] > 1
+    proc = subprocess.run(command, cwd=str(tmp_path), capture_output=True, text=True)
+    windowed = read_output(str(tmp_path), proc.stdout.splitlines())
+
+    red, nir = bands[4].astype(np.float32), bands[5].astype(np.float32)
+    whole = (nir - red) / (nir + red + 1e-6)
+    whole = raster_common.focal_median(raster_common.focal_mean(whole, 5), 3)
+    np.testing.assert_allclose(windowed, whole, rtol=1e-5, atol=1e-6)
+
+
+def test_windowed_calculator_matches_whole_array(odd_scene, tmp_path):
+    folder, bands = odd_scene
+    command = [sys.executable, CALCULATOR, '-n', 'odd', '-f', '(b5 - b4) / (b5 + b4 + 1) - np.mean(b4)',
+               '-i', folder, '--memory-mb', '1']
+    assert explain(command, str(tmp_path))['windows'] > 1
+    proc = subprocess.run(command, cwd=str(tmp_path), capture_output=True, text=True)
+    windowed = read_output(str(tmp_path), proc.stdout.splitlines())
+
+    b4, b5 = bands[4].astype(np.float32), bands[5].astype(np.float32)
+    whole = (b5 - b4) / (b5 + b4 + 1) - np.mean(b4, dtype=np.float64)
+    np.testing.assert_allclose(windowed, whole, rtol=1e-5, atol=1e-4)
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from raster_common import BandStatistics
+
+
+@pytest.mark.parametrize('value', [1e16, -3e17, 1e20, 0.0])
+def test_constant_large_values_get_a_usable_histogram_range(value):
+    stats = BandStatistics()
+    stats.update(np.full(10, value))
+    stats.update(np.full(5, value))
+
+    assert stats.hi > stats.lo
+    result = stats.to_dict()
+    assert result['count'] == 15
+    assert result['min'] == result['max'] == result['p50'] == value
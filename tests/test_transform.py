@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from test_scaling import TRANSFORM, last_json
+
+
+def write_band(path, data):
+    profile = {'driver': 'GTiff', 'width': data.shape[1], 'height': data.shape[0], 'count': 1,
+               'dtype': data.dtype.name, 'crs': 'EPSG:32750', 'transform': from_origin(500000, 9900000, 30, 30)}
+    with rasterio.open(path, 'w', **profile) as dst:
+        dst.write(data, 1)
+
+
+def test_qa_flagged_pixel_does_not_leak_into_focal_neighbours(tmp_path):
+    scene = tmp_path / 'scene'
+    scene.mkdir()
+    red = np.full((20, 20), 1000, dtype=np.uint16)
+    nir = np.full((20, 20), 3000, dtype=np.uint16)
+    nir[10, 10] = 9000  # bright cloud pixel
+    qa = np.zeros((20, 20), dtype=np.uint16)
+    qa[10, 10] = 1 << 3  # QA_PIXEL cloud bit
+    write_band(scene / 'LC08_X_SR_B4.TIF', red)
+    write_band(scene / 'LC08_X_SR_B5.TIF', nir)
+    write_band(scene / 'LC08_X_QA_PIXEL.TIF', qa)
+
+    proc = subprocess.run([sys.executable, TRANSFORM, '-n', 'qa', '--algo', 'NDVI', '--input', str(scene),
+                           '--post', 'focal_mean:3', '--qa-mask'],
+                          cwd=str(tmp_path), capture_output=True, text=True)
+    result = last_json(proc.stdout.splitlines())
+    assert result['status'] == 'success', result
+    with rasterio.open(tmp_path / result['path']) as out:
+        data = out.read(1)
+
+    assert np.isnan(data[10, 10])
+    assert np.isnan(data).sum() == 1
+    # Neighbours of the cloud pixel average valid pixels only: NDVI 0.5 everywhere
+    np.testing.assert_allclose(data[~np.isnan(data)], 0.5, rtol=1e-5)